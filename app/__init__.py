@@ -15,25 +15,19 @@ from app.routes.blog_category import blog_category_bp
 from app.routes.milk_production import milk_production_bp
 from app.routes.notification import notification_bp
 from app.routes.milk_expiry_check import milk_expiry_bp
+from app.routes.milk_freshness import milk_freshness_bp
 from app.routes.scheduler import scheduler_bp  # Add this import
+from app.routes.report import report_bp
 from app.socket import init_socketio
 from app.services.notificationScheduler import notification_scheduler
+from app.services.report_jobs import report_job_service, celery
+from app.commands import register_commands
+from app.services.notification_queue import notification_queue
+from app.services.notification_outbox import notification_relay
 
 import os
 import logging
 
-# Tambahan untuk scheduler preventif
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.services.notification import check_milk_production_and_notify, check_milk_expiry_and_notify
-
-background_scheduler = BackgroundScheduler()
-
-def start_background_jobs():
-    # Jalankan fungsi notifikasi setiap 1 jam
-    background_scheduler.add_job(check_milk_production_and_notify, 'interval', minutes=5)
-    background_scheduler.add_job(check_milk_expiry_and_notify, 'interval', minutes=5)
-    background_scheduler.start()
-
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -47,6 +41,12 @@ def create_app():
     db.init_app(app)
     migrate = Migrate(app, db)
 
+    # Initialize report jobs (Celery if configured, local worker pool otherwise)
+    report_job_service.init_app(app, celery)
+
+    # Debounced notification checks for write handlers
+    notification_queue.init_app(app)
+
     # Initialize notification scheduler
     notification_scheduler.init_app(app)
     
@@ -60,17 +60,16 @@ def create_app():
     # Initialize Socket.IO
     socketio = init_socketio(app)
 
-    # Start notification scheduler and background jobs after app context is available
-    @app.before_first_request
-    def start_notification_scheduler():
-        try:
-            notification_scheduler.start()
-            start_background_jobs()  # Scheduler preventif
-            logging.info("Notification scheduler and background jobs started successfully")
-        except Exception as e:
-            logging.error(f"Failed to start notification scheduler or background jobs: {str(e)}")
+    # Relay committed notification outbox rows to the socket
+    notification_relay.init_app(app)
+    notification_relay.wake()
 
-    start_notification_scheduler()
+    # Start the scheduler once per process; jobs only run while this
+    # process holds the leader lease
+    try:
+        notification_scheduler.start()
+    except Exception as e:
+        logging.error(f"Failed to start notification scheduler: {str(e)}")
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -85,6 +84,11 @@ def create_app():
     app.register_blueprint(milk_production_bp, url_prefix='/milk-production')
     app.register_blueprint(notification_bp, url_prefix='/notification')
     app.register_blueprint(milk_expiry_bp, url_prefix='/milk-expiry')
+    app.register_blueprint(milk_freshness_bp, url_prefix='/milk-freshness')
     app.register_blueprint(scheduler_bp, url_prefix='/scheduler')  # Add this line
+    app.register_blueprint(report_bp, url_prefix='/reports')
+
+    # CLI maintenance commands (flask rebuild-summaries ...)
+    register_commands(app)
 
     return app, socketio
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Maintenance CLI commands, registered on the app in create_app.
+
+    flask --app run rebuild-summaries --start-date 2024-01-01 --end-date 2024-01-31
+    flask --app run rebuild-notification-counters [--user-id 7]
+    flask --app run rebuild-rollups --start-date 2023-01-01 --end-date 2024-12-31
+"""
+
+from datetime import datetime
+
+import click
+
+from app.services.milk_summary import rebuild_rollups, rebuild_summaries
+from app.services.notification_counters import rebuild_counters
+
+
+def _parse_date(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise click.BadParameter("Invalid date format. Use YYYY-MM-DD")
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-summaries')
+    @click.option('--start-date', required=True, callback=_parse_date, help='First day to rebuild (YYYY-MM-DD)')
+    @click.option('--end-date', required=True, callback=_parse_date, help='Last day to rebuild (YYYY-MM-DD)')
+    @click.option('--cow-id', type=int, default=None, help='Only rebuild summaries of this cow')
+    def rebuild_summaries_command(start_date, end_date, cow_id):
+        """Recompute daily milk summaries from milking sessions."""
+        if start_date > end_date:
+            raise click.BadParameter("start_date cannot be later than end_date")
+        count = rebuild_summaries(start_date, end_date, cow_id)
+        click.echo(f"Rebuilt {count} daily summaries from {start_date} to {end_date}")
+
+    @app.cli.command('rebuild-notification-counters')
+    @click.option('--user-id', type=int, multiple=True, help='Only rebuild counters of this user (repeatable)')
+    def rebuild_notification_counters_command(user_id):
+        """Recompute unread/total notification counters from notifications."""
+        count = rebuild_counters(user_id or None)
+        click.echo(f"Rebuilt notification counters for {count} users")
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--start-date', required=True, callback=_parse_date, help='First day to rebuild (YYYY-MM-DD)')
+    @click.option('--end-date', required=True, callback=_parse_date, help='Last day to rebuild (YYYY-MM-DD)')
+    @click.option('--cow-id', type=int, default=None, help='Only rebuild weekly/monthly rollups of this cow')
+    def rebuild_rollups_command(start_date, end_date, cow_id):
+        """Recompute weekly/monthly cow and daily farm rollups from daily summaries."""
+        if start_date > end_date:
+            raise click.BadParameter("start_date cannot be later than end_date")
+        counts = rebuild_rollups(start_date, end_date, cow_id)
+        for table, count in counts.items():
+            click.echo(f"Rebuilt {count} rows of {table}")
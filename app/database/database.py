@@ -1,4 +1,37 @@
+from functools import wraps
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to the 'replica' bind (SQLALCHEMY_BINDS) while the session is
+    marked read-only with `use_read_replica`; flushes always go to the primary.
+    Without a replica configured every statement uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_replica') and not self._flushing:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_read_replica(view):
+    """Run a read-only view against the read replica, if one is configured"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db.session.info['read_replica'] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop('read_replica', None)
+    return wrapper
+
 
 # Create an instance of SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
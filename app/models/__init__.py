@@ -9,4 +9,10 @@ from .blog_category import BlogCategory
 from .milking_sessions import MilkingSession
 from .milk_batches import MilkBatch
 from .daily_milk_summary import DailyMilkSummary
+from .milk_rollups import CowWeeklyMilkRollup, CowMonthlyMilkRollup, FarmDailyMilkRollup
 from .notification import Notification
+from .report_job import ReportJob
+from .scheduler import SchedulerLease, SchedulerJobRun
+from .notification_outbox import NotificationOutbox
+from .notification_counter import NotificationCounter
+from .production_rule import ProductionRule
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -9,8 +9,15 @@ class MilkStatus(enum.Enum):
     EXPIRED = "EXPIRED"  # Changed to match database values
     USED = "USED"  # Changed to match database values
 
+# Hours from production until a batch expires
+BATCH_SHELF_LIFE_HOURS = 8
+
 class MilkBatch(db.Model):
     __tablename__ = 'milk_batches'
+    __table_args__ = (
+        # Expiry sweeps and warning scans are range scans on this index
+        Index('ix_milk_batches_status_expiry', 'status', 'expiry_date'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     batch_number = Column(String(50), unique=True, nullable=False)
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, Date, Float, ForeignKey
+from app.database.database import db
+
+# Rollups of daily_milk_summary, kept in step by app.services.milk_summary.
+# Each row holds the summed bucket volumes of its period.
+
+class CowWeeklyMilkRollup(db.Model):
+    """Per cow per ISO week (week_start is the Monday)"""
+    __tablename__ = 'cow_weekly_milk_rollups'
+
+    cow_id = Column(Integer, ForeignKey('cows.id'), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    morning_volume = Column(Float, default=0, nullable=False)
+    afternoon_volume = Column(Float, default=0, nullable=False)
+    evening_volume = Column(Float, default=0, nullable=False)
+    total_volume = Column(Float, default=0, nullable=False)
+
+    def __repr__(self):
+        return (f"<CowWeeklyMilkRollup(cow_id={self.cow_id}, week_start={self.week_start}, "
+                f"total_volume={self.total_volume})>")
+
+
+class CowMonthlyMilkRollup(db.Model):
+    """Per cow per calendar month (month_start is the 1st)"""
+    __tablename__ = 'cow_monthly_milk_rollups'
+
+    cow_id = Column(Integer, ForeignKey('cows.id'), primary_key=True)
+    month_start = Column(Date, primary_key=True)
+    morning_volume = Column(Float, default=0, nullable=False)
+    afternoon_volume = Column(Float, default=0, nullable=False)
+    evening_volume = Column(Float, default=0, nullable=False)
+    total_volume = Column(Float, default=0, nullable=False)
+
+    def __repr__(self):
+        return (f"<CowMonthlyMilkRollup(cow_id={self.cow_id}, month_start={self.month_start}, "
+                f"total_volume={self.total_volume})>")
+
+
+class FarmDailyMilkRollup(db.Model):
+    """Whole herd per day"""
+    __tablename__ = 'farm_daily_milk_rollups'
+
+    date = Column(Date, primary_key=True)
+    morning_volume = Column(Float, default=0, nullable=False)
+    afternoon_volume = Column(Float, default=0, nullable=False)
+    evening_volume = Column(Float, default=0, nullable=False)
+    total_volume = Column(Float, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<FarmDailyMilkRollup(date={self.date}, total_volume={self.total_volume})>"
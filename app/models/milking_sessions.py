@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.database import db
 
 class MilkingSession(db.Model):
     __tablename__ = 'milking_sessions'
+    __table_args__ = (
+        # Keyset pagination on (milking_time, id), optionally narrowed by cow or milker
+        Index('ix_milking_sessions_milking_time_id', 'milking_time', 'id'),
+        Index('ix_milking_sessions_cow_time', 'cow_id', 'milking_time'),
+        Index('ix_milking_sessions_milker_time', 'milker_id', 'milking_time'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     cow_id = Column(Integer, ForeignKey('cows.id'), nullable=False)
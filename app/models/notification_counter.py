@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from app.database.database import db
+
+class NotificationCounter(db.Model):
+    """Per-user inbox counters, kept in step with `notifications` by every writer"""
+    __tablename__ = 'notification_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    total_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (f"<NotificationCounter(user_id={self.user_id}, "
+                f"unread_count={self.unread_count}, total_count={self.total_count})>")
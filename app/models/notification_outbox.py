@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum, Index
+from datetime import datetime
+import enum
+from app.database.database import db
+
+class OutboxStatus(enum.Enum):
+    PENDING = "PENDING"        # committed, waiting for the relay
+    DISPATCHED = "DISPATCHED"  # claimed by a relay, emit not yet confirmed
+    DELIVERED = "DELIVERED"
+    DEAD = "DEAD"              # gave up after OUTBOX_MAX_ATTEMPTS
+
+class NotificationOutbox(db.Model):
+    """Socket emits staged in the same transaction as their notification rows"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        Index('ix_notification_outbox_status_id', 'status', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String(64), unique=True, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON encoded event data
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return (f"<NotificationOutbox(id={self.id}, user_id={self.user_id}, "
+                f"status={self.status}, attempts={self.attempts})>")
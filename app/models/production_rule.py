@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from datetime import datetime
+from app.database.database import db
+
+class ProductionRule(db.Model):
+    """
+    Production notification rule: `metric operator threshold` on the daily
+    production analytics, scoped to a breed and/or lactation phase (both
+    empty = whole farm). Evaluated by app.services.production_rules.
+    """
+    __tablename__ = 'production_rules'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100), nullable=False)
+    notification_type = Column(String(20), nullable=False)
+    metric = Column(String(50), nullable=False)
+    operator = Column(String(2), nullable=False)
+    threshold = Column(Float, nullable=False)
+    # Skip cows whose volume today and yesterday are both below this
+    min_volume = Column(Float, nullable=True)
+    breed = Column(String(50), nullable=True)
+    lactation_phase = Column(String(50), nullable=True)
+    # 'managers' (cow managers and admins) or 'supervisors' (supervisors and admins)
+    audience = Column(String(20), default='managers', nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'notification_type': self.notification_type,
+            'metric': self.metric,
+            'operator': self.operator,
+            'threshold': self.threshold,
+            'min_volume': self.min_volume,
+            'breed': self.breed,
+            'lactation_phase': self.lactation_phase,
+            'audience': self.audience,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return (f"<ProductionRule(id={self.id}, name='{self.name}', "
+                f"{self.metric} {self.operator} {self.threshold})>")
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum, UniqueConstraint
+from datetime import datetime
+import enum
+import uuid
+from app.database.database import db
+
+class ReportJobStatus(enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+class ReportJob(db.Model):
+    __tablename__ = 'report_jobs'
+    __table_args__ = (
+        UniqueConstraint('active_hash', name='uq_report_jobs_active_hash'),
+    )
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    report_type = Column(String(50), nullable=False)
+    params = Column(Text, nullable=False)  # JSON encoded, normalised parameters
+    params_hash = Column(String(64), nullable=False, index=True)  # sha256 of report_type + params
+    # params_hash while PENDING/RUNNING, NULL afterwards: one in-flight job per hash
+    active_hash = Column(String(64), nullable=True)
+    status = Column(Enum(ReportJobStatus), default=ReportJobStatus.PENDING, nullable=False)
+    file_path = Column(String(255), nullable=True)
+    filename = Column(String(255), nullable=True)
+    mimetype = Column(String(100), nullable=True)
+    file_size = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return (f"<ReportJob(id='{self.id}', report_type='{self.report_type}', "
+                f"status={self.status}, created_at={self.created_at})>")
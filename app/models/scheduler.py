@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+from app.database.database import db
+
+class SchedulerLease(db.Model):
+    """Leader lease: the holder runs the scheduled jobs until expires_at"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
+
+class SchedulerJobRun(db.Model):
+    __tablename__ = 'scheduler_job_runs'
+    __table_args__ = (
+        Index('ix_scheduler_job_runs_job_started', 'job_id', 'started_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(100), nullable=False)
+    holder = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)  # 'success', 'error'
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    result = Column(String(255), nullable=True)
+    error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return (f"<SchedulerJobRun(id={self.id}, job_id='{self.job_id}', status='{self.status}', "
+                f"started_at={self.started_at}, duration_ms={self.duration_ms})>")
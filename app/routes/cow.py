@@ -1,11 +1,16 @@
 from flask import Blueprint, request, jsonify
+import logging
 from app.models.cows import Cow
 from app.database.database import db
-from fpdf import FPDF
 from app.models.daily_milk_summary import DailyMilkSummary  # Add this line
+from app.models.notification import Notification
 from flask import send_file
 from io import BytesIO
-import pandas as pd
+from app.services.export import export_response, get_export_format
+from app.services.reports import PDF_MIMETYPE, cows_export_spec, render_cows_pdf
+from app.services.managed_cows import invalidate_managed_cows
+from app.services.milk_summary import remove_cow_summaries
+from app.services.notification_counters import deduct_notifications
 
 cow_bp = Blueprint('cow', __name__)
 
@@ -171,18 +176,17 @@ def delete_cow(cow_id):
         if milking_sessions:
             print(f"[DEBUG] [DELETE COW] Semua milking_sessions terkait telah dihapus.")
 
-        # Hapus semua data produksi susu terkait
-        related_records = DailyMilkSummary.query.filter_by(cow_id=cow_id).all()
-        print(f"[DEBUG] [DELETE COW] Jumlah data produksi susu terkait sapi ID {cow_id}: {len(related_records)}")
-        for record in related_records:
-            db.session.delete(record)
-        if related_records:
-            print(f"[DEBUG] [DELETE COW] Semua data produksi susu terkait telah dihapus.")
+        # Hapus semua data produksi susu terkait (beserta rollup mingguan/bulanan/harian)
+        removed_summaries = remove_cow_summaries(cow_id)
+        logging.debug(f"[DELETE COW] Removed {removed_summaries} daily milk summaries of cow ID {cow_id}")
 
         # Force delete related feed schedules using raw SQL
         db.session.execute(text("DELETE FROM daily_feed_schedule WHERE cow_id = :cow_id"), {"cow_id": cow_id})
         print(f"[DEBUG] [DELETE COW] Semua daily_feed_schedule terkait telah dihapus dengan paksa.")
 
+        # Notifikasi sapi ikut terhapus (cascade); kurangi penghitungnya dulu
+        deduct_notifications(Notification.cow_id == cow_id)
+
         # Hapus data sapi
         db.session.delete(cow)
         
@@ -190,6 +194,7 @@ def delete_cow(cow_id):
         db.session.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
         
         db.session.commit()
+        invalidate_managed_cows()
         print(f"[DEBUG] [DELETE COW] Sapi ID {cow_id} beserta data terkait berhasil dihapus dari database.")
         print("="*50)
 
@@ -213,51 +218,8 @@ def export_cows_pdf():
     Mengekspor data sapi ke dalam file PDF.
     """
     try:
-        # Ambil semua data sapi dari database
-        cows = Cow.query.all()
-
-        # Buat PDF
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # Tambahkan deskripsi di bagian atas
-        pdf.set_font("Arial", style="B", size=16)
-        pdf.cell(200, 10, txt="Laporan Data Sapi", ln=True, align='C')
-        pdf.ln(5)
-        pdf.set_font("Arial", size=10)
-        pdf.cell(200, 10, txt="Berikut adalah daftar sapi yang terdaftar dalam sistem.", ln=True, align='C')
-        pdf.ln(10)
-
-        # Tambahkan header tabel dengan warna latar belakang
-        pdf.set_fill_color(173, 216, 230)  # Warna biru muda (RGB)
-        pdf.set_text_color(0, 0, 0)  # Warna teks hitam
-        pdf.set_font("Arial", style="B", size=10)
-        pdf.cell(20, 10, "NO", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Name", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Breed", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Gender", border=1, align='C', fill=True)
-        pdf.cell(50, 10, "Lactation Phase", border=1, align='C', fill=True)
-        pdf.ln()
-
-        # Isi data
-        pdf.set_font("Arial", size=10)
-        for idx, cow in enumerate(cows, start=1):
-            pdf.cell(20, 10, str(idx), border=1, align='C')
-            pdf.cell(40, 10, cow.name, border=1)
-            pdf.cell(40, 10, cow.breed, border=1)
-            pdf.cell(40, 10, cow.gender, border=1)
-            pdf.cell(50, 10, cow.lactation_phase or "-", border=1)
-            pdf.ln()
-
-       # Simpan PDF ke buffer
-        buffer = BytesIO()
-        pdf_bytes = pdf.output(dest='S').encode('latin1')
-        buffer.write(pdf_bytes)
-        buffer.seek(0)
-
-        return send_file(buffer, as_attachment=True, download_name="cows.pdf", mimetype='application/pdf')
+        content, filename = render_cows_pdf()
+        return send_file(BytesIO(content), as_attachment=True, download_name=filename, mimetype=PDF_MIMETYPE)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -266,53 +228,13 @@ def export_cows_pdf():
 @cow_bp.route('/export/excel', methods=['GET'])
 def export_cows_excel():
     """
-    Mengekspor data sapi ke dalam file Excel.
+    Mengekspor data sapi ke dalam file Excel (atau CSV dengan ?format=csv).
     """
     try:
-        # Ambil semua data sapi dari database
-        cows = Cow.query.all()
-
-        # Format data sapi menjadi list of dictionaries
-        cows_list = [{
-            "NO": idx,
-            "Name": cow.name,
-            "Breed": cow.breed,
-            "Gender": cow.gender,
-            "Lactation Phase": cow.lactation_phase or "-",
-            "Weight": cow.weight or "-",
-            "Birth": cow.birth
-        } for idx, cow in enumerate(cows, start=1)]
-
-        # Buat DataFrame
-        df = pd.DataFrame(cows_list)
-
-        # Simpan ke buffer dengan pewarnaan
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Cows')
-
-            # Akses workbook dan worksheet untuk styling
-            workbook = writer.book
-            worksheet = writer.sheets['Cows']
-
-            # Tambahkan pewarnaan header
-            from openpyxl.styles import Font, PatternFill
-            header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-            header_font = Font(bold=True)
-
-            for cell in worksheet[1]:  # Baris pertama adalah header
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Atur lebar kolom secara otomatis
-            for column_cells in worksheet.columns:
-                max_length = max(len(str(cell.value)) for cell in column_cells if cell.value)
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-
-        buffer.seek(0)
-
-        return send_file(buffer, as_attachment=True, download_name="cows.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        export_format = get_export_format(request.args.get('format'))
+        return export_response(export_format, cows_export_spec())
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
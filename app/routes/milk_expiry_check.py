@@ -1,44 +1,43 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import and_, or_
-from datetime import datetime, timedelta
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import and_, or_, func
 from app.models.milk_batches import MilkBatch, MilkStatus
 from app.models.milking_sessions import MilkingSession
 from app.models.users import User
 from app.models.cows import Cow
-from app.database.database import db
-from app.services.notification import check_milk_expiry_and_notify
+from app.database.database import db, use_read_replica
+from app.services.managed_cows import get_managed_cow_ids, managed_batch_ids_select
+from app.services.milk_expiry import (EXPIRY_BUCKETS, effective_status, effective_status_filter, expire_fresh_batches,
+                                      batch_view_cache, expiry_bucket_batches, expiry_bucket_totals, expiry_now,
+                                      is_expired)
+from app.services.notification import notify_expired_batches
 
 milk_expiry_bp = Blueprint('milk_expiry', __name__)
 
 def get_user_managed_batches(user_id):
-    """Get batch IDs that are managed by the specific user"""
-    try:
-        # Get user
-        user = User.query.get(user_id)
-        if not user:
-            return []
-        
-        # Jika user adalah admin, kembalikan semua batch
-        if user.role == 'Admin':  # Pastikan atribut role sesuai dengan model User
-            return [batch.id for batch in MilkBatch.query.all()]
-        
-        # Get cow IDs managed by this user
-        managed_cow_ids = [cow.id for cow in user.managed_cows.all()]
-        
-        if not managed_cow_ids:
-            return []
-        
-        # Get batch IDs from milking sessions where cow_id is in managed_cow_ids
-        batch_ids = db.session.query(MilkingSession.milk_batch_id)\
-            .filter(MilkingSession.cow_id.in_(managed_cow_ids))\
-            .filter(MilkingSession.milk_batch_id.isnot(None))\
-            .distinct().all()
-        
-        return [batch_id[0] for batch_id in batch_ids if batch_id[0] is not None]
-    
-    except Exception as e:
-        print(f"Error getting user managed batches: {str(e)}")
-        return []
+    """
+    SELECT of the batch ids managed by the user, for use in IN (...), or None
+    if the user manages no cows
+    """
+    cow_ids = get_managed_cow_ids(user_id)
+    if not cow_ids:
+        return None
+    return managed_batch_ids_select(cow_ids)
+
+def resolve_batch_scope(user_id, user_role):
+    """
+    Filters restricting MilkBatch queries to the batches the user may see,
+    and how many batches that is. Admins see every batch.
+    """
+    if user_role and user_role.lower() == 'admin':
+        return [], db.session.query(func.count(MilkBatch.id)).scalar()
+
+    batch_ids = get_user_managed_batches(user_id)
+    if batch_ids is None:
+        return [], 0
+
+    managed_batch_count = db.session.query(func.count(func.distinct(MilkingSession.milk_batch_id)))\
+        .filter(MilkingSession.milk_batch_id.in_(batch_ids)).scalar()
+    return [MilkBatch.id.in_(batch_ids)], managed_batch_count
 
 def calculate_time_remaining(expiry_date, current_time):
     """Calculate time remaining until expiry"""
@@ -62,48 +61,22 @@ def calculate_time_remaining(expiry_date, current_time):
         'is_overdue': total_minutes < 0
     }
 
-def auto_update_expired_batches(user_id=None, user_role=None):
-    """Automatically update expired milk batches and send notifications"""
-    try:
-        current_time = datetime.utcnow()
-        
-        # Build query for expired batches
-        query = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date <= current_time
-            )
-        )
-        
-        # Filter by user if user_id is provided and user is not admin
-        if user_id and user_role and user_role.lower() != 'admin':
-            managed_batch_ids = get_user_managed_batches(user_id)
-            if not managed_batch_ids:
-                return 0, 0
-            query = query.filter(MilkBatch.id.in_(managed_batch_ids))
-        
-        expired_batches = query.all()
-        
-        # Update expired batches
-        for batch in expired_batches:
-            batch.status = MilkStatus.EXPIRED
-            batch.updated_at = current_time
-        
-        if expired_batches:
-            db.session.commit()
-            
-        # Check expiry and send notifications
-        notification_count = check_milk_expiry_and_notify()
-        
-        return len(expired_batches), notification_count
-        
-    except Exception as e:
-        db.session.rollback()
-        raise e
+def read_only_update_info(pending_sweep=0):
+    """
+    GETs no longer expire batches themselves; overdue FRESH batches read as
+    expired and are persisted by the scheduled sweep. `pending_sweep` counts
+    those not yet persisted.
+    """
+    return {
+        'batches_auto_expired': 0,
+        'notifications_sent': 0,
+        'pending_sweep': pending_sweep
+    }
 
 @milk_expiry_bp.route('/milk-batches/status', methods=['GET'])
+@use_read_replica
 def get_milk_batches_by_status():
-    """Get milk batches grouped by status with automatic expiry check, filtered by user"""
+    """Get milk batches grouped by effective status (expiry computed at read time), filtered by user"""
     try:
         # Get user_id and user_role from request
         user_id = request.args.get('user_id')
@@ -123,14 +96,10 @@ def get_milk_batches_by_status():
                 'message': 'Invalid user ID format'
             }), 400
         
-        # Get managed batch IDs for this user
-        # Jika user_role adalah Admin, dapatkan semua batch
-        if user_role and user_role.lower() == 'admin':
-            managed_batch_ids = [batch.id for batch in MilkBatch.query.all()]
-        else:
-            managed_batch_ids = get_user_managed_batches(user_id)
+        # Resolve the user's batches as a subquery (admins see every batch)
+        batch_scope, managed_batch_count = resolve_batch_scope(user_id, user_role)
         
-        if not managed_batch_ids:
+        if not managed_batch_count:
             return jsonify({
                 'success': True,
                 'data': {
@@ -145,10 +114,7 @@ def get_milk_batches_by_status():
                         'total_expired_volume': 0,
                         'total_used_volume': 0
                     },
-                    'auto_update_info': {
-                        'batches_auto_expired': 0,
-                        'notifications_sent': 0
-                    },
+                    'auto_update_info': read_only_update_info(),
                     'user_info': {
                         'user_id': user_id,
                         'user_role': user_role,
@@ -157,32 +123,17 @@ def get_milk_batches_by_status():
                 }
             }), 200
         
-        # Automatically check and update expired batches for this user
-        updated_count, notification_count = auto_update_expired_batches(user_id, user_role)
+        current_time = expiry_now()
         
-        current_time = datetime.utcnow()
-        
-        # Get all batches grouped by status, filtered by user's managed batches
-        fresh_batches = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
-        
-        expired_batches = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.EXPIRED,
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
-        
-        used_batches = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.USED,
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
+        # One read of the user's batches, grouped by effective status (a FRESH
+        # batch past its expiry_date reads as expired before the sweep runs)
+        grouped = {MilkStatus.FRESH: [], MilkStatus.EXPIRED: [], MilkStatus.USED: []}
+        for batch in MilkBatch.query.filter(*batch_scope).all():
+            grouped.setdefault(effective_status(batch, current_time), []).append(batch)
+        fresh_batches = grouped[MilkStatus.FRESH]
+        expired_batches = grouped[MilkStatus.EXPIRED]
+        used_batches = grouped[MilkStatus.USED]
+        pending_sweep = sum(1 for batch in expired_batches if batch.status == MilkStatus.FRESH)
         
         def serialize_batch(batch):
             time_remaining = calculate_time_remaining(batch.expiry_date, current_time)
@@ -190,7 +141,8 @@ def get_milk_batches_by_status():
                 'id': batch.id,
                 'batch_number': batch.batch_number,
                 'total_volume': float(batch.total_volume) if batch.total_volume else 0,
-                'status': batch.status.value if batch.status else 'unknown',
+                'status': effective_status(batch, current_time).value if batch.status else 'unknown',
+                'is_expired': is_expired(batch, current_time),
                 'production_date': batch.production_date.isoformat() if batch.production_date else None,
                 'expiry_date': batch.expiry_date.isoformat() if batch.expiry_date else None,
                 'created_at': batch.created_at.isoformat() if batch.created_at else None,
@@ -211,14 +163,11 @@ def get_milk_batches_by_status():
                 'total_expired_volume': sum(batch.total_volume for batch in expired_batches),
                 'total_used_volume': sum(batch.total_volume for batch in used_batches)
             },
-            'auto_update_info': {
-                'batches_auto_expired': updated_count,
-                'notifications_sent': notification_count
-            },
+            'auto_update_info': read_only_update_info(pending_sweep),
             'user_info': {
                 'user_id': user_id,
                 'user_role': user_role,
-                'managed_batch_count': len(managed_batch_ids)
+                'managed_batch_count': managed_batch_count
             }
         }
         
@@ -234,8 +183,17 @@ def get_milk_batches_by_status():
         }), 500
 
 @milk_expiry_bp.route('/milk-batches/expiry-analysis', methods=['GET'])
+@use_read_replica
 def expiry_analysis():
-    """Analyze milk batches expiry status and provide insights with automatic expiry check, filtered by user"""
+    """
+    Analyze milk batches expiry status and provide insights, filtered by user (read-only).
+
+    Every FRESH batch expiring within four hours falls into exactly one
+    urgency bucket (overdue, within_1_hour, within_2_hours, within_4_hours).
+    Batch lists are only included with `details=true` (or `details=<bucket>`
+    for a single bucket), paginated per bucket with `page`/`per_page`.
+    Payloads are cached per user and minute for EXPIRY_ANALYSIS_CACHE_SECONDS.
+    """
     try:
         # Get user_id and user_role from request
         user_id = request.args.get('user_id')
@@ -249,89 +207,50 @@ def expiry_analysis():
         
         try:
             user_id = int(user_id)
+            page = int(request.args.get('page', 1))
+            per_page = min(int(request.args.get('per_page', 10)), 100)
         except ValueError:
             return jsonify({
                 'success': False,
-                'message': 'Invalid user ID format'
+                'message': 'Invalid user ID or pagination format'
             }), 400
         
-        # Get managed batch IDs for this user
-        # Jika user_role adalah Admin, dapatkan semua batch
-        if user_role and user_role.lower() == 'admin':
-            managed_batch_ids = [batch.id for batch in MilkBatch.query.all()]
-        else:
-            managed_batch_ids = get_user_managed_batches(user_id)
-        
-        if not managed_batch_ids:
+        if page < 1 or per_page < 1:
             return jsonify({
-                'success': True,
-                'data': {
-                    'current_time': datetime.utcnow().isoformat(),
-                    'expiring_soon_2_hours': [],
-                    'overdue_expired': [],
-                    'expiring_1_hour': [],
-                    'expiring_4_hours': [],
-                    'summary': {
-                        'total_batches': 0,
-                        'volume_expiring_soon': 0,
-                        'volume_overdue': 0,
-                        'critical_alerts': 0
-                    },
-                    'auto_update_info': {
-                        'batches_auto_expired': 0,
-                        'notifications_sent': 0
-                    },
-                    'user_info': {
-                        'user_id': user_id,
-                        'user_role': user_role,
-                        'managed_batch_count': 0
-                    }
-                }
-            }), 200
-        
-        # Automatically check and update expired batches for this user
-        updated_count, notification_count = auto_update_expired_batches(user_id, user_role)
-        
-        current_time = datetime.utcnow()
+                'success': False,
+                'message': 'page and per_page must be positive integers'
+            }), 400
         
-        # Get batches expiring soon (within next 2 hours), filtered by user's managed batches
-        expiring_soon_2_hours = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date > current_time,
-                MilkBatch.expiry_date <= current_time + timedelta(hours=2),
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
+        bucket_names = [name for name, _ in EXPIRY_BUCKETS]
+        details = (request.args.get('details') or '').strip().lower()
+        if details in ('', 'false', '0', 'no'):
+            detail_buckets = []
+        elif details in ('true', '1', 'yes', 'all'):
+            detail_buckets = bucket_names
+        elif details in bucket_names:
+            detail_buckets = [details]
+        else:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid details value. Use true or one of: {', '.join(bucket_names)}"
+            }), 400
         
-        # Get overdue batches (already expired but still marked as fresh)
-        overdue_expired = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date <= current_time,
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
+        # Minute resolution: the payload is shared by every request within the minute
+        current_time = expiry_now().replace(second=0, microsecond=0)
+        cache_seconds = current_app.config['EXPIRY_ANALYSIS_CACHE_SECONDS']
+        cache_key = ('expiry_analysis', user_id, user_role, current_time,
+                     tuple(detail_buckets), page if detail_buckets else None,
+                     per_page if detail_buckets else None)
+        if cache_seconds > 0:
+            cached = batch_view_cache.get(cache_key)
+            if cached is not None:
+                return jsonify({'success': True, 'data': cached}), 200
         
-        # Get batches expiring within 1 hour
-        expiring_1_hour = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date > current_time,
-                MilkBatch.expiry_date <= current_time + timedelta(hours=1),
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
+        # Resolve the user's batches as a subquery (admins see every batch)
+        batch_scope, managed_batch_count = resolve_batch_scope(user_id, user_role)
         
-        # Get batches expiring within 4 hours
-        expiring_4_hours = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date > current_time,
-                MilkBatch.expiry_date <= current_time + timedelta(hours=4),
-                MilkBatch.id.in_(managed_batch_ids)
-            )
-        ).all()
+        totals = expiry_bucket_totals(current_time, batch_scope) if managed_batch_count else \
+            {name: {'count': 0, 'volume': 0.0} for name in bucket_names}
         
         def serialize_batch_with_urgency(batch):
             time_remaining = calculate_time_remaining(batch.expiry_date, current_time)
@@ -339,41 +258,49 @@ def expiry_analysis():
                 'id': batch.id,
                 'batch_number': batch.batch_number,
                 'total_volume': float(batch.total_volume) if batch.total_volume else 0,
-                'status': batch.status.value if batch.status else 'unknown',
+                'status': effective_status(batch, current_time).value if batch.status else 'unknown',
+                'is_expired': is_expired(batch, current_time),
                 'production_date': batch.production_date.isoformat() if batch.production_date else None,
                 'expiry_date': batch.expiry_date.isoformat() if batch.expiry_date else None,
                 'time_remaining': time_remaining,
                 'hours_until_expiry': time_remaining['total_hours'] if time_remaining else None
             }
         
-        # Calculate summary statistics
-        volume_expiring_soon = sum(batch.total_volume for batch in expiring_soon_2_hours)
-        volume_overdue = sum(batch.total_volume for batch in overdue_expired)
-        critical_alerts = len(overdue_expired) + len(expiring_1_hour)
+        buckets = {}
+        for name in bucket_names:
+            bucket = dict(totals[name])
+            if name in detail_buckets:
+                batches = expiry_bucket_batches(current_time, name, batch_scope, page, per_page) \
+                    if bucket['count'] else []
+                bucket['batches'] = [serialize_batch_with_urgency(batch) for batch in batches]
+                bucket['pagination'] = {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': bucket['count'],
+                    'total_pages': (bucket['count'] + per_page - 1) // per_page
+                }
+            buckets[name] = bucket
         
         result = {
             'current_time': current_time.isoformat(),
-            'expiring_soon_2_hours': [serialize_batch_with_urgency(batch) for batch in expiring_soon_2_hours],
-            'overdue_expired': [serialize_batch_with_urgency(batch) for batch in overdue_expired],
-            'expiring_1_hour': [serialize_batch_with_urgency(batch) for batch in expiring_1_hour],
-            'expiring_4_hours': [serialize_batch_with_urgency(batch) for batch in expiring_4_hours],
+            'buckets': buckets,
             'summary': {
-                'total_batches': len(managed_batch_ids),
-                'volume_expiring_soon': float(volume_expiring_soon),
-                'volume_overdue': float(volume_overdue),
-                'critical_alerts': critical_alerts
-            },
-            'auto_update_info': {
-                'batches_auto_expired': updated_count,
-                'notifications_sent': notification_count
+                'total_batches': managed_batch_count,
+                'volume_expiring_soon': totals['within_1_hour']['volume'] + totals['within_2_hours']['volume'],
+                'volume_overdue': totals['overdue']['volume'],
+                'critical_alerts': totals['overdue']['count'] + totals['within_1_hour']['count']
             },
+            'auto_update_info': read_only_update_info(totals['overdue']['count']),
             'user_info': {
                 'user_id': user_id,
                 'user_role': user_role,
-                'managed_batch_count': len(managed_batch_ids)
+                'managed_batch_count': managed_batch_count
             }
         }
         
+        if cache_seconds > 0:
+            batch_view_cache.set(cache_key, result, cache_seconds)
+        
         return jsonify({
             'success': True,
             'data': result
@@ -386,8 +313,9 @@ def expiry_analysis():
         }), 500
 
 @milk_expiry_bp.route('/milk-batches/status/<status>', methods=['GET'])
+@use_read_replica
 def get_milk_batches_by_specific_status(status):
-    """Get milk batches by specific status with pagination and automatic expiry check, filtered by user"""
+    """Get milk batches by effective status with pagination, filtered by user (read-only)"""
     try:
         # Get parameters
         user_id = request.args.get('user_id')
@@ -417,14 +345,10 @@ def get_milk_batches_by_specific_status(status):
                 'message': f'Invalid status: {status}. Valid statuses are: {", ".join(valid_statuses)}'
             }), 400
         
-        # Get managed batch IDs for this user
-        # Jika user_role adalah Admin, dapatkan semua batch
-        if user_role and user_role.lower() == 'admin':
-            managed_batch_ids = [batch.id for batch in MilkBatch.query.all()]
-        else:
-            managed_batch_ids = get_user_managed_batches(user_id)
+        # Resolve the user's batches as a subquery (admins see every batch)
+        batch_scope, managed_batch_count = resolve_batch_scope(user_id, user_role)
         
-        if not managed_batch_ids:
+        if not managed_batch_count:
             return jsonify({
                 'success': True,
                 'data': {
@@ -435,10 +359,7 @@ def get_milk_batches_by_specific_status(status):
                         'total': 0,
                         'total_pages': 0
                     },
-                    'auto_update_info': {
-                        'batches_auto_expired': 0,
-                        'notifications_sent': 0
-                    },
+                    'auto_update_info': read_only_update_info(),
                     'user_info': {
                         'user_id': user_id,
                         'user_role': user_role,
@@ -447,9 +368,6 @@ def get_milk_batches_by_specific_status(status):
                 }
             }), 200
         
-        # Automatically check and update expired batches for this user
-        updated_count, notification_count = auto_update_expired_batches(user_id, user_role)
-        
         # Map status to enum
         status_map = {
             'fresh': MilkStatus.FRESH,
@@ -460,11 +378,11 @@ def get_milk_batches_by_specific_status(status):
         status_enum = status_map[status.lower()]
         
         # Build query with pagination
-        current_time = datetime.utcnow()
+        current_time = expiry_now()
         query = MilkBatch.query.filter(
             and_(
-                MilkBatch.status == status_enum,
-                MilkBatch.id.in_(managed_batch_ids)
+                effective_status_filter(status_enum, current_time),
+                *batch_scope
             )
         ).order_by(MilkBatch.created_at.desc())
         
@@ -481,7 +399,8 @@ def get_milk_batches_by_specific_status(status):
                 'id': batch.id,
                 'batch_number': batch.batch_number,
                 'total_volume': float(batch.total_volume) if batch.total_volume else 0,
-                'status': batch.status.value if batch.status else 'unknown',
+                'status': effective_status(batch, current_time).value if batch.status else 'unknown',
+                'is_expired': is_expired(batch, current_time),
                 'production_date': batch.production_date.isoformat() if batch.production_date else None,
                 'expiry_date': batch.expiry_date.isoformat() if batch.expiry_date else None,
                 'created_at': batch.created_at.isoformat() if batch.created_at else None,
@@ -498,14 +417,11 @@ def get_milk_batches_by_specific_status(status):
                 'total': total,
                 'total_pages': total_pages
             },
-            'auto_update_info': {
-                'batches_auto_expired': updated_count,
-                'notifications_sent': notification_count
-            },
+            'auto_update_info': read_only_update_info(),
             'user_info': {
                 'user_id': user_id,
                 'user_role': user_role,
-                'managed_batch_count': len(managed_batch_ids)
+                'managed_batch_count': managed_batch_count
             }
         }
         
@@ -542,20 +458,13 @@ def update_expired_milk_batches():
                 'message': 'Invalid user ID format'
             }), 400
         
-        current_time = datetime.utcnow()
-        
-        # Build query for expired batches
-        query = MilkBatch.query.filter(
-            and_(
-                MilkBatch.status == MilkStatus.FRESH,
-                MilkBatch.expiry_date <= current_time
-            )
-        )
+        current_time = expiry_now()
         
         # Filter by user if user is not admin
+        batch_ids = None
         if user_role and user_role.lower() != 'admin':
-            managed_batch_ids = get_user_managed_batches(user_id)
-            if not managed_batch_ids:
+            batch_ids = get_user_managed_batches(user_id)
+            if batch_ids is None:
                 return jsonify({
                     'success': True,
                     'data': {
@@ -570,17 +479,14 @@ def update_expired_milk_batches():
                         }
                     }
                 }), 200
-            query = query.filter(MilkBatch.id.in_(managed_batch_ids))
         
-        expired_batches = query.all()
+        expired_ids = expire_fresh_batches(current_time, batch_ids=batch_ids)
+        expired_batches = MilkBatch.query.filter(MilkBatch.id.in_(expired_ids)).all() if expired_ids else []
         
-        # Update expired batches
         updated_batches = []
         total_volume_updated = 0
         
         for batch in expired_batches:
-            batch.status = MilkStatus.EXPIRED
-            batch.updated_at = current_time
             total_volume_updated += batch.total_volume if batch.total_volume else 0
             
             updated_batches.append({
@@ -590,13 +496,10 @@ def update_expired_milk_batches():
                 'expiry_date': batch.expiry_date.isoformat() if batch.expiry_date else None
             })
         
-        if expired_batches:
-            db.session.commit()
-        
         # Send notifications
         notification_count = 0
         try:
-            notification_count = check_milk_expiry_and_notify()
+            notification_count = notify_expired_batches(expired_ids)
         except Exception as e:
             print(f"Error sending notifications: {str(e)}")
         
@@ -608,7 +511,7 @@ def update_expired_milk_batches():
             'user_info': {
                 'user_id': user_id,
                 'user_role': user_role,
-                'managed_batch_count': len(get_user_managed_batches(user_id)) if user_role and user_role.lower() != 'admin' else 'all'
+                'managed_batch_count': resolve_batch_scope(user_id, user_role)[1] if batch_ids is not None else 'all'
             }
         }
         
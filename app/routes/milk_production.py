@@ -1,15 +1,26 @@
 from flask import Blueprint, request, jsonify
 from app.models.milking_sessions import MilkingSession
-from app.models.milk_batches import MilkBatch, MilkStatus
+from app.models.milk_batches import BATCH_SHELF_LIFE_HOURS, MilkBatch, MilkStatus
 from app.models.daily_milk_summary import DailyMilkSummary
-from app.database.database import db
+from app.models.cows import Cow
+from app.models.users import User
+from app.database.database import db, use_read_replica
+from app.utils.pagination import encode_cursor, decode_cursor, parse_limit
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
-from fpdf import FPDF
+from sqlalchemy import func, and_, or_
 from flask import send_file
 from io import BytesIO
 from app.services.notification import check_milk_expiry_and_notify, check_milk_production_and_notify
-import pandas as pd
+from app.services.export import export_response, get_export_format
+from app.services.milk_summary import ROLLUP_PERIODS, record_session, retract_session, move_session, rollup_series
+from app.services.notification_queue import enqueue_cow_change
+from app.services.milk_expiry import invalidate_batch_views
+from app.services.production_analytics import load_cow_analytics, load_production_analytics, to_records
+from app.services.milking_ingest import MAX_BULK_SESSIONS, generate_batch_number, ingest_milking_sessions
+from app.services.reports import (
+    PDF_MIMETYPE, milking_sessions_export_spec, daily_summaries_export_spec, parse_summary_filters,
+    render_milking_sessions_pdf, render_daily_summaries_pdf
+)
 
 milk_production_bp = Blueprint('milk_production', __name__)
 
@@ -21,11 +32,11 @@ def add_milking_session():
     try:
         # Create a new milk batch automatically
         new_batch = MilkBatch(
-            batch_number=f"BATCH-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+            batch_number=generate_batch_number(),
             total_volume=data['volume'],
             status=MilkStatus.FRESH,
             production_date=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())),
-            expiry_date=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())) + timedelta(hours=8),
+            expiry_date=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())) + timedelta(hours=BATCH_SHELF_LIFE_HOURS),
             notes=f"Auto-generated batch from milking session. {data.get('notes', '')}"
         )
         
@@ -45,51 +56,12 @@ def add_milking_session():
         db.session.add(new_session)
         
         # Update the daily milk summary
-        session_date = new_session.milking_time.date()
-        summary = DailyMilkSummary.query.filter_by(
-            cow_id=new_session.cow_id,
-            date=session_date
-        ).first()
-        
-        if not summary:
-            # Initialize with zero values when creating a new summary
-            summary = DailyMilkSummary(
-                cow_id=new_session.cow_id,
-                date=session_date,
-                morning_volume=0,    # Initialize with zero instead of None
-                afternoon_volume=0,  # Initialize with zero instead of None
-                evening_volume=0,    # Initialize with zero instead of None
-                total_volume=0       # Initialize with zero instead of None
-            )
-            db.session.add(summary)
-        
-        # Ensure values are initialized if they are None
-        if summary.morning_volume is None:
-            summary.morning_volume = 0
-        if summary.afternoon_volume is None:
-            summary.afternoon_volume = 0
-        if summary.evening_volume is None:
-            summary.evening_volume = 0
-        
-        # Determine time of day and update corresponding volume
-        hour = new_session.milking_time.hour
-        if hour < 12:
-            summary.morning_volume += float(new_session.volume)
-        elif hour < 18:
-            summary.afternoon_volume += float(new_session.volume)
-        else:
-            summary.evening_volume += float(new_session.volume)
-            
-        # Ensure total_volume is not None
-        if summary.total_volume is None:
-            summary.total_volume = 0
-        summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
+        record_session(new_session.cow_id, new_session.milking_time, new_session.volume)
         
         db.session.commit()
-        #cek evening kosong apatidak
-        if summary.evening_volume == 0 or summary.afternoon_volume == 0:
-           check_milk_production_and_notify()
-           check_milk_expiry_and_notify()
+        invalidate_batch_views()
+        # Notification checks run in the background queue
+        enqueue_cow_change(new_session.cow_id, new_session.milking_time.date())
 
         return jsonify({
             "success": True, 
@@ -102,25 +74,150 @@ def add_milking_session():
         db.session.rollback()   
         return jsonify({"success": False, "error": str(e)}), 400
 
+@milk_production_bp.route('/milking-sessions/bulk', methods=['POST'])
+def bulk_add_milking_sessions():
+    """
+    Record a whole shift of milking sessions in one request.
+
+    Body: {"sessions": [{"cow_id", "milker_id", "volume", "milking_time", "notes"}, ...]}
+    Invalid items are reported per index and do not block the valid ones.
+    Notifications are evaluated once for the affected cows by the background queue.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('sessions')
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "sessions must be a non-empty list"}), 400
+    if len(items) > MAX_BULK_SESSIONS:
+        return jsonify({
+            "success": False,
+            "error": f"Too many sessions. Maximum is {MAX_BULK_SESSIONS} per request"
+        }), 400
+
+    try:
+        results, affected = ingest_milking_sessions(items)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    if affected:
+        invalidate_batch_views()
+    for cow_id, day in affected:
+        enqueue_cow_change(cow_id, day)
+
+    created = sum(1 for result in results if result["success"])
+    if created == len(items):
+        status_code = 201
+    elif created:
+        status_code = 207
+    else:
+        status_code = 400
+
+    return jsonify({
+        "success": created > 0,
+        "created": created,
+        "failed": len(items) - created,
+        "results": results
+    }), status_code
+
 @milk_production_bp.route('/milking-sessions', methods=['GET'])
 def get_milking_sessions():
-    sessions = MilkingSession.query.all()
-    result = []
-    
-    for session in sessions:
-        result.append({
-            "id": session.id,
-            "cow_id": session.cow_id,
-            "cow_name": session.cow.name if session.cow else None,
-            "milker_id": session.milker_id,
-            "milker_name": session.milker.name if session.milker else None,
-            "milk_batch_id": session.milk_batch_id,
-            "volume": session.volume,
-            "milking_time": session.milking_time.isoformat(),
-            "notes": session.notes
-        })
-    
-    return jsonify(result), 200
+    """
+    List milking sessions with cow and milker names resolved in a single query.
+
+    Without paging parameters the full list is returned (legacy behaviour).
+    Passing `limit` and/or `cursor` switches to keyset pagination ordered by
+    (milking_time, id) newest first; the response then carries `next_cursor`
+    for infinite scroll. `cow_id`, `milker_id`, `start_date` and `end_date`
+    filter both modes.
+    """
+    try:
+        cow_id = request.args.get('cow_id', type=int)
+        milker_id = request.args.get('milker_id', type=int)
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        cursor = request.args.get('cursor')
+        raw_limit = request.args.get('limit')
+        paginated = cursor is not None or raw_limit is not None
+
+        query = db.session.query(
+            MilkingSession.id,
+            MilkingSession.cow_id,
+            Cow.name.label('cow_name'),
+            MilkingSession.milker_id,
+            User.name.label('milker_name'),
+            MilkingSession.milk_batch_id,
+            MilkingSession.volume,
+            MilkingSession.milking_time,
+            MilkingSession.notes
+        ).outerjoin(Cow, MilkingSession.cow_id == Cow.id)\
+         .outerjoin(User, MilkingSession.milker_id == User.id)
+
+        if cow_id:
+            query = query.filter(MilkingSession.cow_id == cow_id)
+        if milker_id:
+            query = query.filter(MilkingSession.milker_id == milker_id)
+
+        try:
+            if start_date:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d')
+                query = query.filter(MilkingSession.milking_time >= start_date)
+            if end_date:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+                query = query.filter(MilkingSession.milking_time < end_date)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "Invalid date format. Use YYYY-MM-DD"
+            }), 400
+
+        if paginated:
+            try:
+                limit = parse_limit(raw_limit)
+                if cursor:
+                    cursor_time, cursor_id = decode_cursor(cursor)
+                    query = query.filter(or_(
+                        MilkingSession.milking_time < cursor_time,
+                        and_(MilkingSession.milking_time == cursor_time,
+                             MilkingSession.id < cursor_id)
+                    ))
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+
+        if paginated:
+            query = query.order_by(MilkingSession.milking_time.desc(), MilkingSession.id.desc())
+            # Fetch one extra row to know whether another page exists
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = query.order_by(MilkingSession.id).all()
+
+        result = [{
+            "id": row.id,
+            "cow_id": row.cow_id,
+            "cow_name": row.cow_name,
+            "milker_id": row.milker_id,
+            "milker_name": row.milker_name,
+            "milk_batch_id": row.milk_batch_id,
+            "volume": row.volume,
+            "milking_time": row.milking_time.isoformat(),
+            "notes": row.notes
+        } for row in rows]
+
+        if not paginated:
+            return jsonify(result), 200
+
+        next_cursor = encode_cursor(rows[-1].milking_time, rows[-1].id) if has_more and rows else None
+        return jsonify({
+            "success": True,
+            "sessions": result,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "limit": limit
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
 
 @milk_production_bp.route('/milk-batches', methods=['GET'])
@@ -170,14 +267,14 @@ def update_batch_status(batch_id):
         batch.updated_at = datetime.utcnow()
         
         db.session.commit()
-        
+        invalidate_batch_views()
         
         return jsonify({
             'message': 'Batch status updated successfully',
             'batch_id': batch_id,
             'old_status': old_status.value if old_status else None,
             'new_status': status_enum.value,
-            'notifications_sent': notification_count
+            'notifications_sent': 0
         }), 200
         
     except Exception as e:
@@ -257,65 +354,100 @@ def get_daily_summaries():
         }), 500
 
 
-@milk_production_bp.route('/export/pdf', methods=['GET'])
-def export_milking_sessions_pdf():
+@milk_production_bp.route('/rollups/<period>', methods=['GET'])
+@use_read_replica
+def get_production_rollups(period):
+    """
+    Production trend from the rollup tables.
+
+    period: daily (whole herd), weekly or monthly (one cow with cow_id,
+    otherwise the whole herd). Optional start_date/end_date (YYYY-MM-DD).
+    """
+    if period not in ROLLUP_PERIODS:
+        return jsonify({
+            "success": False,
+            "error": f"Invalid period. Use one of: {', '.join(ROLLUP_PERIODS)}"
+        }), 400
+
     try:
-        sessions = MilkingSession.query.all()
+        cow_id, start_date, end_date = parse_summary_filters(request.args)
+        series = rollup_series(period, cow_id, start_date, end_date)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"An error occurred while fetching production rollups: {str(e)}"
+        }), 500
 
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", style="B", size=16)
-        pdf.cell(200, 10, txt="Milking Sessions Report", ln=True, align='C')
-        pdf.ln(5)
-        pdf.set_font("Arial", size=10)
-        pdf.cell(200, 10, txt="Cattle milking session list.", ln=True, align='C')
-        pdf.ln(10)
+    return jsonify({
+        "success": True,
+        "period": period,
+        "cow_id": cow_id,
+        "rollups": series,
+        "total_volume": sum(row['total_volume'] for row in series),
+        "total_records": len(series)
+    }), 200
 
-        pdf.set_fill_color(173, 216, 230)
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_font("Arial", style="B", size=10)
-        pdf.cell(10, 10, "NO", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Cow", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Milker", border=1, align='C', fill=True)
-        pdf.cell(25, 10, "Session", border=1, align='C', fill=True)
-        pdf.cell(25, 10, "Volume", border=1, align='C', fill=True)
-        pdf.cell(45, 10, "Milking Time", border=1, align='C', fill=True)
-        pdf.ln()
+@milk_production_bp.route('/analytics', methods=['GET'])
+@use_read_replica
+def get_production_analytics():
+    """
+    Production analytics from the daily summaries.
 
-        pdf.set_font("Arial", size=10)
-        for idx, session in enumerate(sessions, start=1):
-            cow_info = f"{session.cow_id} - {session.cow.name}" if session.cow else str(session.cow_id)
-            milker_info = f"{session.milker_id} - {session.milker.name}" if session.milker else str(session.milker_id)
-            # Determine session based on hour
-            hour = session.milking_time.hour
-            if hour < 12:
-                sesi = "Morning"
-            elif hour < 18:
-                sesi = "Afternoon"
-            else:
-                sesi = "Evening"
-            pdf.cell(10, 10, str(idx), border=1, align='C')
-            pdf.cell(40, 10, cow_info, border=1)
-            pdf.cell(40, 10, milker_info, border=1)
-            pdf.cell(25, 10, sesi, border=1, align='C')
-            pdf.cell(25, 10, str(session.volume), border=1)
-            pdf.cell(45, 10, session.milking_time.strftime('%Y-%m-%d %H:%M'), border=1)
-            pdf.ln()
+    Without cow_id: one row per cow milked on `date` (default today) with its
+    rolling mean, day-over-day and 7-day changes, z-score anomaly flag and
+    lactation phase baseline. With cow_id: that cow's metrics for each of
+    the `days` days (default 30, max 366) ending at `date`.
+    anomalies_only=true keeps the anomalous rows only.
+    """
+    try:
+        end_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date() \
+            if request.args.get('date') else date.today()
+        days = request.args.get('days', 30, type=int)
+        cow_id = request.args.get('cow_id', type=int)
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if not 1 <= days <= 366:
+        return jsonify({"success": False, "error": "days must be between 1 and 366"}), 400
+    anomalies_only = request.args.get('anomalies_only', '').lower() in ('true', '1', 'yes')
 
-        # Metode yang lebih aman untuk menggunakan BytesIO
-        buffer = BytesIO()
-        
-        # Output PDF sebagai bytes dan tulis ke buffer
-        pdf_bytes = pdf.output(dest='S').encode('latin-1')
-        buffer.write(pdf_bytes)
-        buffer.seek(0)
-        
+    try:
+        if cow_id is None:
+            analytics = load_production_analytics(end_date)
+            frame = analytics.snapshot(end_date)
+        else:
+            analytics = load_cow_analytics(cow_id, end_date, days)
+            if analytics is None or cow_id not in analytics.cows.index:
+                return jsonify({"success": False, "error": "No daily summaries for this cow in the window"}), 404
+            frame = analytics.cow_series(cow_id)
+            frame['date'] = frame['date'].map(date.isoformat)
+        if anomalies_only:
+            frame = frame[frame['anomaly']]
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"An error occurred while computing production analytics: {str(e)}"
+        }), 500
+
+    return jsonify({
+        "success": True,
+        "date": end_date.isoformat(),
+        "cow_id": cow_id,
+        "start_date": analytics.start_date.isoformat(),
+        "anomaly_count": int(frame['anomaly'].sum()),
+        "data": to_records(frame)
+    }), 200
+
+@milk_production_bp.route('/export/pdf', methods=['GET'])
+def export_milking_sessions_pdf():
+    try:
+        content, filename = render_milking_sessions_pdf()
         return send_file(
-            buffer, 
+            BytesIO(content), 
             as_attachment=True, 
-            download_name="milking_sessions.pdf", 
-            mimetype='application/pdf'
+            download_name=filename, 
+            mimetype=PDF_MIMETYPE
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -323,43 +455,10 @@ def export_milking_sessions_pdf():
 @milk_production_bp.route('/export/excel', methods=['GET'])
 def export_milking_sessions_excel():
     try:
-        sessions = MilkingSession.query.all()
-        sessions_list = []
-        for idx, session in enumerate(sessions, start=1):
-            hour = session.milking_time.hour
-            if hour < 12:
-                sesi = "Pagi"
-            elif hour < 18:
-                sesi = "Siang"
-            else:
-                sesi = "Sore"
-            sessions_list.append({
-                "NO": idx,
-                "Cow": f"{session.cow_id} - {session.cow.name}" if session.cow else str(session.cow_id),
-                "Milker": f"{session.milker_id} - {session.milker.name}" if session.milker else str(session.milker_id),
-                "Session": sesi,
-                "Volume": session.volume,
-                "Milking Time": session.milking_time.strftime('%Y-%m-%d %H:%M')
-            })
-
-        df = pd.DataFrame(sessions_list)
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='MilkingSessions')
-            workbook = writer.book
-            worksheet = writer.sheets['MilkingSessions']
-            from openpyxl.styles import Font, PatternFill
-            header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-            header_font = Font(bold=True)
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-            for column_cells in worksheet.columns:
-                max_length = max(len(str(cell.value)) for cell in column_cells if cell.value)
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name="milking_sessions.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        export_format = get_export_format(request.args.get('format'))
+        return export_response(export_format, milking_sessions_export_spec())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -374,9 +473,8 @@ def delete_milking_session(session_id):
         
         # Store information before deletion for summary update
         cow_id = session.cow_id
-        session_date = session.milking_time.date()
+        milking_time = session.milking_time
         volume = session.volume
-        hour = session.milking_time.hour
         milk_batch_id = session.milk_batch_id
         
         # Delete the milking session
@@ -395,30 +493,11 @@ def delete_milking_session(session_id):
                 db.session.delete(batch)
         
         # Update the daily summary
-        summary = DailyMilkSummary.query.filter_by(cow_id=cow_id, date=session_date).first()
-        if summary:
-            # Subtract the volume from the appropriate time period
-            if hour < 12:
-                summary.morning_volume -= volume
-                if summary.morning_volume < 0:  # Safeguard against negative values
-                    summary.morning_volume = 0
-            elif hour < 18:
-                summary.afternoon_volume -= volume
-                if summary.afternoon_volume < 0:
-                    summary.afternoon_volume = 0
-            else:
-                summary.evening_volume -= volume
-                if summary.evening_volume < 0:
-                    summary.evening_volume = 0
-                    
-            # Update total volume
-            summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
-            
-            # If there's no more milk recorded for this cow on this day, delete the summary
-            if summary.total_volume <= 0:
-                db.session.delete(summary)
+        retract_session(cow_id, milking_time, volume)
         
         db.session.commit()
+        invalidate_batch_views()
+        enqueue_cow_change(cow_id, milking_time.date())
         return jsonify({"success": True, "message": "Milking session deleted successfully"}), 200
         
     except Exception as e:
@@ -437,14 +516,11 @@ def update_milking_session(session_id):
         # Store old values for calculations
         old_volume = session.volume
         old_milking_time = session.milking_time
-        old_hour = old_milking_time.hour
-        old_date = old_milking_time.date()
         old_cow_id = session.cow_id
         
         # Store the new values for calculations
         new_volume = float(data.get('volume', old_volume))
         new_milking_time = datetime.fromisoformat(data.get('milking_time', old_milking_time.isoformat()))
-        new_hour = new_milking_time.hour
         new_date = new_milking_time.date()
         new_cow_id = int(data.get('cow_id', old_cow_id))
         
@@ -464,113 +540,19 @@ def update_milking_session(session_id):
                 # Update expiry date if milking time changed
                 if old_milking_time != new_milking_time:
                     batch.production_date = new_milking_time
-                    batch.expiry_date = new_milking_time + timedelta(hours=8)
-                
-        # Handle daily milk summary updates
-        
-        # 1. If date or cow changed, we need to update two summaries
-        if old_date != new_date or old_cow_id != new_cow_id:
-            # First, update the old summary (subtract volume)
-            old_summary = DailyMilkSummary.query.filter_by(
-                cow_id=old_cow_id,
-                date=old_date
-            ).first()
-            
-            if old_summary:
-                # Subtract the old volume from the appropriate time period
-                if old_hour < 12:
-                    old_summary.morning_volume -= old_volume
-                    if old_summary.morning_volume < 0:
-                        old_summary.morning_volume = 0
-                elif old_hour < 18:
-                    old_summary.afternoon_volume -= old_volume
-                    if old_summary.afternoon_volume < 0:
-                        old_summary.afternoon_volume = 0
-                else:
-                    old_summary.evening_volume -= old_volume
-                    if old_summary.evening_volume < 0:
-                        old_summary.evening_volume = 0
-                        
-                # Update total volume
-                old_summary.total_volume = old_summary.morning_volume + old_summary.afternoon_volume + old_summary.evening_volume
-                
-                # If there's no more milk recorded for this cow on this day, delete the summary
-                if old_summary.total_volume <= 0:
-                    db.session.delete(old_summary)
-            
-            # Then, find or create new summary and add volume
-            new_summary = DailyMilkSummary.query.filter_by(
-                cow_id=new_cow_id,
-                date=new_date
-            ).first()
-            
-            if not new_summary:
-                new_summary = DailyMilkSummary(
-                    cow_id=new_cow_id,
-                    date=new_date,
-                    morning_volume=0,
-                    afternoon_volume=0,
-                    evening_volume=0,
-                    total_volume=0
-                )
-                db.session.add(new_summary)
-            
-            # Add the new volume to the appropriate time period
-            if new_hour < 12:
-                new_summary.morning_volume += new_volume
-            elif new_hour < 18:
-                new_summary.afternoon_volume += new_volume
-            else:
-                new_summary.evening_volume += new_volume
-                
-            # Update total volume
-            new_summary.total_volume = new_summary.morning_volume + new_summary.afternoon_volume + new_summary.evening_volume
-        
-        # 2. If only volume or time of day changed but date and cow are the same
-        elif old_volume != new_volume or (old_hour < 12 and new_hour >= 12) or (old_hour < 18 and new_hour >= 18) or (old_hour >= 18 and new_hour < 18):
-            summary = DailyMilkSummary.query.filter_by(
-                cow_id=new_cow_id,
-                date=new_date
-            ).first()
-            
-            if summary:
-                # Remove old volume from old time period
-                if old_hour < 12:
-                    summary.morning_volume -= old_volume
-                    if summary.morning_volume < 0:
-                        summary.morning_volume = 0
-                elif old_hour < 18:
-                    summary.afternoon_volume -= old_volume
-                    if summary.afternoon_volume < 0:
-                        summary.afternoon_volume = 0
-                else:
-                    summary.evening_volume -= old_volume
-                    if summary.evening_volume < 0:
-                        summary.evening_volume = 0
-                
-                # Add new volume to new time period
-                if new_hour < 12:
-                    summary.morning_volume += new_volume
-                elif new_hour < 18:
-                    summary.afternoon_volume += new_volume
-                else:
-                    summary.evening_volume += new_volume
+                    batch.expiry_date = new_milking_time + timedelta(hours=BATCH_SHELF_LIFE_HOURS)
                 
-                # Update total
-                summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
+        # Handle daily milk summary updates (volume, time of day, date or cow)
+        if (old_volume, old_milking_time, old_cow_id) != (new_volume, new_milking_time, new_cow_id):
+            move_session(old_cow_id, old_milking_time, old_volume,
+                         new_cow_id, new_milking_time, new_volume)
         
         db.session.commit()
+        invalidate_batch_views()
         
-        # Get the latest summary data for notification checks
-        updated_summary = DailyMilkSummary.query.filter_by(
-            cow_id=new_cow_id,
-            date=new_date
-        ).first()
-        
-        # Check if evening or afternoon volumes exist to trigger notifications
-        if updated_summary and (updated_summary.evening_volume != 0 or updated_summary.afternoon_volume != 0):
-            check_milk_production_and_notify()
-            check_milk_expiry_and_notify()
+        # Re-evaluate notifications for the old and new cow/day in the background
+        enqueue_cow_change(old_cow_id, old_milking_time.date())
+        enqueue_cow_change(new_cow_id, new_date)
         
         return jsonify({
             "success": True,
@@ -586,430 +568,22 @@ def update_milking_session(session_id):
 @milk_production_bp.route('/export/daily-summaries/pdf', methods=['GET'])
 def export_daily_summaries_pdf():
     try:
-        # Get query parameters
-        cow_id = request.args.get('cow_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        # Initialize query
-        query = DailyMilkSummary.query
-        
-        # Apply filters
-        if cow_id:
-            try:
-                cow_id = int(cow_id)
-                query = query.filter_by(cow_id=cow_id)
-            except ValueError:
-                return jsonify({
-                    "success": False,
-                    "error": "Invalid cow_id format. Must be an integer."
-                }), 400
-        
-        # Validate and apply date filters
-        try:
-            if start_date:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(DailyMilkSummary.date >= start_date)
-            
-            if end_date:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(DailyMilkSummary.date <= end_date)
-                
-            if start_date and end_date and start_date > end_date:
-                return jsonify({
-                    "success": False,
-                    "error": "start_date cannot be later than end_date"
-                }), 400
-                
-        except ValueError:
-            return jsonify({
-                "success": False,
-                "error": "Invalid date format. Use YYYY-MM-DD"
-            }), 400
-        
-        # Execute query and get summaries
-        summaries = query.order_by(DailyMilkSummary.date.desc()).all()
-        
-        # Check if cow is male (no milk production data)
-        cow_info = None
-        if cow_id and summaries:
-            cow_info = summaries[0].cow
-        elif cow_id:
-            # Get cow info even if no milk production data
-            from app.models.cows import Cow
-            cow_info = Cow.query.get(cow_id)
-        
-        # Check if this is a male cow
-        is_male_cow = cow_info and cow_info.gender and cow_info.gender.lower() == 'male'
-        
-        # Create PDF
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", style="B", size=16)
-        
-        # Title based on cow type
-        if is_male_cow:
-            pdf.cell(200, 10, txt="Laporan Sapi Pejantan", ln=True, align='C')
-        else:
-            pdf.cell(200, 10, txt="Laporan Produksi Susu Harian", ln=True, align='C')
-        pdf.ln(5)
-        
-        # Add filter information
-        pdf.set_font("Arial", size=10)
-        filter_text = "Filter: "
-        if cow_id:
-            cow_name = cow_info.name if cow_info else f"Cow ID: {cow_id}"
-            filter_text += f"Sapi: {cow_name}, "
-        if start_date:
-            filter_text += f"Dari: {start_date.strftime('%Y-%m-%d')}, "
-        if end_date:
-            filter_text += f"Sampai: {end_date.strftime('%Y-%m-%d')}, "
-        
-        if filter_text == "Filter: ":
-            filter_text += "Semua data"
-        else:
-            filter_text = filter_text[:-2]  # Remove last comma and space
-            
-        pdf.cell(200, 10, txt=filter_text, ln=True, align='C')
-        pdf.ln(10)
-
-        if is_male_cow:
-            # Special content for male cows
-            pdf.set_font("Arial", style="B", size=14)
-            pdf.cell(200, 10, txt="INFORMASI SAPI PEJANTAN", ln=True, align='C')
-            pdf.ln(10)
-            
-            # Cow information
-            pdf.set_font("Arial", size=12)
-            pdf.cell(200, 8, txt=f"Nama Sapi: {cow_info.name}", ln=True)
-            pdf.cell(200, 8, txt=f"ID: {cow_info.id}", ln=True)
-            pdf.cell(200, 8, txt=f"Jenis Kelamin: {cow_info.gender}", ln=True)
-            pdf.cell(200, 8, txt=f"Ras: {cow_info.breed if cow_info.breed else 'N/A'}", ln=True)
-            
-            # Calculate age
-            if cow_info.birth:
-                from datetime import date
-                birth_date = cow_info.birth if isinstance(cow_info.birth, date) else cow_info.birth.date()
-                today = date.today()
-                age_years = today.year - birth_date.year
-                age_months = today.month - birth_date.month
-                if age_months < 0:
-                    age_years -= 1
-                    age_months += 12
-                age_str = f"{age_years} tahun {age_months} bulan"
-            else:
-                age_str = "N/A"
-            
-            pdf.cell(200, 8, txt=f"Umur: {age_str}", ln=True)
-            pdf.ln(10)
-            
-            # Status and function
-            pdf.set_font("Arial", style="B", size=12)
-            pdf.cell(200, 8, txt="STATUS DAN FUNGSI:", ln=True)
-            pdf.set_font("Arial", size=11)
-            pdf.cell(200, 8, txt="• Status: Sapi Pejantan - Aktif untuk pembiakan", ln=True)
-            pdf.cell(200, 8, txt="• Fungsi Utama: Pembiakan dan pemuliaan genetik", ln=True)
-            pdf.cell(200, 8, txt="• Peran: Menghasilkan keturunan dengan genetik unggul", ln=True)
-            pdf.cell(200, 8, txt="• Tidak menghasilkan susu karena jenis kelamin jantan", ln=True)
-            pdf.ln(10)
-            
-            # Add note
-            pdf.set_font("Arial", style="I", size=10)
-            pdf.cell(200, 8, txt="Catatan: Sapi pejantan tidak diperah karena tidak menghasilkan susu.", ln=True)
-            pdf.cell(200, 8, txt="Laporan ini hanya menampilkan informasi dasar tentang sapi pejantan.", ln=True)
-            
-        else:
-            # Normal milk production table for female cows
-            if len(summaries) == 0:
-                pdf.set_font("Arial", size=12)
-                pdf.cell(200, 10, txt="Tidak ada data produksi susu untuk periode yang dipilih", ln=True, align='C')
-            else:
-                # Create table headers
-                pdf.set_fill_color(173, 216, 230)
-                pdf.set_text_color(0, 0, 0)
-                pdf.set_font("Arial", style="B", size=10)
-                pdf.cell(10, 10, "NO", border=1, align='C', fill=True)
-                pdf.cell(50, 10, "Sapi", border=1, align='C', fill=True)
-                pdf.cell(30, 10, "Tanggal", border=1, align='C', fill=True)
-                pdf.cell(25, 10, "Pagi", border=1, align='C', fill=True)
-                pdf.cell(25, 10, "Siang", border=1, align='C', fill=True)
-                pdf.cell(25, 10, "Sore", border=1, align='C', fill=True)
-                pdf.cell(25, 10, "Total", border=1, align='C', fill=True)
-                pdf.ln()
-
-                # Add data rows
-                pdf.set_font("Arial", size=10)
-                for idx, summary in enumerate(summaries, start=1):
-                    cow_info = f"{summary.cow_id} - {summary.cow.name}" if summary.cow else str(summary.cow_id)
-                    
-                    pdf.cell(10, 10, str(idx), border=1, align='C')
-                    pdf.cell(50, 10, cow_info, border=1)
-                    pdf.cell(30, 10, summary.date.strftime('%Y-%m-%d'), border=1, align='C')
-                    pdf.cell(25, 10, str(round(float(summary.morning_volume or 0), 2)), border=1, align='R')
-                    pdf.cell(25, 10, str(round(float(summary.afternoon_volume or 0), 2)), border=1, align='R')
-                    pdf.cell(25, 10, str(round(float(summary.evening_volume or 0), 2)), border=1, align='R')
-                    pdf.cell(25, 10, str(round(float(summary.total_volume or 0), 2)), border=1, align='R')
-                    pdf.ln()
-
-                # Add totals row
-                total_morning = sum(float(s.morning_volume or 0) for s in summaries)
-                total_afternoon = sum(float(s.afternoon_volume or 0) for s in summaries)
-                total_evening = sum(float(s.evening_volume or 0) for s in summaries)
-                total_all = sum(float(s.total_volume or 0) for s in summaries)
-                
-                pdf.set_font("Arial", style="B", size=10)
-                pdf.cell(90, 10, "TOTAL", border=1, align='C', fill=True)
-                pdf.cell(25, 10, str(round(total_morning, 2)), border=1, align='R', fill=True)
-                pdf.cell(25, 10, str(round(total_afternoon, 2)), border=1, align='R', fill=True)
-                pdf.cell(25, 10, str(round(total_evening, 2)), border=1, align='R', fill=True)
-                pdf.cell(25, 10, str(round(total_all, 2)), border=1, align='R', fill=True)
-
-        # Output PDF file
-            buffer = BytesIO()
-            pdf_bytes = pdf.output(dest='S').encode('latin-1')
-            buffer.write(pdf_bytes)
-            buffer.seek(0)
-            
-            # Generate filename
-            if is_male_cow:
-                filename = f"bull_report_{cow_info.name.replace(' ', '_')}.pdf"
-            else:
-                filename = "daily_milk_production.pdf"
-                if start_date and end_date:
-                    filename = f"milk_production_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.pdf"
-                elif cow_id:
-                    filename = f"milk_production_cow_{cow_id}.pdf"
-            
-            return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+        content, filename = render_daily_summaries_pdf(request.args)
+        return send_file(BytesIO(content), as_attachment=True, download_name=filename, mimetype=PDF_MIMETYPE)
     
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @milk_production_bp.route('/export/daily-summaries/excel', methods=['GET'])
 def export_daily_summaries_excel():
     try:
-        # Get query parameters
-        cow_id = request.args.get('cow_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        # Initialize query
-        query = DailyMilkSummary.query
-        
-        # Apply filters
-        if cow_id:
-            try:
-                cow_id = int(cow_id)
-                query = query.filter_by(cow_id=cow_id)
-            except ValueError:
-                return jsonify({
-                    "success": False,
-                    "error": "Invalid cow_id format. Must be an integer."
-                }), 400
-        
-        # Validate and apply date filters
-        try:
-            if start_date:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(DailyMilkSummary.date >= start_date)
-            
-            if end_date:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(DailyMilkSummary.date <= end_date)
-                
-            if start_date and end_date and start_date > end_date:
-                return jsonify({
-                    "success": False,
-                    "error": "start_date cannot be later than end_date"
-                }), 400
-                
-        except ValueError:
-            return jsonify({
-                "success": False,
-                "error": "Invalid date format. Use YYYY-MM-DD"
-            }), 400
-        
-        # Execute query and get summaries
-        summaries = query.order_by(DailyMilkSummary.date.desc()).all()
-        
-        # Check if cow is male (no milk production data)
-        cow_info = None
-        if cow_id and summaries:
-            cow_info = summaries[0].cow
-        elif cow_id:
-            # Get cow info even if no milk production data
-            from app.models.cows import Cow
-            cow_info = Cow.query.get(cow_id)
-        
-        # Check if this is a male cow
-        is_male_cow = cow_info and cow_info.gender and cow_info.gender.lower() == 'male'
-        
-        # Create DataFrame and Excel file
-        buffer = BytesIO()
-        
-        if is_male_cow:
-            # Create special Excel for male cows
-            data = [{
-                "Informasi": "Nama Sapi",
-                "Detail": cow_info.name
-            }, {
-                "Informasi": "ID Sapi",
-                "Detail": cow_info.id
-            }, {
-                "Informasi": "Jenis Kelamin",
-                "Detail": cow_info.gender
-            }, {
-                "Informasi": "Ras",
-                "Detail": cow_info.breed if cow_info.breed else 'N/A'
-            }, {
-                "Informasi": "Status",
-                "Detail": "Sapi Pejantan - Aktif untuk pembiakan"
-            }, {
-                "Informasi": "Fungsi",
-                "Detail": "Pembiakan dan pemuliaan genetik"
-            }, {
-                "Informasi": "Catatan",
-                "Detail": "Sapi pejantan tidak menghasilkan susu"
-            }]
-            
-            # Add age calculation
-            if cow_info.birth:
-                from datetime import date
-                birth_date = cow_info.birth if isinstance(cow_info.birth, date) else cow_info.birth.date()
-                today = date.today()
-                age_years = today.year - birth_date.year
-                age_months = today.month - birth_date.month
-                if age_months < 0:
-                    age_years -= 1
-                    age_months += 12
-                age_str = f"{age_years} tahun {age_months} bulan"
-                data.insert(4, {
-                    "Informasi": "Umur",
-                    "Detail": age_str
-                })
-            
-            df = pd.DataFrame(data)
-            
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='InformasiPejantan')
-                workbook = writer.book
-                worksheet = writer.sheets['InformasiPejantan']
-                
-                # Apply styling
-                from openpyxl.styles import Font, PatternFill, Alignment
-                header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-                header_font = Font(bold=True)
-                
-                # Style headers
-                for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                
-                # Auto-adjust column widths
-                for column_cells in worksheet.columns:
-                    max_length = max(len(str(cell.value) or "") for cell in column_cells)
-                    adjusted_width = max_length + 2
-                    worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-        else:
-            # Normal Excel for female cows with milk production data
-            summaries_list = []
-            
-            if len(summaries) == 0:
-                # Create empty data message
-                summaries_list.append({
-                    "NO": "",
-                    "Sapi": "Tidak ada data",
-                    "Tanggal": "",
-                    "Produksi Pagi": 0,
-                    "Produksi Siang": 0,
-                    "Produksi Sore": 0,
-                    "Total Produksi": 0
-                })
-            else:
-                for idx, summary in enumerate(summaries, start=1):
-                    cow_info = f"{summary.cow_id} - {summary.cow.name}" if summary.cow else str(summary.cow_id)
-                    
-                    summaries_list.append({
-                        "NO": idx,
-                        "Sapi": cow_info,
-                        "Tanggal": summary.date.strftime('%Y-%m-%d'),
-                        "Produksi Pagi": float(summary.morning_volume or 0),
-                        "Produksi Siang": float(summary.afternoon_volume or 0),
-                        "Produksi Sore": float(summary.evening_volume or 0),
-                        "Total Produksi": float(summary.total_volume or 0)
-                    })
-                
-                # Add total row if there's data
-                if summaries_list and len(summaries) > 0:
-                    total_morning = sum(float(s.morning_volume or 0) for s in summaries)
-                    total_afternoon = sum(float(s.afternoon_volume or 0) for s in summaries)
-                    total_evening = sum(float(s.evening_volume or 0) for s in summaries)
-                    total_all = sum(float(s.total_volume or 0) for s in summaries)
-                    
-                    summaries_list.append({
-                        "NO": "",
-                        "Sapi": "TOTAL",
-                        "Tanggal": "",
-                        "Produksi Pagi": total_morning,
-                        "Produksi Siang": total_afternoon,
-                        "Produksi Sore": total_evening,
-                        "Total Produksi": total_all
-                    })
-
-            df = pd.DataFrame(summaries_list)
-            
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='DailyMilkProduction')
-                workbook = writer.book
-                worksheet = writer.sheets['DailyMilkProduction']
-                
-                # Apply styling
-                from openpyxl.styles import Font, PatternFill, Alignment
-                header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-                header_font = Font(bold=True)
-                total_fill = PatternFill(start_color="E6E6E6", end_color="E6E6E6", fill_type="solid")
-                total_font = Font(bold=True)
-                
-                # Style headers
-                for cell in worksheet[1]:
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                
-                # Style totals row if it exists and there's actual data
-                if len(summaries_list) > 1 and len(summaries) > 0:
-                    for cell in worksheet[len(summaries_list) + 1]:  # +1 for header row
-                        cell.fill = total_fill
-                        cell.font = total_font
-                
-                # Auto-adjust column widths
-                for column_cells in worksheet.columns:
-                    max_length = max(len(str(cell.value) or "") for cell in column_cells)
-                    adjusted_width = max_length + 2
-                    worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-        
-        # Prepare file for download
-        buffer.seek(0)
-        
-        # Generate filename
-        if is_male_cow:
-            filename = f"bull_report_{cow_info.name.replace(' ', '_')}.xlsx"
-        else:
-            filename = "daily_milk_production.xlsx"
-            if start_date and end_date:
-                filename = f"milk_production_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
-            elif cow_id:
-                filename = f"milk_production_cow_{cow_id}.xlsx"
-            
-        return send_file(
-            buffer, 
-            as_attachment=True, 
-            download_name=filename, 
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        export_format = get_export_format(request.args.get('format'))
+        return export_response(export_format, daily_summaries_export_spec(request.args))
     
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
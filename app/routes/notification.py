@@ -1,12 +1,27 @@
 from flask import Blueprint, jsonify, request
 from app.models.notification import Notification
+from app.models.production_rule import ProductionRule
 from app.database.database import db
-from pytz import timezone
+from app.services.notification_counters import adjust_counters, deduct_notifications, get_counts
+from app.services.production_rules import invalidate_production_rules, validate_rule
+from app.utils.pagination import encode_cursor, decode_cursor, parse_limit
+from app.socket import emit_notification_state
+from datetime import datetime
+from pytz import timezone, utc
+from sqlalchemy import and_, delete, or_, update
 
 notification_bp = Blueprint('notification', __name__)
 
 @notification_bp.route('/', methods=['GET'])
 def get_notifications():
+    """
+    A user's notifications, newest first.
+
+    `page`/`per_page` give the legacy numbered pages. Passing `limit` and/or
+    `cursor` switches to keyset pagination on (created_at, id) and the
+    response carries `next_cursor`. Totals come from the user's notification
+    counters instead of a COUNT query.
+    """
     user_id = request.args.get('user_id', type=int)
     
     if not user_id:
@@ -16,6 +31,9 @@ def get_notifications():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     is_read = request.args.get('is_read', None)
+    cursor = request.args.get('cursor')
+    raw_limit = request.args.get('limit')
+    paginated = cursor is not None or raw_limit is not None
 
     # Build query
     query = Notification.query.filter_by(user_id=user_id)
@@ -24,11 +42,33 @@ def get_notifications():
         is_read = is_read.lower() == 'true'
         query = query.filter_by(is_read=is_read)
 
+    unread_count, total_count = get_counts(user_id)
+    if is_read is None:
+        total = total_count
+    else:
+        total = total_count - unread_count if is_read else unread_count
+
     # Order by newest first
-    query = query.order_by(Notification.created_at.desc())
+    query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
 
-    # Paginate results
-    notifications = query.paginate(page=page, per_page=per_page)
+    if paginated:
+        try:
+            limit = parse_limit(raw_limit, default=per_page)
+            if cursor:
+                cursor_time, cursor_id = decode_cursor(cursor)
+                query = query.filter(or_(
+                    Notification.created_at < cursor_time,
+                    and_(Notification.created_at == cursor_time, Notification.id < cursor_id)
+                ))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Fetch one extra row to know whether another page exists
+        items = query.limit(limit + 1).all()
+        has_more = len(items) > limit
+        items = items[:limit]
+    else:
+        per_page = max(per_page, 1)
+        items = query.offset((max(page, 1) - 1) * per_page).limit(per_page).all()
 
     # Convert created_at ke Asia/Jakarta timezone
     jakarta = timezone("Asia/Jakarta")
@@ -42,13 +82,24 @@ def get_notifications():
                 'type': n.type,
                 'is_read': n.is_read,
                 'created_at': n.created_at.astimezone(jakarta).isoformat() if n.created_at else None
-            } for n in notifications.items
+            } for n in items
         ],
-        'total': notifications.total,
-        'pages': notifications.pages,
-        'current_page': page
+        'total': total,
+        'unread_count': unread_count
     }
 
+    if paginated:
+        result.update({
+            'next_cursor': encode_cursor(items[-1].created_at, items[-1].id) if has_more and items else None,
+            'has_more': has_more,
+            'limit': limit
+        })
+    else:
+        result.update({
+            'pages': -(-total // per_page),
+            'current_page': page
+        })
+
     return jsonify(result)
 
 
@@ -59,9 +110,17 @@ def mark_as_read(notification_id):
     if not user_id:
         return jsonify({"error": "Missing user_id in request body"}), 400
     
-    notification = Notification.query.filter_by(id=notification_id, user_id=user_id).first_or_404()
-    notification.is_read = True
+    Notification.query.filter_by(id=notification_id, user_id=user_id).first_or_404()
+    # Only the request that actually flips the flag decrements the counter
+    result = db.session.execute(
+        update(Notification)
+        .where(Notification.id == notification_id, Notification.is_read == False)  # noqa: E712
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    adjust_counters({int(user_id): (-result.rowcount, 0)})
     db.session.commit()
+    _publish_state(int(user_id), 'read', result.rowcount)
     
     return jsonify({'message': 'Notifikasi ditandai sudah dibaca'})
 
@@ -73,8 +132,8 @@ def get_unread_count():
     if not user_id:
         return jsonify({"error": "Missing user_id parameter"}), 400
     
-    count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
-    return jsonify({'unread_count': count})
+    unread_count, _ = get_counts(user_id)
+    return jsonify({'unread_count': unread_count})
 
 
 @notification_bp.route('/<int:notification_id>', methods=['DELETE'])
@@ -85,23 +144,174 @@ def delete_notification(notification_id):
         return jsonify({"error": "Missing user_id in request body"}), 400
     
     notification = Notification.query.filter_by(id=notification_id, user_id=user_id).first_or_404()
+    deduct_notifications(Notification.id == notification.id)
     db.session.delete(notification)
     db.session.commit()
+    _publish_state(int(user_id), 'delete', 1)
     
     return jsonify({'message': 'Notifikasi dihapus'})
 
-# ...existing code...
-
 @notification_bp.route('/clear-all', methods=['DELETE'])
 def clear_all_notifications():
     user_id = request.json.get('user_id')
     if not user_id:
         return jsonify({"error": "Missing user_id in request body"}), 400
 
-    notifications = Notification.query.filter_by(user_id=user_id).all()
-    for n in notifications:
-        db.session.delete(n)
+    state = _delete_notifications(int(user_id), [])
+    return jsonify({'message': 'Semua notifikasi dihapus', 'deleted': state['affected']})
+
+
+def _parse_selection(data):
+    """
+    Criteria for the bulk endpoints from a JSON body: `ids` (list of ids),
+    `before` (ISO timestamp, created at or before), `type` and `is_read`.
+    Returns (criteria, error message).
+    """
+    criteria = []
+    if data.get('ids') is not None:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return None, "ids must be a list of integers"
+        criteria.append(Notification.id.in_(ids))
+    if data.get('before'):
+        try:
+            before = datetime.fromisoformat(data['before'])
+        except (TypeError, ValueError):
+            return None, "Invalid before timestamp. Use ISO 8601"
+        if before.tzinfo is not None:
+            before = before.astimezone(utc).replace(tzinfo=None)
+        criteria.append(Notification.created_at <= before)
+    if data.get('type'):
+        criteria.append(Notification.type == data['type'])
+    if data.get('is_read') is not None:
+        criteria.append(Notification.is_read == bool(data['is_read']))
+    return criteria, None
+
+
+def _publish_state(user_id, action, affected):
+    """Counters after a change, pushed once to every tab of the user"""
+    unread_count, total = get_counts(user_id)
+    state = {'action': action, 'affected': affected, 'unread_count': unread_count, 'total': total}
+    if affected:
+        emit_notification_state(user_id, state)
+    return state
+
+
+def _delete_notifications(user_id, criteria):
+    where = [Notification.user_id == user_id, *criteria]
+    deduct_notifications(*where)
+    result = db.session.execute(
+        delete(Notification).where(*where).execution_options(synchronize_session=False)
+    )
     db.session.commit()
-    return jsonify({'message': 'Semua notifikasi dihapus'})
+    return _publish_state(user_id, 'delete', result.rowcount)
+
+
+@notification_bp.route('/read', methods=['PUT'])
+def mark_many_as_read():
+    """
+    Mark notifications read in one statement: by `ids`, by `before`
+    timestamp, or everything with `"all": true`.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id in request body"}), 400
+
+    criteria, error = _parse_selection({key: data.get(key) for key in ('ids', 'before')})
+    if error:
+        return jsonify({"error": error}), 400
+    if not criteria and not data.get('all'):
+        return jsonify({"error": "Provide ids, before or all"}), 400
+
+    user_id = int(user_id)
+    try:
+        result = db.session.execute(
+            update(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read == False, *criteria)  # noqa: E712
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        )
+        adjust_counters({user_id: (-result.rowcount, 0)})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(dict(_publish_state(user_id, 'read', result.rowcount), updated=result.rowcount))
+
 
-# ...existing code...
\ No newline at end of file
+@notification_bp.route('/bulk', methods=['DELETE'])
+def delete_many_notifications():
+    """
+    Delete notifications matching `ids`, `before`, `type` and/or `is_read`
+    in one statement; `"all": true` deletes everything.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({"error": "Missing user_id in request body"}), 400
+
+    criteria, error = _parse_selection(data)
+    if error:
+        return jsonify({"error": error}), 400
+    if not criteria and not data.get('all'):
+        return jsonify({"error": "Provide ids, before, type, is_read or all"}), 400
+
+    try:
+        state = _delete_notifications(int(user_id), criteria)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(dict(state, deleted=state['affected']))
+
+
+@notification_bp.route('/production-rules', methods=['GET'])
+def list_production_rules():
+    """Production notification rules; `active=true|false` filters on is_active"""
+    query = ProductionRule.query
+    active = request.args.get('active')
+    if active is not None:
+        query = query.filter(ProductionRule.is_active == (active.lower() == 'true'))
+    rules = query.order_by(ProductionRule.notification_type, ProductionRule.id).all()
+    return jsonify({'rules': [rule.to_dict() for rule in rules]})
+
+
+@notification_bp.route('/production-rules', methods=['POST'])
+def create_production_rule():
+    try:
+        values = validate_rule(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rule = ProductionRule(**values)
+    db.session.add(rule)
+    db.session.commit()
+    invalidate_production_rules()
+    return jsonify(rule.to_dict()), 201
+
+
+@notification_bp.route('/production-rules/<int:rule_id>', methods=['PUT'])
+def update_production_rule(rule_id):
+    """Partial update: omitted fields keep their current values"""
+    rule = ProductionRule.query.filter_by(id=rule_id).first_or_404()
+    try:
+        values = validate_rule(dict(rule.to_dict(), **(request.get_json(silent=True) or {})))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    for field, value in values.items():
+        setattr(rule, field, value)
+    db.session.commit()
+    invalidate_production_rules()
+    return jsonify(rule.to_dict())
+
+
+@notification_bp.route('/production-rules/<int:rule_id>', methods=['DELETE'])
+def delete_production_rule(rule_id):
+    rule = ProductionRule.query.filter_by(id=rule_id).first_or_404()
+    db.session.delete(rule)
+    db.session.commit()
+    invalidate_production_rules()
+    return jsonify({'message': 'Production rule deleted'})
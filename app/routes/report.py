@@ -0,0 +1,85 @@
+from flask import Blueprint, jsonify, request, send_file, url_for
+from app.models.report_job import ReportJobStatus
+from app.services.reports import REPORT_DEFINITIONS
+from app.services.report_jobs import report_job_service
+import logging
+
+report_bp = Blueprint('report', __name__)
+
+def _job_payload(job):
+    payload = report_job_service.serialize(job)
+    payload["download_url"] = (
+        url_for('report.download_report', job_id=job.id)
+        if job.status == ReportJobStatus.DONE else None
+    )
+    return payload
+
+@report_bp.route('/types', methods=['GET'])
+def list_report_types():
+    """List the report types that can be submitted and their parameters"""
+    return jsonify({
+        "success": True,
+        "types": [
+            {"report_type": definition.name, "params": list(definition.params)}
+            for definition in REPORT_DEFINITIONS.values()
+        ]
+    }), 200
+
+@report_bp.route('/jobs', methods=['POST'])
+def submit_report_job():
+    """
+    Submit a report for background generation.
+    Body: {"report_type": "daily_summaries_pdf", "params": {"cow_id": 1, ...}}
+    Identical requests return the in-flight or recently finished job.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        report_type = data.get('report_type')
+        if not report_type:
+            return jsonify({"success": False, "error": "report_type is required"}), 400
+
+        job, reused = report_job_service.submit(report_type, data.get('params'))
+        return jsonify({
+            "success": True,
+            "reused": reused,
+            "job": _job_payload(job)
+        }), 200 if job.status == ReportJobStatus.DONE else 202
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error submitting report job: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@report_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """Poll the status of a report job"""
+    try:
+        job = report_job_service.get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "Report job not found"}), 404
+        return jsonify({"success": True, "job": _job_payload(job)}), 200
+    except Exception as e:
+        logging.error(f"Error getting report job {job_id}: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@report_bp.route('/jobs/<job_id>/download', methods=['GET'])
+def download_report(job_id):
+    """Download the artifact of a finished report job"""
+    try:
+        job = report_job_service.get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "Report job not found"}), 404
+        if job.status != ReportJobStatus.DONE:
+            return jsonify({
+                "success": False,
+                "error": f"Report is not ready (status: {job.status.value})"
+            }), 409
+
+        path = report_job_service.artifact_path(job)
+        if not path:
+            return jsonify({"success": False, "error": "Report file has expired, please submit it again"}), 410
+
+        return send_file(path, as_attachment=True, download_name=job.filename, mimetype=job.mimetype)
+    except Exception as e:
+        logging.error(f"Error downloading report job {job_id}: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
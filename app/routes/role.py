@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.models.roles import Role
 from app.database.database import db
+from app.services.role_members import invalidate_role_members
 
 role_bp = Blueprint('role', __name__)
 
@@ -37,6 +38,7 @@ def add_role():
         # Simpan ke database
         db.session.add(new_role)
         db.session.commit()
+        invalidate_role_members()
 
         return jsonify({"message": "Role added successfully", "role": {
             "id": new_role.id,
@@ -1,6 +1,10 @@
 from flask import Blueprint, jsonify
-from app.services.notification import check_milk_production_and_notify, check_milk_expiry_and_notify
+from app.services.notification import check_milk_production_and_notify, check_milk_expiry_and_notify, notification_service
 from app.services.notificationScheduler import notification_scheduler
+from app.services.notification_queue import notification_queue
+from app.socket import emit_outbox, get_presence
+from app.services.notification_outbox import notification_relay
+from app.services.notification_retention import notification_retention
 import logging
 
 scheduler_bp = Blueprint('scheduler', __name__)
@@ -37,22 +41,16 @@ def trigger_expiry_check():
 def scheduler_status():
     """Get scheduler status"""
     try:
-        is_running = notification_scheduler.scheduler.running if notification_scheduler.scheduler else False
-        jobs = []
-        
-        if notification_scheduler.scheduler and is_running:
-            for job in notification_scheduler.scheduler.get_jobs():
-                jobs.append({
-                    'id': job.id,
-                    'name': job.name,
-                    'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None
-                })
-        
-        return jsonify({
-            "success": True,
-            "scheduler_running": is_running,
-            "jobs": jobs
-        }), 200
+        return jsonify(dict(
+            notification_scheduler.get_status(),
+            success=True,
+            notification_queue=dict(notification_queue.stats, pending_cows=notification_queue.pending_count()),
+            emit_outbox=emit_outbox.get_stats(),
+            notification_outbox=notification_relay.get_stats(),
+            notification_rate_limit=notification_service.rate_limiter.get_stats(),
+            notification_retention=notification_retention.get_stats(),
+            socket_presence=get_presence().stats()
+        )), 200
     except Exception as e:
         logging.error(f"Error getting scheduler status: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
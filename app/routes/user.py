@@ -3,10 +3,13 @@ from werkzeug.security import generate_password_hash
 from app.models.users import User
 from app.models.roles import Role
 from app.database.database import db
-from fpdf import FPDF
 from flask import send_file
 from io import BytesIO
-import pandas as pd
+from app.services.export import export_response, get_export_format
+from app.services.reports import PDF_MIMETYPE, users_export_spec, render_users_pdf
+from app.services.managed_cows import invalidate_managed_cows
+from app.services.role_members import invalidate_role_members
+from app.services.notification_counters import create_counters
 from werkzeug.security import check_password_hash
 import logging
 import traceback
@@ -115,7 +118,10 @@ def add_user():
 
         # Simpan ke database
         db.session.add(new_user)
+        db.session.flush()
+        create_counters(new_user.id)
         db.session.commit()
+        invalidate_role_members()
 
         return jsonify({"message": "User added successfully", "user": {
             "name": new_user.name,  # Tambahkan name
@@ -134,54 +140,8 @@ def add_user():
 @user_bp.route('/export/pdf', methods=['GET'])
 def export_users_pdf():
     try:
-        # Ambil semua data pengguna dari database
-        users = User.query.join(Role, User.role_id == Role.id).add_columns(
-            User.id, User.name, User.username, User.email, User.contact,
-            User.religion, User.birth, Role.name.label('role_name')
-        ).all()
-
-        # Buat PDF
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # Tambahkan deskripsi di bagian atas
-        pdf.set_font("Arial", style="B", size=16)
-        pdf.cell(200, 10, txt="Laporan Data Pengguna", ln=True, align='C')
-        pdf.ln(5)
-        pdf.set_font("Arial", size=10)
-        pdf.cell(200, 10, txt="Berikut adalah daftar pengguna yang terdaftar dalam sistem.", ln=True, align='C')
-        pdf.ln(10)
-
-        # Tambahkan header tabel dengan warna latar belakang
-        pdf.set_fill_color(173, 216, 230)  # Warna biru muda (RGB)
-        pdf.set_text_color(0, 0, 0)  # Warna teks hitam
-        pdf.set_font("Arial", style="B", size=10)
-        pdf.cell(20, 10, "NO", border=1, align='C', fill=True)  # Ganti ID menjadi NO
-        pdf.cell(40, 10, "Name", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Username", border=1, align='C', fill=True)
-        pdf.cell(50, 10, "Email", border=1, align='C', fill=True)
-        pdf.cell(40, 10, "Role", border=1, align='C', fill=True)
-        pdf.ln()
-
-        # Isi data
-        pdf.set_font("Arial", size=10)
-        for idx, user in enumerate(users, start=1):  # Gunakan enumerate untuk nomor urut
-            pdf.cell(20, 10, str(idx), border=1, align='C')  # Tampilkan nomor urut
-            pdf.cell(40, 10, user.name, border=1)
-            pdf.cell(40, 10, user.username, border=1)
-            pdf.cell(50, 10, user.email, border=1)
-            pdf.cell(40, 10, user.role_name, border=1)
-            pdf.ln()
-
-        # Simpan PDF ke buffer (di luar loop)
-        buffer = BytesIO()
-        pdf_bytes = pdf.output(dest='S').encode('latin1')
-        buffer.write(pdf_bytes)
-        buffer.seek(0)
-
-        return send_file(buffer, as_attachment=True, download_name="users.pdf", mimetype='application/pdf')
+        content, filename = render_users_pdf()
+        return send_file(BytesIO(content), as_attachment=True, download_name=filename, mimetype=PDF_MIMETYPE)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -189,55 +149,11 @@ def export_users_pdf():
 @user_bp.route('/export/excel', methods=['GET'])
 def export_users_excel():
     try:
-        # Ambil semua data pengguna dari database dengan join ke tabel Role
-        users = User.query.join(Role, User.role_id == Role.id).add_columns(
-            User.id, User.name, User.username, User.email, User.contact,
-            User.religion, User.birth, Role.name.label('role_name')
-        ).all()
-
-        # Format data pengguna menjadi list of dictionaries
-        users_list = [{
-            "NO": idx,  # Tambahkan nomor urut
-            "Name": user.name,
-            "Username": user.username,
-            "Email": user.email,
-            "Contact": user.contact,
-            "Religion": user.religion,
-            "Role": user.role_name,  # Ganti Role ID dengan nama role
-            "Birth": user.birth
-        } for idx, user in enumerate(users, start=1)]  # Gunakan enumerate untuk nomor urut
-
-        # Buat DataFrame
-        df = pd.DataFrame(users_list)
-
-        # Simpan ke buffer dengan pewarnaan
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Users')
-
-            # Akses workbook dan worksheet untuk styling
-            workbook = writer.book
-            worksheet = writer.sheets['Users']
-
-            # Tambahkan pewarnaan header
-            from openpyxl.styles import Font, PatternFill
-            header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-            header_font = Font(bold=True)
-
-            for cell in worksheet[1]:  # Baris pertama adalah header
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # Atur lebar kolom secara otomatis
-            for column_cells in worksheet.columns:
-                max_length = max(len(str(cell.value)) for cell in column_cells if cell.value)
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-
-        buffer.seek(0)
-
-        return send_file(buffer, as_attachment=True, download_name="users.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        export_format = get_export_format(request.args.get('format'))
+        return export_response(export_format, users_export_spec())
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -689,6 +605,8 @@ def delete_user(user_id):
             logger.info(f"Step 4: Deleting user {user_id}")
             db.session.delete(user)
             db.session.commit()
+            invalidate_managed_cows(user_id)
+            invalidate_role_members()
             
             logger.info(f"User {user_id} successfully deleted with all relationships")
             return jsonify({
@@ -740,6 +658,7 @@ def update_user(user_id):
         user.role_id = data.get("role_id", user.role_id)
 
         db.session.commit()
+        invalidate_role_members()
 
         return jsonify({"message": "User updated successfully"}), 200
 
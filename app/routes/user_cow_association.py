@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from app.models.users import User
 from app.models.cows import Cow
 from app.database.database import db
+from app.services.managed_cows import invalidate_managed_cows
 
 user_cow_bp = Blueprint('user_cow', __name__)
 
@@ -31,6 +32,7 @@ def assign_cow_to_user():
         # Tambahkan relasi
         user.managed_cows.append(cow)
         db.session.commit()
+        invalidate_managed_cows(user.id)
 
         return jsonify({"message": "Cow assigned to user successfully"}), 200
 
@@ -65,6 +67,7 @@ def unassign_cow_from_user():
         # Hapus relasi
         user.managed_cows.remove(cow)
         db.session.commit()
+        invalidate_managed_cows(user.id)
 
         return jsonify({"message": "Cow unassigned from user successfully"}), 200
 
@@ -0,0 +1,93 @@
+"""
+Managed Cow Cache
+
+Per-user cache of the cow ids a user manages (`user_cow_association`).
+Batch visibility on the /milk-expiry endpoints is derived from this set with
+a subquery on `milking_sessions`, so resolving a user's batches costs no
+queries on a cache hit and never builds an id list of batches in Python.
+
+Entries are dropped by the /user-cow assign and unassign handlers (and on
+user or cow deletion). The TTL bounds staleness for changes made by other
+worker processes.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.database.database import db
+from app.models.milking_sessions import MilkingSession
+from app.models.user_cow_association import user_cow_association
+
+logger = logging.getLogger(__name__)
+
+
+class ManagedCowCache:
+    """Caches user_id -> frozenset of managed cow ids"""
+
+    def __init__(self):
+        self._entries: Dict[int, Tuple[float, FrozenSet[int]]] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load only stores its result if no
+        # invalidation ran while it was querying
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _ttl(self) -> float:
+        return current_app.config.get('MANAGED_COW_CACHE_TTL_SECONDS', 300)
+
+    def get(self, user_id: int) -> FrozenSet[int]:
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            generation = self._generation
+
+        cow_ids = frozenset(db.session.execute(
+            select(user_cow_association.c.cow_id).where(user_cow_association.c.user_id == user_id)
+        ).scalars())
+
+        with self._lock:
+            if self._generation == generation:
+                self._entries[user_id] = (now + self._ttl(), cow_ids)
+        return cow_ids
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Drop one user's entry, or every entry when user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(user_id), None)
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+
+# Global cache instance
+managed_cow_cache = ManagedCowCache()
+
+
+def get_managed_cow_ids(user_id: int) -> FrozenSet[int]:
+    """Cow ids managed by the user"""
+    return managed_cow_cache.get(user_id)
+
+
+def invalidate_managed_cows(user_id: Optional[int] = None) -> None:
+    """Forget cached assignments for a user (or all users)"""
+    managed_cow_cache.invalidate(user_id)
+
+
+def managed_batch_ids_select(cow_ids):
+    """SELECT of the batch ids holding milk from the given cows, for use in IN (...)"""
+    return select(MilkingSession.milk_batch_id).where(
+        MilkingSession.cow_id.in_(cow_ids),
+        MilkingSession.milk_batch_id.isnot(None)
+    )
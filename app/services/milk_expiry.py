@@ -0,0 +1,200 @@
+"""
+Milk Batch Expiry Sweep
+
+Moves FRESH batches past their expiry_date to EXPIRED. The candidates are
+found through the (status, expiry_date) index, so a sweep costs the number
+of batches that actually expire rather than the number of fresh batches.
+Callers get back the ids flipped by their own sweep, which is what the
+expiry notifications fan out over.
+
+Readers do not sweep. They derive the effective status at read time
+(`effective_status_filter`, `is_expired`): a FRESH batch past its
+expiry_date reads as expired until the scheduled sweep persists it.
+
+expiry_date is stored as naive UTC, so the sweep and the readers all take
+their `now` from `expiry_now()`.
+
+The expiry analysis puts every FRESH batch expiring within the next four
+hours into exactly one urgency bucket with a CASE expression, so the
+dashboard totals come from a single GROUP BY query.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+from app.database.database import db
+from app.models.milk_batches import MilkBatch, MilkStatus
+from app.models.milking_sessions import MilkingSession
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_now() -> datetime:
+    """Current time on the expiry_date clock (naive UTC)"""
+    return datetime.utcnow()
+
+
+def _due(now: datetime):
+    """FRESH batches expired at `now`; the sweep and the readers share this cut-off"""
+    return and_(MilkBatch.status == MilkStatus.FRESH, MilkBatch.expiry_date <= now)
+
+
+def _due_conditions(now: datetime, batch_ids=None, cow_ids: Optional[Iterable[int]] = None):
+    conditions = [_due(now)]
+    if batch_ids is not None:
+        conditions.append(MilkBatch.id.in_(batch_ids))
+    if cow_ids is not None:
+        conditions.append(MilkBatch.id.in_(
+            select(MilkingSession.milk_batch_id).where(MilkingSession.cow_id.in_(set(cow_ids)))
+        ))
+    return conditions
+
+
+def effective_status_filter(status: MilkStatus, now: datetime):
+    """Condition matching batches whose effective status at `now` is `status`"""
+    if status == MilkStatus.FRESH:
+        return and_(MilkBatch.status == MilkStatus.FRESH,
+                    or_(MilkBatch.expiry_date.is_(None), MilkBatch.expiry_date > now))
+    if status == MilkStatus.EXPIRED:
+        return or_(MilkBatch.status == MilkStatus.EXPIRED, _due(now))
+    return MilkBatch.status == status
+
+
+def is_expired(batch, now: datetime) -> bool:
+    """Whether the batch reads as expired at `now`, swept or not"""
+    if batch.status == MilkStatus.EXPIRED:
+        return True
+    return batch.status == MilkStatus.FRESH and batch.expiry_date is not None and batch.expiry_date <= now
+
+
+def effective_status(batch, now: datetime) -> MilkStatus:
+    return MilkStatus.EXPIRED if is_expired(batch, now) else batch.status
+
+
+# Urgency buckets in order, with the upper bound of each as hours from now
+EXPIRY_BUCKETS = (
+    ('overdue', 0),
+    ('within_1_hour', 1),
+    ('within_2_hours', 2),
+    ('within_4_hours', 4),
+)
+
+
+def _bucket_bounds(now: datetime) -> List[Tuple[str, Optional[datetime], datetime]]:
+    bounds, lower = [], None
+    for name, hours in EXPIRY_BUCKETS:
+        upper = now + timedelta(hours=hours)
+        bounds.append((name, lower, upper))
+        lower = upper
+    return bounds
+
+
+def _bucket_condition(lower: Optional[datetime], upper: datetime, expiry=MilkBatch.expiry_date):
+    if lower is None:
+        return expiry <= upper
+    return and_(expiry > lower, expiry <= upper)
+
+
+def urgency_bucket(now: datetime, expiry=MilkBatch.expiry_date):
+    """
+    CASE expression naming the urgency bucket of `expiry` at `now`, NULL for
+    batches expiring later than the last bucket
+    """
+    return case(
+        *[(_bucket_condition(lower, upper, expiry), name) for name, lower, upper in _bucket_bounds(now)]
+    )
+
+
+def urgency_horizon(now: datetime) -> datetime:
+    """Upper bound of the last urgency bucket"""
+    return now + timedelta(hours=EXPIRY_BUCKETS[-1][1])
+
+
+def expiry_bucket_totals(now: datetime, batch_scope=(), expiry=MilkBatch.expiry_date) -> Dict[str, Dict]:
+    """
+    Batch count and volume per urgency bucket for the FRESH batches in
+    `batch_scope` (MilkBatch filters), in one CASE / GROUP BY query.
+    `expiry` is the expiry expression to bucket on.
+    """
+    bucket = urgency_bucket(now, expiry).label('bucket')
+
+    rows = db.session.execute(
+        select(bucket, func.count(MilkBatch.id), func.coalesce(func.sum(MilkBatch.total_volume), 0))
+        .where(MilkBatch.status == MilkStatus.FRESH,
+               expiry <= urgency_horizon(now),
+               *batch_scope)
+        .group_by(bucket)
+    ).all()
+
+    totals = {name: {'count': 0, 'volume': 0.0} for name, _ in EXPIRY_BUCKETS}
+    for name, count, volume in rows:
+        totals[name] = {'count': count, 'volume': float(volume)}
+    return totals
+
+
+def expiry_bucket_batches(now: datetime, bucket: str, batch_scope=(), page: int = 1,
+                          per_page: int = 10) -> List[MilkBatch]:
+    """One page of the FRESH batches in an urgency bucket, soonest expiry first"""
+    lower, upper = next((lower, upper) for name, lower, upper in _bucket_bounds(now) if name == bucket)
+    return MilkBatch.query.filter(
+        MilkBatch.status == MilkStatus.FRESH,
+        _bucket_condition(lower, upper),
+        *batch_scope
+    ).order_by(MilkBatch.expiry_date, MilkBatch.id)\
+        .offset((page - 1) * per_page).limit(per_page).all()
+
+
+# Global cache of computed batch dashboards (expiry analysis, freshness stats),
+# keyed by view name first
+batch_view_cache = TTLCache(max_entries=1024)
+
+
+def invalidate_batch_views() -> None:
+    """Drop cached batch dashboards after batches are added, removed or change status"""
+    batch_view_cache.invalidate()
+
+
+def expire_fresh_batches(now: Optional[datetime] = None, batch_ids=None,
+                         cow_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Mark every FRESH batch with expiry_date <= now as EXPIRED and commit.
+
+    `batch_ids` (ids or a select) and `cow_ids` narrow the sweep. Returns
+    the ids this call expired; batches expired concurrently by another
+    process are not included.
+    """
+    now = now or datetime.utcnow()
+    conditions = _due_conditions(now, batch_ids, cow_ids)
+    values = {'status': MilkStatus.EXPIRED, 'updated_at': datetime.utcnow()}
+
+    try:
+        if db.session.get_bind().dialect.update_returning:
+            result = db.session.execute(
+                update(MilkBatch).where(*conditions).values(**values)
+                .returning(MilkBatch.id)
+                .execution_options(synchronize_session=False)
+            )
+            expired_ids = [batch_id for (batch_id,) in result]
+        else:
+            # No UPDATE ... RETURNING (MySQL): lock the due rows, then flip exactly those
+            expired_ids = [batch_id for (batch_id,) in db.session.execute(
+                select(MilkBatch.id).where(*conditions).with_for_update()
+            )]
+            if expired_ids:
+                db.session.execute(
+                    update(MilkBatch).where(MilkBatch.id.in_(expired_ids)).values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if expired_ids:
+        invalidate_batch_views()
+        logger.info(f"Expired {len(expired_ids)} milk batches")
+    return expired_ids
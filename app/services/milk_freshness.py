@@ -0,0 +1,188 @@
+"""
+Milk Freshness Analytics
+
+Set-based queries behind the /milk-freshness endpoints. Hours left and the
+freshness percentage are computed by the database, and the freshness status
+comes from the shared urgency bucketing of `app.services.milk_expiry`.
+Each batch is one row; the cows and milkers of its sessions are fetched in a
+second query and attached, so a batch with many sessions is never repeated.
+
+Batches without an expiry_date are treated as expiring BATCH_SHELF_LIFE_HOURS
+after production.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy import case, func, literal_column, select
+
+from app.database.database import db
+from app.models.cows import Cow
+from app.models.milk_batches import BATCH_SHELF_LIFE_HOURS, MilkBatch, MilkStatus
+from app.models.milking_sessions import MilkingSession
+from app.models.users import User
+from app.services.milk_expiry import expiry_bucket_totals, urgency_bucket
+
+logger = logging.getLogger(__name__)
+
+# Freshness status of each urgency bucket; batches past the last bucket are fresh
+FRESHNESS_STATUS_BY_BUCKET = {
+    'overdue': 'expired',
+    'within_1_hour': 'critical',
+    'within_2_hours': 'critical',
+    'within_4_hours': 'warning',
+}
+CRITICAL_BUCKETS = ('overdue', 'within_1_hour', 'within_2_hours')
+
+
+def _dialect_name() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def _add_hours(column, hours: int):
+    dialect = _dialect_name()
+    if dialect == 'mysql':
+        return func.timestampadd(literal_column('HOUR'), hours, column)
+    if dialect == 'sqlite':
+        return func.datetime(column, f'+{hours} hours')
+    if dialect == 'postgresql':
+        return column + func.make_interval(0, 0, 0, 0, hours)
+    raise NotImplementedError(f"Freshness queries are not supported on {dialect}")
+
+
+def _hours_until(column, now: datetime):
+    dialect = _dialect_name()
+    if dialect == 'mysql':
+        return func.timestampdiff(literal_column('SECOND'), now, column) / 3600.0
+    if dialect == 'sqlite':
+        return (func.julianday(column) - func.julianday(now)) * 24.0
+    if dialect == 'postgresql':
+        return func.extract('epoch', column - now) / 3600.0
+    raise NotImplementedError(f"Freshness queries are not supported on {dialect}")
+
+
+def effective_expiry():
+    """expiry_date, or production_date plus the shelf life when it is missing"""
+    return func.coalesce(MilkBatch.expiry_date, _add_hours(MilkBatch.production_date, BATCH_SHELF_LIFE_HOURS))
+
+
+def _freshness_select(now: datetime):
+    expiry = effective_expiry()
+    hours_left = _hours_until(expiry, now)
+    clamped = case((hours_left < 0, 0), else_=hours_left)
+    percentage = case(
+        (hours_left <= 0, 0),
+        (hours_left >= BATCH_SHELF_LIFE_HOURS, 100),
+        else_=hours_left * 100.0 / BATCH_SHELF_LIFE_HOURS
+    )
+    return select(
+        MilkBatch.id, MilkBatch.batch_number, MilkBatch.total_volume, MilkBatch.status,
+        MilkBatch.production_date, MilkBatch.expiry_date,
+        expiry.label('effective_expiry'),
+        clamped.label('hours_left'),
+        percentage.label('freshness_percentage'),
+        urgency_bucket(now, expiry).label('bucket')
+    ).where(MilkBatch.status == MilkStatus.FRESH), expiry
+
+
+def _session_people(batch_ids: Iterable[int]) -> Dict[int, List]:
+    """batch id -> [(cow_id, cow_name, milker_id, milker_name), ...] in session order"""
+    people = defaultdict(list)
+    batch_ids = list(batch_ids)
+    if not batch_ids:
+        return people
+    rows = db.session.execute(
+        select(MilkingSession.milk_batch_id, MilkingSession.cow_id, Cow.name,
+               MilkingSession.milker_id, User.name)
+        .outerjoin(Cow, Cow.id == MilkingSession.cow_id)
+        .outerjoin(User, User.id == MilkingSession.milker_id)
+        .where(MilkingSession.milk_batch_id.in_(batch_ids))
+        .order_by(MilkingSession.milk_batch_id, MilkingSession.id)
+    )
+    for batch_id, cow_id, cow_name, milker_id, milker_name in rows:
+        people[batch_id].append((cow_id, cow_name, milker_id, milker_name))
+    return people
+
+
+def _parse_datetime(value):
+    # SQLite returns computed datetimes as text
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _serialize(row, people) -> Dict:
+    first = people[0] if people else (None, None, None, None)
+    hours_left = float(row.hours_left) if row.hours_left is not None else None
+    percentage = float(row.freshness_percentage) if row.freshness_percentage is not None else None
+    return {
+        "id": row.id,
+        "batch_number": row.batch_number,
+        "total_volume": float(row.total_volume) if row.total_volume else 0,
+        "status": row.status.value,
+        "production_date": row.production_date.isoformat() if row.production_date else None,
+        "expiry_date": row.expiry_date.isoformat() if row.expiry_date else None,
+        "estimated_expiry": _parse_datetime(row.effective_expiry).isoformat()
+        if row.expiry_date is None and row.effective_expiry is not None else None,
+        "cow_id": first[0],
+        "cow_name": first[1],
+        "milker_id": first[2],
+        "milker_name": first[3],
+        "cows": [{"id": cow_id, "name": cow_name}
+                 for cow_id, cow_name in dict.fromkeys((p[0], p[1]) for p in people)],
+        "hours_left": round(hours_left, 1) if hours_left is not None else None,
+        "freshness_percentage": round(percentage, 1) if percentage is not None else None,
+        "freshness_status": FRESHNESS_STATUS_BY_BUCKET.get(row.bucket, "fresh")
+        if hours_left is not None else "unknown"
+    }
+
+
+def freshness_analysis(now: datetime) -> List[Dict]:
+    """Every FRESH batch with its freshness metrics, soonest expiry first"""
+    query, expiry = _freshness_select(now)
+    rows = db.session.execute(query.order_by(expiry, MilkBatch.id)).all()
+    people = _session_people(row.id for row in rows)
+    return [_serialize(row, people.get(row.id, [])) for row in rows]
+
+
+def critical_batches(now: datetime, hours: int) -> List[Dict]:
+    """FRESH batches whose (estimated) expiry is less than `hours` away"""
+    query, expiry = _freshness_select(now)
+    rows = db.session.execute(
+        query.where(expiry < now + timedelta(hours=hours)).order_by(expiry, MilkBatch.id)
+    ).all()
+    people = _session_people(row.id for row in rows)
+    return [_serialize(row, people.get(row.id, [])) for row in rows]
+
+
+def freshness_stats(now: datetime) -> Dict:
+    """
+    Batch count and volume per stored status, plus the critical FRESH
+    batches by the same effective expiry as `freshness_analysis`
+    """
+    rows = db.session.execute(
+        select(MilkBatch.status, func.count(MilkBatch.id), func.coalesce(func.sum(MilkBatch.total_volume), 0))
+        .group_by(MilkBatch.status)
+    ).all()
+
+    stats = {}
+    total_batches = 0
+    total_volume = 0.0
+    for status, count, volume in rows:
+        stats[status.value] = {"batch_count": count, "total_volume": float(volume)}
+        total_batches += count
+        total_volume += float(volume)
+
+    buckets = expiry_bucket_totals(now, expiry=effective_expiry())
+    stats["critical"] = {
+        "batch_count": sum(buckets[name]['count'] for name in CRITICAL_BUCKETS),
+        "total_volume": sum(buckets[name]['volume'] for name in CRITICAL_BUCKETS)
+    }
+    stats["buckets"] = buckets
+    stats["summary"] = {
+        "total_batches": total_batches,
+        "total_volume": total_volume
+    }
+    return stats
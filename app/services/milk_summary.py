@@ -0,0 +1,403 @@
+"""
+Daily Milk Summary Maintenance
+
+Single write path for `daily_milk_summary`. Milking session changes are
+applied as volume deltas through an atomic upsert on the unique
+(cow_id, date) key, so concurrent writers for the same cow and day add up
+instead of overwriting each other. `rebuild_summaries` recomputes a date
+range from `milking_sessions` in bulk SQL.
+
+The same deltas are rolled up into cow x week, cow x month and farm x day
+tables in the same transaction, so trend charts read a few hundred
+pre-aggregated rows instead of scanning years of daily summaries.
+`rebuild_rollups` recomputes them from the daily summaries (backfill).
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, extract, func, insert, literal_column, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.database.database import db
+from app.models.daily_milk_summary import DailyMilkSummary
+from app.models.milk_rollups import CowMonthlyMilkRollup, CowWeeklyMilkRollup, FarmDailyMilkRollup
+from app.models.milking_sessions import MilkingSession
+
+# Session buckets by hour of milking_time
+MORNING_END_HOUR = 12
+AFTERNOON_END_HOUR = 18
+
+BUCKET_COLUMNS = ('morning_volume', 'afternoon_volume', 'evening_volume')
+
+SummaryKey = Tuple[int, date]
+
+
+def session_bucket(milking_time: datetime) -> str:
+    """Summary column a session at milking_time counts towards"""
+    if milking_time.hour < MORNING_END_HOUR:
+        return 'morning_volume'
+    elif milking_time.hour < AFTERNOON_END_HOUR:
+        return 'afternoon_volume'
+    return 'evening_volume'
+
+
+class SummaryDeltas:
+    """Accumulates per (cow, day, bucket) volume changes before they are applied"""
+
+    def __init__(self):
+        self._deltas: Dict[SummaryKey, Dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(BUCKET_COLUMNS, 0.0)
+        )
+
+    def add(self, cow_id: int, milking_time: datetime, volume: float) -> 'SummaryDeltas':
+        self._deltas[(int(cow_id), milking_time.date())][session_bucket(milking_time)] += float(volume)
+        return self
+
+    def remove(self, cow_id: int, milking_time: datetime, volume: float) -> 'SummaryDeltas':
+        return self.add(cow_id, milking_time, -float(volume))
+
+    def add_volumes(self, cow_id: int, summary_date: date, volumes: Dict[str, float]) -> 'SummaryDeltas':
+        """Add per-bucket volumes for a day directly"""
+        buckets = self._deltas[(int(cow_id), summary_date)]
+        for column, volume in volumes.items():
+            buckets[column] += float(volume)
+        return self
+
+    def items(self):
+        return self._deltas.items()
+
+    def __bool__(self):
+        return bool(self._deltas)
+
+
+def _dialect_insert(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        return mysql.insert(table), func.greatest
+    if dialect == 'postgresql':
+        return postgresql.insert(table), func.greatest
+    if dialect == 'sqlite':
+        return sqlite.insert(table), func.max
+    raise NotImplementedError(f"Summary upsert is not supported on {dialect}")
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+# Rollup tables: model, key columns, and the key a (cow_id, date) summary rolls into
+ROLLUPS = (
+    (CowWeeklyMilkRollup, ('cow_id', 'week_start'), lambda cow_id, day: (cow_id, week_start(day))),
+    (CowMonthlyMilkRollup, ('cow_id', 'month_start'), lambda cow_id, day: (cow_id, month_start(day))),
+    (FarmDailyMilkRollup, ('date',), lambda cow_id, day: (day,)),
+)
+
+
+def _upsert_statement(model, key_columns: Tuple[str, ...]):
+    """
+    INSERT of per-key bucket deltas that adds them to an existing row. The
+    update reads the deltas back through VALUES() / EXCLUDED rather than
+    extra bind parameters, so the statement runs as one multi-row
+    executemany on every driver (PyMySQL cannot bind parameters in the
+    ON DUPLICATE KEY UPDATE clause).
+    """
+    table = model.__table__
+    stmt, greatest = _dialect_insert(table)
+    new = stmt.inserted if hasattr(stmt, 'on_duplicate_key_update') else stmt.excluded
+
+    # Buckets never go below zero, as the handlers used to guarantee. The
+    # zero is inlined for the same reason: no parameters after VALUES (...)
+    new_values = {
+        column: greatest(table.c[column] + new[column], literal_column('0'))
+        for column in BUCKET_COLUMNS
+    }
+    # total_volume comes first: MySQL evaluates later assignments against the
+    # already-updated row, so this keeps the expression on the old values
+    # for every dialect.
+    total = new_values['morning_volume'] + new_values['afternoon_volume'] + new_values['evening_volume']
+    assignments = [('total_volume', total)] + list(new_values.items())
+
+    if hasattr(stmt, 'on_duplicate_key_update'):
+        return stmt.on_duplicate_key_update(assignments)
+    return stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_=dict(assignments)
+    )
+
+
+def _apply_volume_deltas(model, key_columns: Tuple[str, ...],
+                        deltas: Iterable[Tuple[tuple, Dict[str, float]]]) -> None:
+    """Upsert per-key bucket deltas into `model` and drop rows left without volume"""
+    params = []
+    shrinking = []
+    for key, buckets in deltas:
+        row = dict(zip(key_columns, key))
+        row.update(buckets)
+        row['total_volume'] = sum(buckets[column] for column in BUCKET_COLUMNS)
+        params.append(row)
+        if any(delta < 0 for delta in buckets.values()):
+            shrinking.append(key)
+
+    if not params:
+        return
+    table = model.__table__
+    db.session.execute(_upsert_statement(model, key_columns), params)
+
+    if shrinking:
+        in_shrinking = or_(*[
+            and_(*[table.c[column] == value for column, value in zip(key_columns, key)])
+            for key in shrinking
+        ])
+        # A negative delta for a key without a row inserted it as is; clamp
+        # those buckets to zero like the update path does
+        _, greatest = _dialect_insert(table)
+        clamped = {column: greatest(table.c[column], 0) for column in BUCKET_COLUMNS}
+        total = clamped['morning_volume'] + clamped['afternoon_volume'] + clamped['evening_volume']
+        db.session.execute(
+            update(table)
+            .where(in_shrinking, or_(*[table.c[column] < 0 for column in BUCKET_COLUMNS]))
+            .ordered_values(('total_volume', total), *clamped.items())
+        )
+        db.session.execute(delete(table).where(table.c.total_volume <= 0, in_shrinking))
+
+
+def _rollup_deltas(deltas: SummaryDeltas, key_of) -> Dict[tuple, Dict[str, float]]:
+    rolled = defaultdict(lambda: dict.fromkeys(BUCKET_COLUMNS, 0.0))
+    for (cow_id, summary_date), buckets in deltas.items():
+        target = rolled[key_of(cow_id, summary_date)]
+        for column, delta in buckets.items():
+            target[column] += delta
+    return rolled
+
+
+def apply_summary_deltas(deltas: SummaryDeltas) -> None:
+    """
+    Apply accumulated deltas, and their rollups, in the current transaction.
+    Summaries and rollups that end up with no volume are removed. The caller
+    commits.
+    """
+    if not deltas:
+        return
+
+    # If there's no more milk recorded for a cow on a day, the summary is deleted
+    _apply_volume_deltas(DailyMilkSummary, ('cow_id', 'date'), deltas.items())
+
+    for model, key_columns, key_of in ROLLUPS:
+        _apply_volume_deltas(model, key_columns, _rollup_deltas(deltas, key_of).items())
+
+
+def record_session(cow_id: int, milking_time: datetime, volume: float) -> None:
+    apply_summary_deltas(SummaryDeltas().add(cow_id, milking_time, volume))
+
+
+def retract_session(cow_id: int, milking_time: datetime, volume: float) -> None:
+    apply_summary_deltas(SummaryDeltas().remove(cow_id, milking_time, volume))
+
+
+def move_session(old_cow_id: int, old_milking_time: datetime, old_volume: float,
+                 new_cow_id: int, new_milking_time: datetime, new_volume: float) -> None:
+    """Re-attribute an edited session (volume, time of day, date and/or cow)"""
+    deltas = SummaryDeltas()
+    deltas.remove(old_cow_id, old_milking_time, old_volume)
+    deltas.add(new_cow_id, new_milking_time, new_volume)
+    apply_summary_deltas(deltas)
+
+
+def remove_cow_summaries(cow_id: int) -> int:
+    """
+    Delete every summary of a cow through the delta path, so the farm rollups
+    lose its volume too, then drop its cow rollups. The caller commits.
+    """
+    deltas = SummaryDeltas()
+    summaries = db.session.execute(
+        select(DailyMilkSummary.date, *[DailyMilkSummary.__table__.c[column] for column in BUCKET_COLUMNS])
+        .where(DailyMilkSummary.cow_id == cow_id)
+    ).all()
+    for summary_date, *volumes in summaries:
+        deltas.add_volumes(cow_id, summary_date, {
+            column: -(volume or 0) for column, volume in zip(BUCKET_COLUMNS, volumes)
+        })
+    apply_summary_deltas(deltas)
+
+    # Float residue can keep a cow rollup just above zero
+    for model in (CowWeeklyMilkRollup, CowMonthlyMilkRollup):
+        db.session.execute(delete(model.__table__).where(model.__table__.c.cow_id == cow_id))
+    return len(summaries)
+
+
+# Rollup served for each /rollups period: model and its period column
+ROLLUP_PERIODS = {
+    'daily': (FarmDailyMilkRollup, 'date'),
+    'weekly': (CowWeeklyMilkRollup, 'week_start'),
+    'monthly': (CowMonthlyMilkRollup, 'month_start'),
+}
+
+
+def rollup_series(period: str, cow_id: Optional[int] = None, start_date: Optional[date] = None,
+                  end_date: Optional[date] = None) -> List[Dict]:
+    """
+    Production per period, oldest first: one cow's weekly/monthly rollups,
+    or the whole herd's when cow_id is None. Periods are included when they
+    start within [start_date, end_date] (start_date is moved back to the
+    start of its period).
+    """
+    model, period_column = ROLLUP_PERIODS[period]
+    table = model.__table__
+    period_start = table.c[period_column]
+    volumes = [table.c[column] for column in BUCKET_COLUMNS + ('total_volume',)]
+
+    if cow_id is not None:
+        if model is FarmDailyMilkRollup:
+            raise ValueError("Daily figures per cow are served by /daily-summaries")
+        query = select(period_start, *volumes).where(table.c.cow_id == cow_id)
+    elif model is FarmDailyMilkRollup:
+        query = select(period_start, *volumes)
+    else:
+        # Herd-wide weeks and months add up the cow rollups
+        query = select(period_start, *[func.sum(column) for column in volumes]).group_by(period_start)
+
+    if start_date:
+        first = {'weekly': week_start, 'monthly': month_start}.get(period, lambda day: day)(start_date)
+        query = query.where(period_start >= first)
+    if end_date:
+        query = query.where(period_start <= end_date)
+
+    return [
+        dict(zip(('period_start',) + BUCKET_COLUMNS + ('total_volume',),
+                 (start.isoformat(), *[float(volume or 0) for volume in row_volumes])))
+        for start, *row_volumes in db.session.execute(query.order_by(period_start))
+    ]
+
+
+def get_summary(cow_id: int, summary_date: date) -> Optional[DailyMilkSummary]:
+    return DailyMilkSummary.query.filter_by(cow_id=cow_id, date=summary_date).first()
+
+
+def rebuild_summaries(start_date: date, end_date: date, cow_id: Optional[int] = None) -> int:
+    """
+    Recompute summaries for [start_date, end_date] from milking_sessions with
+    one DELETE and one INSERT ... SELECT, then commit. Returns the number of
+    summaries written. Session writes for the range should be paused while
+    this runs.
+    """
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    clear = delete(DailyMilkSummary).where(
+        DailyMilkSummary.date >= start_date,
+        DailyMilkSummary.date <= end_date
+    )
+    if cow_id is not None:
+        clear = clear.where(DailyMilkSummary.cow_id == cow_id)
+
+    hour = extract('hour', MilkingSession.milking_time)
+    morning = func.sum(case((hour < MORNING_END_HOUR, MilkingSession.volume), else_=0))
+    afternoon = func.sum(case(
+        (and_(hour >= MORNING_END_HOUR, hour < AFTERNOON_END_HOUR), MilkingSession.volume), else_=0
+    ))
+    evening = func.sum(case((hour >= AFTERNOON_END_HOUR, MilkingSession.volume), else_=0))
+    session_date = func.date(MilkingSession.milking_time)
+
+    source = select(
+        MilkingSession.cow_id,
+        session_date,
+        morning,
+        afternoon,
+        evening,
+        func.sum(MilkingSession.volume)
+    ).where(
+        MilkingSession.milking_time >= range_start,
+        MilkingSession.milking_time < range_end
+    ).group_by(MilkingSession.cow_id, session_date)
+    if cow_id is not None:
+        source = source.where(MilkingSession.cow_id == cow_id)
+
+    try:
+        db.session.execute(clear.execution_options(synchronize_session=False))
+        result = db.session.execute(
+            insert(DailyMilkSummary).from_select(
+                ['cow_id', 'date', 'morning_volume', 'afternoon_volume', 'evening_volume', 'total_volume'],
+                source
+            )
+        )
+        _rebuild_rollups(start_date, end_date, cow_id)
+        db.session.commit()
+        return result.rowcount
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _rollup_ranges(start_date: date, end_date: date):
+    """Whole periods of each rollup overlapping [start_date, end_date]"""
+    next_month = month_start(end_date) + timedelta(days=32)
+    return {
+        CowWeeklyMilkRollup: (week_start(start_date), week_start(end_date) + timedelta(days=6)),
+        CowMonthlyMilkRollup: (month_start(start_date), month_start(next_month) - timedelta(days=1)),
+        FarmDailyMilkRollup: (start_date, end_date),
+    }
+
+
+def _rebuild_rollups(start_date: date, end_date: date, cow_id: Optional[int] = None) -> Dict[str, int]:
+    ranges = _rollup_ranges(start_date, end_date)
+    read_from = min(first for first, _ in ranges.values())
+    read_to = max(last for _, last in ranges.values())
+
+    rolled = {model: defaultdict(lambda: dict.fromkeys(BUCKET_COLUMNS, 0.0)) for model, _, _ in ROLLUPS}
+    summaries = select(
+        DailyMilkSummary.cow_id, DailyMilkSummary.date,
+        *[DailyMilkSummary.__table__.c[column] for column in BUCKET_COLUMNS]
+    ).where(DailyMilkSummary.date >= read_from, DailyMilkSummary.date <= read_to)
+    for row_cow_id, summary_date, *volumes in db.session.execute(summaries.execution_options(yield_per=5000)):
+        for model, _, key_of in ROLLUPS:
+            first, last = ranges[model]
+            # Farm rollups always cover the whole herd
+            if not first <= summary_date <= last or (cow_id is not None and model is not FarmDailyMilkRollup
+                                                     and row_cow_id != cow_id):
+                continue
+            target = rolled[model][key_of(row_cow_id, summary_date)]
+            for column, volume in zip(BUCKET_COLUMNS, volumes):
+                target[column] += volume or 0
+
+    counts = {}
+    for model, key_columns, _ in ROLLUPS:
+        table = model.__table__
+        first, last = ranges[model]
+        period = table.c[key_columns[-1]]
+        clear = delete(table).where(period >= first, period <= last)
+        if cow_id is not None and 'cow_id' in key_columns:
+            clear = clear.where(table.c.cow_id == cow_id)
+        db.session.execute(clear)
+
+        rows = []
+        for key, volumes in rolled[model].items():
+            row = dict(zip(key_columns, key), **volumes)
+            row['total_volume'] = sum(volumes.values())
+            if row['total_volume'] > 0:
+                rows.append(row)
+        if rows:
+            db.session.execute(insert(table), rows)
+        counts[table.name] = len(rows)
+    return counts
+
+
+def rebuild_rollups(start_date: date, end_date: date, cow_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Recompute the rollups of every period overlapping [start_date, end_date]
+    from the daily summaries, then commit. Returns the rows written per
+    table. With cow_id only that cow's weekly/monthly rollups are rebuilt;
+    farm rollups always cover the whole herd.
+    """
+    try:
+        counts = _rebuild_rollups(start_date, end_date, cow_id)
+        db.session.commit()
+        return counts
+    except Exception:
+        db.session.rollback()
+        raise
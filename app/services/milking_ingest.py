@@ -0,0 +1,183 @@
+"""
+Milking Session Ingestion
+
+Bulk path for recording a whole shift of milking sessions at once. Items are
+validated up front; valid ones are written with bulk inserts (one batch per
+session, as the single-session endpoint does) and their summary deltas are
+folded into one upsert per (cow, date).
+"""
+
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+
+from app.database.database import db
+from app.models.cows import Cow
+from app.models.milk_batches import BATCH_SHELF_LIFE_HOURS, MilkBatch, MilkStatus
+from app.models.milking_sessions import MilkingSession
+from app.models.users import User
+from app.services.milk_summary import SummaryDeltas, apply_summary_deltas
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_SESSIONS = 1000
+BATCH_NOTES_PREFIX = "Auto-generated batch from milking session. "
+# MilkBatch.notes holds the prefix plus the session notes in String(255)
+MAX_NOTES_LENGTH = 255 - len(BATCH_NOTES_PREFIX)
+
+
+def generate_batch_number(index: int = 0, token: Optional[str] = None) -> str:
+    """
+    Unique batch number; the timestamp alone collides within the same second.
+    The index is zero-padded so no batch number is a prefix of another.
+    """
+    token = token or uuid.uuid4().hex[:8]
+    return f"BATCH-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{token}-{index:04d}"
+
+
+def _parse_item(item) -> Tuple[Optional[Dict], Optional[str]]:
+    """Validate one payload item, returning (parsed, error)"""
+    if not isinstance(item, dict):
+        return None, "Item must be an object"
+
+    missing = [field for field in ('cow_id', 'milker_id', 'volume') if item.get(field) in (None, '')]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    try:
+        cow_id = int(item['cow_id'])
+        milker_id = int(item['milker_id'])
+    except (TypeError, ValueError):
+        return None, "cow_id and milker_id must be integers"
+
+    try:
+        volume = float(item['volume'])
+    except (TypeError, ValueError):
+        return None, "volume must be a number"
+    if volume <= 0:
+        return None, "volume must be greater than 0"
+
+    try:
+        milking_time = datetime.fromisoformat(item['milking_time']) if item.get('milking_time') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, "Invalid milking_time format. Use ISO 8601"
+
+    notes = item.get('notes')
+    if notes is not None and not isinstance(notes, str):
+        return None, "notes must be a string"
+    if notes is not None and len(notes) > MAX_NOTES_LENGTH:
+        return None, f"notes must be at most {MAX_NOTES_LENGTH} characters"
+
+    return {
+        'cow_id': cow_id,
+        'milker_id': milker_id,
+        'volume': volume,
+        'milking_time': milking_time,
+        'notes': notes
+    }, None
+
+
+def _existing_ids(model, ids: Set[int]) -> Set[int]:
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def ingest_milking_sessions(items: List) -> Tuple[List[Dict], Set[Tuple[int, date]]]:
+    """
+    Validate and insert milking sessions in bulk, then commit.
+
+    Returns (results, affected) where results has one entry per input item,
+    in order: {"index", "success", "id", "batch_id"} or
+    {"index", "success": False, "error"}, and affected holds the
+    (cow_id, date) pairs that received sessions.
+    """
+    results: List[Optional[Dict]] = [None] * len(items)
+    parsed: List[Tuple[int, Dict]] = []
+
+    for index, item in enumerate(items):
+        session_data, error = _parse_item(item)
+        if error:
+            results[index] = {"index": index, "success": False, "error": error}
+        else:
+            parsed.append((index, session_data))
+
+    # Validate references with one query per table
+    known_cows = _existing_ids(Cow, {data['cow_id'] for _, data in parsed})
+    known_milkers = _existing_ids(User, {data['milker_id'] for _, data in parsed})
+
+    valid: List[Tuple[int, Dict]] = []
+    for index, data in parsed:
+        if data['cow_id'] not in known_cows:
+            results[index] = {"index": index, "success": False, "error": f"Cow {data['cow_id']} not found"}
+        elif data['milker_id'] not in known_milkers:
+            results[index] = {"index": index, "success": False, "error": f"Milker {data['milker_id']} not found"}
+        else:
+            valid.append((index, data))
+
+    if not valid:
+        return results, set()
+
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex[:8]
+    batch_rows = []
+    for index, data in valid:
+        data['batch_number'] = generate_batch_number(index, token)
+        batch_rows.append({
+            'batch_number': data['batch_number'],
+            'total_volume': data['volume'],
+            'status': MilkStatus.FRESH,
+            'production_date': data['milking_time'],
+            'expiry_date': data['milking_time'] + timedelta(hours=BATCH_SHELF_LIFE_HOURS),
+            'notes': f"{BATCH_NOTES_PREFIX}{data['notes'] or ''}",
+            'created_at': now,
+            'updated_at': now
+        })
+
+    try:
+        db.session.execute(insert(MilkBatch), batch_rows)
+        batch_ids = dict(db.session.query(MilkBatch.batch_number, MilkBatch.id).filter(
+            MilkBatch.batch_number.in_([row['batch_number'] for row in batch_rows])
+        ))
+
+        session_rows = []
+        deltas = SummaryDeltas()
+        for index, data in valid:
+            session_rows.append({
+                'cow_id': data['cow_id'],
+                'milker_id': data['milker_id'],
+                'milk_batch_id': batch_ids[data['batch_number']],
+                'volume': data['volume'],
+                'milking_time': data['milking_time'],
+                'notes': data['notes'],
+                'created_at': now,
+                'updated_at': now
+            })
+            deltas.add(data['cow_id'], data['milking_time'], data['volume'])
+
+        db.session.execute(insert(MilkingSession), session_rows)
+        session_ids = dict(db.session.query(MilkingSession.milk_batch_id, MilkingSession.id).filter(
+            MilkingSession.milk_batch_id.in_(batch_ids.values())
+        ))
+
+        # One upsert row per (cow, date)
+        apply_summary_deltas(deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for index, data in valid:
+        batch_id = batch_ids[data['batch_number']]
+        results[index] = {
+            "index": index,
+            "success": True,
+            "id": session_ids[batch_id],
+            "batch_id": batch_id
+        }
+
+    logger.info(f"Ingested {len(valid)} milking sessions ({len(items) - len(valid)} rejected)")
+    return results, {(data['cow_id'], data['milking_time'].date()) for _, data in valid}
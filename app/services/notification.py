@@ -5,28 +5,37 @@ This module handles all notification logic for the Dairy Track system,
 including milk production alerts, expiry warnings, and real-time notifications.
 """
 
+from collections import Counter
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from typing import List, Optional, Dict, Set, Tuple
 import logging
-import time
 import html
+import re
 import json
 from functools import wraps
 
 import pytz
 from flask import current_app
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, insert, update
 
 from app.models.notification import Notification
 from app.models.daily_milk_summary import DailyMilkSummary
 from app.models.cows import Cow
 from app.models.milk_batches import MilkBatch, MilkStatus
+from app.models.milking_sessions import MilkingSession
 from app.models.users import User
-from app.models.roles import Role
 from app.models.user_cow_association import user_cow_association
 from app.database.database import db
 from app.socket import emit_notification
+from app.services.milk_expiry import expire_fresh_batches, expiry_now
+from app.services.notification_outbox import stage_notification, stage_notifications
+from app.services.rate_limit import RateLimiter
+from app.services.role_members import get_role_user_ids
+from app.services.notification_counters import adjust_counters
+from app.services.notification_retention import notification_retention
+from app.services.production_analytics import load_production_analytics
+from app.services.production_rules import RuleMatch, get_production_rules
 
 
 # Configure logging
@@ -41,24 +50,14 @@ logger = logging.getLogger(__name__)
 class NotificationConfig:
     """Centralized configuration for notification system"""
     BATCH_SIZE: int = 100
-    RATE_LIMIT_PER_USER: int = 50
-    RATE_LIMIT_WINDOW_MINUTES: int = 60
-    CLEANUP_RETENTION_DAYS: int = 30
     MAX_RETRY_ATTEMPTS: int = 3
     SOCKET_TIMEOUT_SECONDS: int = 30
     EXPIRY_WARNING_HOURS: int = 4
     TIMEZONE: str = 'Asia/Jakarta'
-    ADMIN_ROLE_NAMES: Tuple[str, ...] = ('admin', 'administrator', 'Admin', 'Administrator')
-    SUPERVISOR_ROLE_NAMES: Tuple[str, ...] = ('supervisor', 'Supervisor', 'mandor', 'Mandor')
-    
-    # Production thresholds
-    LOW_PRODUCTION_THRESHOLD: float = 10.0
-    HIGH_PRODUCTION_THRESHOLD: float = 25.0
-    # Production change thresholds (percentage)
-    PRODUCTION_INCREASE_THRESHOLD: float = 15.0  # 15% increase
-    PRODUCTION_DECREASE_THRESHOLD: float = 15.0  # 15% decrease
-    # Minimum volume to consider for production change notifications
-    MIN_VOLUME_FOR_CHANGE_NOTIFICATION: float = 5.0  # 5L minimum volume for change notifications
+    # Matched case-insensitively (see app.services.role_members)
+    ADMIN_ROLE_NAMES: Tuple[str, ...] = ('admin', 'administrator')
+    SUPERVISOR_ROLE_NAMES: Tuple[str, ...] = ('supervisor', 'mandor')
+    # Production thresholds are rows of `production_rules` (see app.services.production_rules)
 
 
 class NotificationTypes:
@@ -72,6 +71,10 @@ class NotificationTypes:
     PRODUCTION_DECREASE = "production_decrease"  # Tambahkan ini
 
 
+# Batch number in a NotificationMessages.batch_warning message
+WARNED_BATCH_PATTERN = re.compile(r"Expiry Warning: Batch (\S+) \(")
+
+
 class NotificationMessages:
     """Professional notification message templates"""
     
@@ -88,14 +91,14 @@ class NotificationMessages:
                 f"Please record milk production.")
     
     @staticmethod
-    def low_production(cow_id: str, cow_name: str, volume: float) -> str:
+    def low_production(cow_id: str, cow_name: str, volume: float, threshold: float) -> str:
         return (f"Production Alert: Cow {cow_id} ({cow_name}) produced {volume}L today. "
-                f"Below standard threshold of {NotificationConfig.LOW_PRODUCTION_THRESHOLD}L.")
+                f"Below standard threshold of {threshold}L.")
     
     @staticmethod
-    def high_production(cow_id: str, cow_name: str, volume: float) -> str:
+    def high_production(cow_id: str, cow_name: str, volume: float, threshold: float) -> str:
         return (f"Exceptional Production: Cow {cow_id} ({cow_name}) produced {volume}L today. "
-                f"Exceeds standard threshold of {NotificationConfig.HIGH_PRODUCTION_THRESHOLD}L.")
+                f"Exceeds standard threshold of {threshold}L.")
     
     @staticmethod
     def production_increase(cow_id: str, cow_name: str, current_volume: float, 
@@ -111,6 +114,12 @@ class NotificationMessages:
                 f"Production dropped from {previous_volume}L to {current_volume}L "
                 f"({percentage_change:.1f}% decrease). Requires attention.")
     
+    @staticmethod
+    def production_rule(cow_id: str, cow_name: str, rule_name: str, metric: str,
+                        value: float, operator: str, threshold: float) -> str:
+        return (f"{rule_name}: Cow {cow_id} ({cow_name}) has {metric} of {value:.1f} "
+                f"today ({operator} {threshold}).")
+    
     @staticmethod
     def batch_expired(batch_number: str, volume: float, cow_name: str, expiry_time: str) -> str:
         return (f"Batch Expired: Batch {batch_number} ({volume}L from {cow_name}) "
@@ -124,54 +133,6 @@ class NotificationMessages:
                 f"Please process or utilize promptly.")
 
 
-class RateLimiter:
-    """Rate limiting functionality for notifications"""
-    
-    def __init__(self):
-        self._user_limits: Dict[int, Dict[str, any]] = {}
-    
-    def is_rate_limited(self, user_id: int, 
-                       limit: Optional[int] = None, 
-                       window_minutes: Optional[int] = None) -> bool:
-        """Check if user has exceeded notification rate limit"""
-        limit = limit or NotificationConfig.RATE_LIMIT_PER_USER
-        window_minutes = window_minutes or NotificationConfig.RATE_LIMIT_WINDOW_MINUTES
-        
-        current_time = datetime.now()
-        
-        if user_id not in self._user_limits:
-            self._user_limits[user_id] = {
-                'count': 0,
-                'reset_time': current_time + timedelta(minutes=window_minutes)
-            }
-        
-        user_data = self._user_limits[user_id]
-        
-        # Reset counter if window expired
-        if current_time > user_data['reset_time']:
-            user_data['count'] = 0
-            user_data['reset_time'] = current_time + timedelta(minutes=window_minutes)
-        
-        if user_data['count'] >= limit:
-            return True
-        
-        user_data['count'] += 1
-        return False
-    
-    def cleanup_expired_limits(self) -> int:
-        """Remove expired rate limit entries and return count"""
-        current_time = datetime.now()
-        expired_users = [
-            user_id for user_id, data in self._user_limits.items()
-            if current_time > data['reset_time']
-        ]
-        
-        for user_id in expired_users:
-            del self._user_limits[user_id]
-        
-        return len(expired_users)
-
-
 class NotificationService:
     """Main notification service class"""
     
@@ -188,51 +149,40 @@ class NotificationService:
         """Sanitize notification message content"""
         return html.escape(str(message))
     
-    def get_admin_users(self) -> List[User]:
-        """Retrieve all admin users from database"""
+    def get_admin_user_ids(self) -> Tuple[int, ...]:
+        """Ids of all admin users (cached role membership)"""
         try:
-            admin_roles = Role.query.filter(
-                Role.name.in_(self.config.ADMIN_ROLE_NAMES)
-            ).all()
-            
-            if not admin_roles:
-                return []
-            
-            admin_role_ids = [role.id for role in admin_roles]
-            return User.query.filter(User.role_id.in_(admin_role_ids)).all()
-            
+            return get_role_user_ids(self.config.ADMIN_ROLE_NAMES)
         except Exception as e:
             logger.error(f"Failed to retrieve admin users: {e}")
-            return []
+            return ()
     
-    def get_supervisor_users(self) -> List[User]:
-        """Retrieve all supervisor users from database"""
+    def get_supervisor_user_ids(self) -> Tuple[int, ...]:
+        """Ids of all supervisor users (cached role membership)"""
         try:
-            supervisor_roles = Role.query.filter(
-                Role.name.in_(self.config.SUPERVISOR_ROLE_NAMES)
-            ).all()
-            
-            if not supervisor_roles:
-                return []
-            
-            supervisor_role_ids = [role.id for role in supervisor_roles]
-            return User.query.filter(User.role_id.in_(supervisor_role_ids)).all()
-            
+            return get_role_user_ids(self.config.SUPERVISOR_ROLE_NAMES)
         except Exception as e:
             logger.error(f"Failed to retrieve supervisor users: {e}")
-            return []
+            return ()
+    
+    def get_admin_users(self) -> List[User]:
+        """Retrieve all admin users from database"""
+        admin_ids = self.get_admin_user_ids()
+        return User.query.filter(User.id.in_(admin_ids)).all() if admin_ids else []
+    
+    def get_supervisor_users(self) -> List[User]:
+        """Retrieve all supervisor users from database"""
+        supervisor_ids = self.get_supervisor_user_ids()
+        return User.query.filter(User.id.in_(supervisor_ids)).all() if supervisor_ids else []
     
     def emit_notification_safely(self, user_id: int, notification_data: Dict) -> bool:
-        """Emit notification with retry mechanism"""
-        for attempt in range(self.config.MAX_RETRY_ATTEMPTS):
-            try:
-                emit_notification(user_id, notification_data)
+        """Queue notification for emission; retries happen in the socket outbox"""
+        try:
+            if emit_notification(user_id, notification_data):
                 return True
-            except Exception as e:
-                if attempt == self.config.MAX_RETRY_ATTEMPTS - 1:
-                    logger.error(f"Failed to emit notification to user {user_id} after {self.config.MAX_RETRY_ATTEMPTS} attempts: {e}")
-                    return False
-                time.sleep(0.5 * (attempt + 1))  # Exponential backoff
+            logger.warning(f"Socket outbox full, notification to user {user_id} not emitted")
+        except Exception as e:
+            logger.error(f"Failed to queue notification for user {user_id}: {e}")
         return False
     
     def create_notification_record(self, user_id: int, cow_id: Optional[int], 
@@ -253,6 +203,7 @@ class NotificationService:
                 notification.additional_data = json.dumps(additional_data)
             
             db.session.add(notification)
+            adjust_counters({user_id: (1, 1)})
             return notification
             
         except Exception as e:
@@ -265,7 +216,6 @@ class NotificationService:
         """Send notification to specific user"""
         try:
             if self.rate_limiter.is_rate_limited(user_id):
-                logger.warning(f"Rate limit exceeded for user {user_id}")
                 return False
             
             # Handle production notifications (avoid duplicates)
@@ -276,19 +226,21 @@ class NotificationService:
                 if self._update_or_create_production_notification(
                     user_id, cow_id, message, notification_type, check_date
                 ):
-                    return self._emit_real_time_notification(user_id, cow_id, message, notification_type)
+                    return self._stage_real_time_notification(user_id, cow_id, message, notification_type)
             else:
                 # Create new notification for other types
                 notification = self.create_notification_record(
                     user_id, cow_id, message, notification_type
                 )
                 if notification:
-                    return self._emit_real_time_notification(user_id, cow_id, message, notification_type)
+                    return self._stage_real_time_notification(user_id, cow_id, message, notification_type)
             
+            self.rate_limiter.refund([user_id])
             return False
             
         except Exception as e:
             logger.error(f"Failed to send notification to user {user_id}: {e}")
+            self.rate_limiter.refund([user_id])
             return False
     
     def _update_or_create_production_notification(self, user_id: int, cow_id: int, 
@@ -305,6 +257,8 @@ class NotificationService:
             ).filter(Notification.created_at >= day_start).first()
             
             if existing_notification:
+                if existing_notification.is_read:
+                    adjust_counters({user_id: (1, 0)})
                 existing_notification.message = self.sanitize_message(message)
                 existing_notification.is_read = False
                 existing_notification.created_at = datetime.utcnow()
@@ -321,20 +275,37 @@ class NotificationService:
             logger.error(f"Failed to update/create production notification: {e}")
             return False
     
-    def _emit_real_time_notification(self, user_id: int, cow_id: Optional[int], 
-                                   message: str, notification_type: str) -> bool:
-        """Emit real-time notification via socket"""
-        notification_data = {
+    @staticmethod
+    def _real_time_payload(cow_id: Optional[int], message: str, notification_type: str) -> Dict:
+        return {
             'cow_id': cow_id,
             'message': message,
             'type': notification_type,
             'is_read': False,
             'created_at': datetime.now().isoformat()
         }
-        return self.emit_notification_safely(user_id, notification_data)
     
-    def check_milk_production_and_notify(self) -> int:
-        """Check milk production levels and send notifications"""
+    def _stage_real_time_notification(self, user_id: int, cow_id: Optional[int], 
+                                      message: str, notification_type: str) -> bool:
+        """
+        Stage the socket emit in the current transaction; the outbox relay
+        delivers it once the caller commits
+        """
+        stage_notification(user_id, self._real_time_payload(cow_id, message, notification_type))
+        return True
+    
+    def check_milk_production_and_notify(self, cow_ids: Optional[List[int]] = None,
+                                         raise_errors: bool = False) -> int:
+        """
+        Check milk production levels and send notifications.
+
+        Evaluated set-wise: today's production analytics snapshot is loaded
+        once and the compiled production rules are applied to its columns at
+        once. Recipients are resolved once per run, existing notifications are
+        looked up with one query and the result is written in bulk.
+        `cow_ids` limits the evaluation to the given cows. Failures are
+        logged and return 0 unless `raise_errors` is set.
+        """
         if not current_app:
             logger.warning("No application context available")
             return 0
@@ -342,29 +313,56 @@ class NotificationService:
         with current_app.app_context():
             try:
                 today = date.today()
-                yesterday = today - timedelta(days=1)
                 
-                daily_summaries = DailyMilkSummary.query.filter_by(date=today).all()
+                rules = get_production_rules()
+                if not len(rules):
+                    logger.info("No active production rules")
+                    return 0
                 
-                if not daily_summaries:
+                production = load_production_analytics(
+                    today, cow_ids=cow_ids, history_days=rules.history_days
+                ).snapshot(today)
+                
+                if production.empty:
                     logger.info("No daily summaries found for today")
                     return 0
                 
-                notification_count = 0
-                
-                for summary in daily_summaries:
-                    # Check standard production thresholds
-                    message, notification_type = self._analyze_production_level(summary)
-                    
-                    if message and notification_type:
-                        count = self._create_production_notifications(
-                            summary.cow_id, message, notification_type, today
+                matches = rules.evaluate(production)
+                
+                # Resolve recipients once per run
+                cow_managers = self._get_cow_manager_ids(list({match.cow_id for match in matches}))
+                admin_ids = self.get_admin_user_ids()
+                supervisor_ids = self.get_supervisor_user_ids()
+                
+                planned: List[Tuple[int, int, str, str]] = []
+                for match in matches:
+                    cow_id = match.cow_id
+                    notification_type = match.rule.notification_type
+                    message = self._production_rule_message(match)
+                    if match.rule.audience == 'supervisors':
+                        # Supervisors (and admins)
+                        planned.extend(
+                            (supervisor_id, cow_id, f"Supervisor Alert: {message}", notification_type)
+                            for supervisor_id in supervisor_ids
+                        )
+                        planned.extend(
+                            (admin_id, cow_id, f"Admin Alert: {message}", notification_type)
+                            for admin_id in admin_ids
+                        )
+                    else:
+                        # Cow managers (and admins)
+                        manager_ids = cow_managers.get(cow_id, [])
+                        planned.extend(
+                            (user_id, cow_id, message, notification_type)
+                            for user_id in manager_ids
+                        )
+                        # Send to admin users (excluding those who are already managers)
+                        planned.extend(
+                            (admin_id, cow_id, f"Admin Alert: {message}", notification_type)
+                            for admin_id in admin_ids if admin_id not in manager_ids
                         )
-                        notification_count += count
-                    
-                    # Check production changes for supervisors
-                    change_count = self._check_production_changes_and_notify(summary, yesterday, today)
-                    notification_count += change_count
+                
+                notification_count = self._save_production_notifications(planned, today)
                 
                 logger.info(f"Sent {notification_count} production notifications")
                 return notification_count
@@ -372,162 +370,135 @@ class NotificationService:
             except Exception as e:
                 logger.error(f"Error in production check: {e}")
                 db.session.rollback()
+                if raise_errors:
+                    raise
                 return 0
     
-    def _check_production_changes_and_notify(self, current_summary: DailyMilkSummary, 
-                                           yesterday: date, today: date) -> int:
-        """Check for significant production changes and notify supervisors"""
-        try:
-            # Get yesterday's summary for the same cow
-            yesterday_summary = DailyMilkSummary.query.filter_by(
-                cow_id=current_summary.cow_id,
-                date=yesterday
-            ).first()
-            
-            if not yesterday_summary:
-                # No previous data to compare
-                return 0
-            
-            current_volume = current_summary.total_volume or 0
-            previous_volume = yesterday_summary.total_volume or 0
-            
-            # Skip if volumes are too low to be meaningful
-            if (current_volume < self.config.MIN_VOLUME_FOR_CHANGE_NOTIFICATION and 
-                previous_volume < self.config.MIN_VOLUME_FOR_CHANGE_NOTIFICATION):
-                return 0
-            
-            # Calculate percentage change (avoid division by zero)
-            if previous_volume == 0:
-                if current_volume > self.config.MIN_VOLUME_FOR_CHANGE_NOTIFICATION:
-                    # New production started
-                    percentage_change = 100.0
-                else:
-                    return 0
-            else:
-                percentage_change = ((current_volume - previous_volume) / previous_volume) * 100
-            
-            notification_count = 0
-            message = None
-            notification_type = None
-            
-            # Check for significant increase
-            if percentage_change >= self.config.PRODUCTION_INCREASE_THRESHOLD:
-                message = NotificationMessages.production_increase(
-                    current_summary.cow.id, current_summary.cow.name,
-                    current_volume, previous_volume, percentage_change
-                )
-                notification_type = NotificationTypes.PRODUCTION_INCREASE
-                
-            # Check for significant decrease
-            elif percentage_change <= -self.config.PRODUCTION_DECREASE_THRESHOLD:
-                message = NotificationMessages.production_decrease(
-                    current_summary.cow.id, current_summary.cow.name,
-                    current_volume, previous_volume, abs(percentage_change)
-                )
-                notification_type = NotificationTypes.PRODUCTION_DECREASE
-            
-            if message and notification_type:
-                # Notify supervisors about production changes
-                notification_count = self._notify_supervisors_about_production_change(
-                    current_summary.cow_id, message, notification_type, today
-                )
-            
-            return notification_count
-            
-        except Exception as e:
-            logger.error(f"Error checking production changes for cow {current_summary.cow_id}: {e}")
-            return 0
-    
-    def _notify_supervisors_about_production_change(self, cow_id: int, message: str, 
-                                                  notification_type: str, check_date: date) -> int:
-        """Notify supervisors about significant production changes"""
-        try:
-            notification_count = 0
-            
-            # Get all supervisors
-            supervisor_users = self.get_supervisor_users()
-            
-            # Send notifications to supervisors
-            for supervisor in supervisor_users:
-                supervisor_message = f"Supervisor Alert: {message}"
-                if self.send_notification_to_user(
-                    supervisor.id, cow_id, supervisor_message, notification_type, check_date
-                ):
-                    notification_count += 1
-            
-            # Also notify admins about significant changes
-            admin_users = self.get_admin_users()
-            for admin_user in admin_users:
-                admin_message = f"Admin Alert: {message}"
-                if self.send_notification_to_user(
-                    admin_user.id, cow_id, admin_message, notification_type, check_date
-                ):
-                    notification_count += 1
-            
-            if notification_count > 0:
-                db.session.commit()
-                
-            return notification_count
-            
-        except Exception as e:
-            logger.error(f"Failed to notify supervisors about production change: {e}")
-            db.session.rollback()
-            return 0
+    def _get_cow_manager_ids(self, cow_ids: List[int]) -> Dict[int, List[int]]:
+        """Map cow id -> manager user ids with a single query"""
+        managers: Dict[int, List[int]] = {}
+        if not cow_ids:
+            return managers
+        
+        relations = db.session.query(
+            user_cow_association.c.cow_id, user_cow_association.c.user_id
+        ).filter(user_cow_association.c.cow_id.in_(set(cow_ids))).all()
+        
+        for cow_id, user_id in relations:
+            managers.setdefault(cow_id, []).append(user_id)
+        return managers
     
-    def _analyze_production_level(self, summary: DailyMilkSummary) -> Tuple[Optional[str], Optional[str]]:
-        """Analyze production level and return appropriate message"""
-        if summary.total_volume < self.config.LOW_PRODUCTION_THRESHOLD:
-            message = NotificationMessages.low_production(
-                summary.cow.id, summary.cow.name, summary.total_volume
+    @staticmethod
+    def _production_rule_message(match: RuleMatch) -> str:
+        """The standard template for the built-in rule kinds, a generic one otherwise"""
+        rule = match.rule
+        kind = (rule.notification_type, rule.metric)
+        if kind == (NotificationTypes.LOW_PRODUCTION, 'total_volume'):
+            return NotificationMessages.low_production(match.cow_id, match.cow_name, match.value, rule.threshold)
+        if kind == (NotificationTypes.HIGH_PRODUCTION, 'total_volume'):
+            return NotificationMessages.high_production(match.cow_id, match.cow_name, match.value, rule.threshold)
+        if kind == (NotificationTypes.PRODUCTION_INCREASE, 'change_1d_pct'):
+            return NotificationMessages.production_increase(
+                match.cow_id, match.cow_name, match.total_volume, match.previous_volume, match.value
             )
-            return message, NotificationTypes.LOW_PRODUCTION
-        elif summary.total_volume > self.config.HIGH_PRODUCTION_THRESHOLD:
-            message = NotificationMessages.high_production(
-                summary.cow.id, summary.cow.name, summary.total_volume
+        if kind == (NotificationTypes.PRODUCTION_DECREASE, 'change_1d_pct'):
+            return NotificationMessages.production_decrease(
+                match.cow_id, match.cow_name, match.total_volume, match.previous_volume, abs(match.value)
             )
-            return message, NotificationTypes.HIGH_PRODUCTION
+        return NotificationMessages.production_rule(
+            match.cow_id, match.cow_name, rule.name, rule.metric, match.value, rule.operator, rule.threshold
+        )
+    
+    def _save_production_notifications(self, planned: List[Tuple[int, int, str, str]],
+                                       check_date: date) -> int:
+        """
+        Upsert the day's production notifications in bulk and emit them.
+        Like _update_or_create_production_notification, a notification of the
+        same user/cow/type created since the start of check_date is refreshed
+        instead of duplicated.
+        """
+        # A later duplicate key wins; only the survivors consume rate limit tokens
+        pending: Dict[Tuple[int, int, str], str] = {}
+        for user_id, cow_id, message, notification_type in planned:
+            key = (user_id, cow_id, notification_type)
+            pending.pop(key, None)
+            pending[key] = message
+        
+        allowed = self.rate_limiter.consume_many([key[0] for key in pending])
+        pending = {key: message for (key, message), ok in zip(pending.items(), allowed) if ok}
+        if not pending:
+            return 0
         
-        return None, None
-    
-    def _create_production_notifications(self, cow_id: int, message: str, 
-                                       notification_type: str, check_date: date) -> int:
-        """Create production notifications for managers and admins"""
         try:
-            notification_count = 0
-            
-            # Get cow managers
-            cow_managers = db.session.query(user_cow_association).filter_by(cow_id=cow_id).all()
-            manager_user_ids = {manager.user_id for manager in cow_managers}
-            
-            # Send to cow managers
-            for manager_relation in cow_managers:
-                if self.send_notification_to_user(
-                    manager_relation.user_id, cow_id, message, notification_type, check_date
-                ):
-                    notification_count += 1
-            
-            # Send to admin users (excluding those who are already managers)
-            admin_users = self.get_admin_users()
-            for admin_user in admin_users:
-                if admin_user.id not in manager_user_ids:
-                    admin_message = f"Admin Alert: {message}"
-                    if self.send_notification_to_user(
-                        admin_user.id, cow_id, admin_message, notification_type, check_date
-                    ):
-                        notification_count += 1
-            
-            if notification_count > 0:
-                db.session.commit()
+            day_start = datetime.combine(check_date, datetime.min.time())
             
-            return notification_count
+            existing_rows = db.session.query(
+                Notification.id, Notification.user_id, Notification.cow_id, Notification.type,
+                Notification.is_read
+            ).filter(
+                Notification.created_at >= day_start,
+                Notification.type.in_({key[2] for key in pending}),
+                Notification.cow_id.in_({key[1] for key in pending}),
+                Notification.user_id.in_({key[0] for key in pending})
+            ).order_by(Notification.id).all()
+            
+            existing: Dict[Tuple[int, int, str], Tuple[int, bool]] = {}
+            for row in existing_rows:
+                existing.setdefault((row.user_id, row.cow_id, row.type), (row.id, row.is_read))
+            
+            now = datetime.utcnow()
+            updates = []
+            inserts = []
+            # Counter deltas: refreshed notifications that were read become unread again
+            deltas: Dict[int, Tuple[int, int]] = {}
+            for key, message in pending.items():
+                user_id, cow_id, notification_type = key
+                unread, total = deltas.get(user_id, (0, 0))
+                if key in existing:
+                    notification_id, was_read = existing[key]
+                    deltas[user_id] = (unread + 1, total) if was_read else (unread, total)
+                    updates.append({
+                        'id': notification_id,
+                        'message': self.sanitize_message(message),
+                        'is_read': False,
+                        'created_at': now
+                    })
+                else:
+                    deltas[user_id] = (unread + 1, total + 1)
+                    inserts.append({
+                        'user_id': user_id,
+                        'cow_id': cow_id,
+                        'message': self.sanitize_message(message),
+                        'type': notification_type,
+                        'is_read': False,
+                        'created_at': now
+                    })
+            
+            if updates:
+                db.session.execute(update(Notification), updates)
+            if inserts:
+                db.session.execute(insert(Notification), inserts)
+            adjust_counters(deltas)
+            # Socket emits go out through the outbox once this commits
+            notification_count = stage_notifications([
+                (user_id, self._real_time_payload(cow_id, message, notification_type))
+                for (user_id, cow_id, notification_type), message in pending.items()
+            ])
+            db.session.commit()
             
         except Exception as e:
-            logger.error(f"Failed to create production notifications: {e}")
+            logger.error(f"Failed to save production notifications: {e}")
             db.session.rollback()
+            self.rate_limiter.refund([key[0] for key in pending])
             return 0
+        
+        return notification_count
     
-    def check_missing_milking_and_notify(self) -> int:
-        """Check for missing milking data today and send notifications"""
+    def check_missing_milking_and_notify(self, raise_errors: bool = False) -> int:
+        """
+        Check for missing milking data today and send notifications.
+        Failures are logged and return 0 unless `raise_errors` is set.
+        """
         if not current_app:
             logger.warning("No application context available")
             return 0
@@ -571,47 +542,30 @@ class NotificationService:
                     # Generic message if we can't determine specific cows
                     message = NotificationMessages.missing_milking()
                     
-                # Notify farm managers, supervisors, and admins
-                user_notified = set()
-                
-                # Notify cow managers
+                # Notify farm managers, then supervisors and admins not already notified
+                recipients: Dict[int, Tuple[str, Optional[int]]] = {}
                 for cow in cows_without_data:
-                    managers = self._get_cow_managers(cow)
-                    for manager in managers:
-                        if manager.id in user_notified or self.rate_limiter.is_rate_limited(manager.id):
-                            continue
-                            
-                        if self.create_notification(
-                            manager.id, message, NotificationTypes.MISSING_MILKING, cow.id
-                        ):
-                            notification_count += 1
-                            user_notified.add(manager.id)
-                
-                # Notify supervisors not already notified
-                supervisor_users = self.get_supervisor_users()
-                for supervisor in supervisor_users:
-                    if supervisor.id in user_notified or self.rate_limiter.is_rate_limited(supervisor.id):
-                        continue
-                        
-                    supervisor_message = f"Supervisor Alert: {message}"
-                    if self.create_notification(
-                        supervisor.id, supervisor_message, NotificationTypes.MISSING_MILKING
-                    ):
-                        notification_count += 1
-                        user_notified.add(supervisor.id)
-                
-                # Notify admins not already notified
-                admin_users = self.get_admin_users()
-                for admin in admin_users:
-                    if admin.id in user_notified or self.rate_limiter.is_rate_limited(admin.id):
+                    for manager in self._get_cow_managers(cow):
+                        recipients.setdefault(manager.id, (message, cow.id))
+                for supervisor_id in self.get_supervisor_user_ids():
+                    recipients.setdefault(supervisor_id, (f"Supervisor Alert: {message}", None))
+                for admin_id in self.get_admin_user_ids():
+                    recipients.setdefault(admin_id, (f"Admin Alert: {message}", None))
+                
+                # One rate limit round-trip for the whole recipient set
+                allowed = self.rate_limiter.consume_many(list(recipients))
+                failed = []
+                for (user_id, (user_message, cow_id)), ok in zip(recipients.items(), allowed):
+                    if not ok:
                         continue
-                        
-                    admin_message = f"Admin Alert: {message}"
                     if self.create_notification(
-                        admin.id, admin_message, NotificationTypes.MISSING_MILKING
+                        user_id, user_message, NotificationTypes.MISSING_MILKING, cow_id
                     ):
                         notification_count += 1
-                        user_notified.add(admin.id)
+                    else:
+                        failed.append(user_id)
+                if failed:
+                    self.rate_limiter.refund(failed)
                 
                 if notification_count > 0:
                     logger.info(f"Sent {notification_count} missing milking notifications")
@@ -621,103 +575,178 @@ class NotificationService:
             except Exception as e:
                 logger.error(f"Error checking missing milking data: {e}")
                 db.session.rollback()
+                if raise_errors:
+                    raise
                 return 0
     
-    def check_milk_expiry_and_notify(self) -> int:
-        """Check milk expiry and send notifications"""
+    def check_milk_expiry_and_notify(self, cow_ids: Optional[List[int]] = None,
+                                     raise_errors: bool = False) -> int:
+        """
+        Check milk expiry and send notifications.
+        `cow_ids` limits the check to batches holding milk from the given cows.
+        Failures are logged and return 0 unless `raise_errors` is set.
+        """
         if not current_app:
             logger.warning("No application context available")
             return 0
         
         with current_app.app_context():
             try:
-                current_time = self.get_timezone_aware_time()
+                current_time = expiry_now()
                 warning_time = current_time + timedelta(hours=self.config.EXPIRY_WARNING_HOURS)
                 
-                fresh_batches = MilkBatch.query.filter(MilkBatch.status == 'FRESH').all()
-                
-                if not fresh_batches:
-                    return 0
+                # Expire due batches in one UPDATE; only the ones flipped here are announced
+                expired_ids = expire_fresh_batches(current_time, cow_ids=cow_ids)
                 
-                expired_batches = [b for b in fresh_batches if b.expiry_date < current_time]
-                warning_batches = [
-                    b for b in fresh_batches 
-                    if current_time <= b.expiry_date <= warning_time
-                ]
+                warning_query = MilkBatch.query.filter(
+                    MilkBatch.status == MilkStatus.FRESH,
+                    MilkBatch.expiry_date >= current_time,
+                    MilkBatch.expiry_date <= warning_time
+                )
+                if cow_ids is not None:
+                    warning_query = warning_query.filter(MilkBatch.id.in_(
+                        db.session.query(MilkingSession.milk_batch_id).filter(
+                            MilkingSession.cow_id.in_(set(cow_ids))
+                        )
+                    ))
+                warning_batches = warning_query.all()
                 
                 notification_count = 0
-                notification_count += self._process_batch_notifications(
-                    expired_batches, current_time, "expired"
-                )
+                notification_count += self.notify_expired_batches(expired_ids, current_time)
                 notification_count += self._process_batch_notifications(
                     warning_batches, current_time, "warning"
                 )
                 
-                if notification_count > 0:
-                    db.session.commit()
-                
                 logger.info(f"Sent {notification_count} expiry notifications")
                 return notification_count
                 
             except Exception as e:
                 logger.error(f"Error in expiry check: {e}")
                 db.session.rollback()
+                if raise_errors:
+                    raise
                 return 0
     
+    def notify_expired_batches(self, batch_ids: List[int],
+                               current_time: Optional[datetime] = None) -> int:
+        """Send expiry notifications for batches that were just marked EXPIRED"""
+        if not batch_ids:
+            return 0
+        
+        expired_batches = MilkBatch.query.filter(MilkBatch.id.in_(batch_ids)).all()
+        return self._process_batch_notifications(
+            expired_batches, current_time or expiry_now(), "expired"
+        )
+    
     def _process_batch_notifications(self, batches: List[MilkBatch], 
                                    current_time: datetime, batch_type: str) -> int:
-        """Process batch notifications for managers and admins"""
+        """
+        Notify managers and admins about expired or expiring batches.
+        Recipients and earlier warnings are resolved with grouped queries, the
+        notifications are bulk-inserted and committed, then emitted.
+        """
         if not batches:
             return 0
         
-        notification_count = 0
-        admin_users = self.get_admin_users()
+        planned = self._plan_batch_notifications(batches, current_time, batch_type)
+        if not planned:
+            return 0
         
-        for batch in batches:
-            try:
-                if batch_type == "expired":
-                    batch.status = 'EXPIRED'
-                
-                affected_cows = self._get_affected_cows_from_batch(batch)
-                
-                for cow in affected_cows:
-                    message = self._create_batch_message(batch, cow, current_time, batch_type)
-                    notification_type = (NotificationTypes.MILK_EXPIRY if batch_type == "expired" 
-                                       else NotificationTypes.MILK_WARNING)
-                    
-                    notified_users = set()
-                    
-                    # Notify cow managers
-                    managers = self._get_cow_managers(cow)
-                    notification_count += self._notify_managers(
-                        managers, cow.id, message, notification_type, 
-                        batch_type, batch.batch_number, notified_users
-                    )
-                    
-                    # Notify admin users
-                    notification_count += self._notify_admins(
-                        admin_users, cow.id, message, notification_type,
-                        batch_type, batch.batch_number, notified_users
-                    )
-                    
-            except Exception as e:
-                logger.error(f"Error processing batch {batch.id}: {e}")
-                continue
+        try:
+            now = datetime.utcnow()
+            db.session.execute(insert(Notification), [
+                {
+                    'user_id': user_id,
+                    'cow_id': cow_id,
+                    'message': self.sanitize_message(message),
+                    'type': notification_type,
+                    'is_read': False,
+                    'created_at': now
+                }
+                for user_id, cow_id, message, notification_type in planned
+            ])
+            per_user = Counter(entry[0] for entry in planned)
+            adjust_counters({user_id: (count, count) for user_id, count in per_user.items()})
+            # Socket emits go out through the outbox once this commits
+            notification_count = stage_notifications([
+                (user_id, self._real_time_payload(cow_id, message, notification_type))
+                for user_id, cow_id, message, notification_type in planned
+            ])
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to save batch notifications: {e}")
+            db.session.rollback()
+            self.rate_limiter.refund([entry[0] for entry in planned])
+            return 0
         
         return notification_count
     
-    def _get_affected_cows_from_batch(self, batch: MilkBatch) -> List[Cow]:
-        """Get cows affected by batch expiry"""
-        try:
-            sessions = batch.milking_sessions
-            if not sessions:
-                return []
-            
-            cow_ids = set(session.cow_id for session in sessions)
-            return [Cow.query.get(cow_id) for cow_id in cow_ids if Cow.query.get(cow_id)]
-        except Exception as e:
-            logger.error(f"Error getting affected cows: {e}")
+    def _plan_batch_notifications(self, batches: List[MilkBatch], current_time: datetime,
+                                  batch_type: str) -> List[Tuple[int, int, str, str]]:
+        """Build (user_id, cow_id, message, type) for every recipient of every batch"""
+        notification_type = (NotificationTypes.MILK_EXPIRY if batch_type == "expired"
+                             else NotificationTypes.MILK_WARNING)
+        
+        # batch -> cows holding milk in it
+        batch_cows: Dict[int, List[Tuple[int, str]]] = {}
+        for batch_id, cow_id, cow_name in db.session.query(
+            MilkingSession.milk_batch_id, Cow.id, Cow.name
+        ).join(Cow, Cow.id == MilkingSession.cow_id).filter(
+            MilkingSession.milk_batch_id.in_([batch.id for batch in batches])
+        ).distinct().order_by(MilkingSession.milk_batch_id, Cow.id):
+            batch_cows.setdefault(batch_id, []).append((cow_id, cow_name))
+        
+        cow_ids = {cow_id for cows in batch_cows.values() for cow_id, _ in cows}
+        if not cow_ids:
             return []
+        
+        managers = self._get_cow_manager_ids(list(cow_ids))
+        admin_ids = self.get_admin_user_ids()
+        
+        warned = set()
+        if batch_type == "warning":
+            warned = self._get_warned_today(cow_ids, batches)
+        
+        planned = []
+        for batch in batches:
+            for cow_id, cow_name in batch_cows.get(batch.id, []):
+                message = self._create_batch_message(batch, cow_name, current_time, batch_type)
+                cow_managers = managers.get(cow_id, [])
+                
+                recipients = [(user_id, message) for user_id in cow_managers]
+                recipients += [
+                    (admin_id, f"Admin Alert: {message}")
+                    for admin_id in admin_ids if admin_id not in cow_managers
+                ]
+                
+                for user_id, recipient_message in recipients:
+                    if (user_id, cow_id, batch.batch_number) in warned:
+                        continue
+                    planned.append((user_id, cow_id, recipient_message, notification_type))
+        
+        # Rate limit the whole recipient set in one call
+        allowed = self.rate_limiter.consume_many([entry[0] for entry in planned])
+        return [entry for entry, ok in zip(planned, allowed) if ok]
+    
+    def _get_warned_today(self, cow_ids: Set[int], batches: List[MilkBatch]) -> Set[Tuple[int, int, str]]:
+        """(user_id, cow_id, batch_number) that already received a warning today"""
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        batch_numbers = {batch.batch_number for batch in batches}
+        
+        warned = set()
+        for user_id, cow_id, message in db.session.query(
+            Notification.user_id, Notification.cow_id, Notification.message
+        ).filter(
+            Notification.type == NotificationTypes.MILK_WARNING,
+            Notification.cow_id.in_(cow_ids),
+            Notification.created_at >= today_start
+        ):
+            # Exact batch number from the batch_warning template, so one
+            # number that prefixes another cannot match it
+            match = WARNED_BATCH_PATTERN.search(message)
+            if match and match.group(1) in batch_numbers:
+                warned.add((user_id, cow_id, match.group(1)))
+        return warned
     
     def _get_cow_managers(self, cow: Cow) -> List[User]:
         """Get managers for specific cow"""
@@ -727,81 +756,23 @@ class NotificationService:
             logger.error(f"Error getting cow managers: {e}")
             return []
     
-    def _create_batch_message(self, batch: MilkBatch, cow: Cow, 
+    def _create_batch_message(self, batch: MilkBatch, cow_name: str, 
                             current_time: datetime, batch_type: str) -> str:
         """Create appropriate message for batch notification"""
         expiry_time = batch.expiry_date.strftime("%H:%M on %d/%m/%Y")
         
         if batch_type == "expired":
             return NotificationMessages.batch_expired(
-                batch.batch_number, batch.total_volume, cow.name, expiry_time
+                batch.batch_number, batch.total_volume, cow_name, expiry_time
             )
         else:
             time_remaining = batch.expiry_date - current_time
             hours_remaining = time_remaining.total_seconds() / 3600
             return NotificationMessages.batch_warning(
-                batch.batch_number, batch.total_volume, cow.name, 
+                batch.batch_number, batch.total_volume, cow_name, 
                 hours_remaining, expiry_time
             )
     
-    def _notify_managers(self, managers: List[User], cow_id: int, message: str,
-                        notification_type: str, batch_type: str, batch_number: str,
-                        notified_users: Set[int]) -> int:
-        """Send notifications to cow managers"""
-        count = 0
-        for manager in managers:
-            if (self.rate_limiter.is_rate_limited(manager.id) or
-                (batch_type == "warning" and self._has_recent_warning(
-                    manager.id, cow_id, batch_number))):
-                continue
-            
-            notification = self.create_notification_record(
-                manager.id, cow_id, message, notification_type
-            )
-            if notification and self._emit_real_time_notification(
-                manager.id, cow_id, message, notification_type
-            ):
-                notified_users.add(manager.id)
-                count += 1
-        
-        return count
-    
-    def _notify_admins(self, admin_users: List[User], cow_id: int, message: str,
-                      notification_type: str, batch_type: str, batch_number: str,
-                      notified_users: Set[int]) -> int:
-        """Send notifications to admin users"""
-        count = 0
-        for admin_user in admin_users:
-            if (admin_user.id in notified_users or
-                self.rate_limiter.is_rate_limited(admin_user.id) or
-                (batch_type == "warning" and self._has_recent_warning(
-                    admin_user.id, cow_id, batch_number))):
-                continue
-            
-            admin_message = f"Admin Alert: {message}"
-            notification = self.create_notification_record(
-                admin_user.id, cow_id, admin_message, notification_type
-            )
-            if notification and self._emit_real_time_notification(
-                admin_user.id, cow_id, admin_message, notification_type
-            ):
-                count += 1
-        
-        return count
-    
-    def _has_recent_warning(self, user_id: int, cow_id: int, batch_number: str) -> bool:
-        """Check if user already received warning for this batch today"""
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        return Notification.query.filter_by(
-            user_id=user_id,
-            cow_id=cow_id,
-            type=NotificationTypes.MILK_WARNING
-        ).filter(
-            Notification.message.contains(f"Batch {batch_number}"),
-            Notification.created_at >= today_start
-        ).first() is not None
-    
     def create_notification(self, user_id: int, message: str, notification_type: str,
                           cow_id: Optional[int] = None, 
                           additional_data: Optional[Dict] = None) -> Optional[Notification]:
@@ -814,9 +785,8 @@ class NotificationService:
             if not notification:
                 return None
             
-            db.session.commit()
-            
-            notification_data = {
+            db.session.flush()
+            stage_notification(user_id, {
                 'id': notification.id,
                 'user_id': notification.user_id,
                 'cow_id': notification.cow_id,
@@ -825,9 +795,8 @@ class NotificationService:
                 'is_read': notification.is_read,
                 'created_at': notification.created_at.isoformat(),
                 'additional_data': additional_data
-            }
-            
-            self.emit_notification_safely(user_id, notification_data)
+            })
+            db.session.commit()
             return notification
             
         except Exception as e:
@@ -840,20 +809,27 @@ class NotificationService:
                                 additional_data: Optional[Dict] = None) -> int:
         """Create notification for all admin users"""
         try:
-            admin_users = self.get_admin_users()
+            admin_ids = self.get_admin_user_ids()
             notifications_created = 0
             
-            for admin_user in admin_users:
-                if self.rate_limiter.is_rate_limited(admin_user.id):
+            allowed = self.rate_limiter.consume_many(list(admin_ids))
+            failed = []
+            for admin_id, ok in zip(admin_ids, allowed):
+                if not ok:
                     continue
                 
                 admin_message = f"System Alert: {message}"
                 notification = self.create_notification(
-                    admin_user.id, admin_message, notification_type, cow_id, additional_data
+                    admin_id, admin_message, notification_type, cow_id, additional_data
                 )
                 
                 if notification:
                     notifications_created += 1
+                else:
+                    failed.append(admin_id)
+            
+            if failed:
+                self.rate_limiter.refund(failed)
             
             return notifications_created
             
@@ -866,20 +842,27 @@ class NotificationService:
                                      additional_data: Optional[Dict] = None) -> int:
         """Create notification for all supervisor users"""
         try:
-            supervisor_users = self.get_supervisor_users()
+            supervisor_ids = self.get_supervisor_user_ids()
             notifications_created = 0
             
-            for supervisor in supervisor_users:
-                if self.rate_limiter.is_rate_limited(supervisor.id):
+            allowed = self.rate_limiter.consume_many(list(supervisor_ids))
+            failed = []
+            for supervisor_id, ok in zip(supervisor_ids, allowed):
+                if not ok:
                     continue
                 
                 supervisor_message = f"Supervisor Alert: {message}"
                 notification = self.create_notification(
-                    supervisor.id, supervisor_message, notification_type, cow_id, additional_data
+                    supervisor_id, supervisor_message, notification_type, cow_id, additional_data
                 )
                 
                 if notification:
                     notifications_created += 1
+                else:
+                    failed.append(supervisor_id)
+            
+            if failed:
+                self.rate_limiter.refund(failed)
             
             return notifications_created
             
@@ -888,15 +871,9 @@ class NotificationService:
             return 0
     
     def cleanup_old_notifications(self) -> int:
-        """Clean up old notifications and rate limits"""
+        """Clean up old notifications (chunked, see notification_retention) and rate limits"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=self.config.CLEANUP_RETENTION_DAYS)
-            
-            deleted_count = Notification.query.filter(
-                Notification.created_at < cutoff_date
-            ).delete()
-            
-            db.session.commit()
+            deleted_count = notification_retention.run()['deleted']
             
             # Clean up rate limiter
             expired_limits = self.rate_limiter.cleanup_expired_limits()
@@ -918,13 +895,17 @@ def check_missing_milking_and_notify() -> int:
     """Check for missing milking data and send notifications"""
     return notification_service.check_missing_milking_and_notify()
 
-def check_milk_production_and_notify() -> int:
+def check_milk_production_and_notify(cow_ids: Optional[List[int]] = None) -> int:
     """Check milk production and send notifications"""
-    return notification_service.check_milk_production_and_notify()
+    return notification_service.check_milk_production_and_notify(cow_ids)
 
-def check_milk_expiry_and_notify() -> int:
+def check_milk_expiry_and_notify(cow_ids: Optional[List[int]] = None) -> int:
     """Check milk expiry and send notifications"""
-    return notification_service.check_milk_expiry_and_notify()
+    return notification_service.check_milk_expiry_and_notify(cow_ids)
+
+def notify_expired_batches(batch_ids: List[int]) -> int:
+    """Send expiry notifications for batches returned by the expiry sweep"""
+    return notification_service.notify_expired_batches(batch_ids)
 
 def create_notification(user_id: int, message: str, notification_type: str,
                        cow_id: Optional[int] = None, 
@@ -2,19 +2,42 @@ from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger  # Move this import to the top
+from sqlalchemy import func
+import json
 import logging
 import atexit
-from flask import current_app
-from app.services.notification import check_milk_expiry_and_notify, check_missing_milking_and_notify
+import time
+from functools import partial
+from app.database.database import db
+from app.models.scheduler import SchedulerJobRun
+from app.services.notification import notification_service
+from app.services.report_jobs import report_job_service
+from app.services.notification_outbox import notification_relay
+from app.services.notification_retention import notification_retention
+from app.services.scheduler_lock import create_lease, make_holder_id
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class NotificationScheduler:
+    """
+    The application's only scheduler. Every worker process runs it, but jobs
+    execute only in the process holding the leader lease (see scheduler_lock),
+    and every run is recorded in scheduler_job_runs.
+    """
+
+    HISTORY_LIMIT = 10
+
     def __init__(self, app=None):
         self.app = app
         self.scheduler = None
-        
+        self.lease = None
+        self.holder_id = make_holder_id()
+        self.is_leader = False
+        self._leader_until = None
+        self._atexit_registered = False
+        self._jobs = {}
+
     def init_app(self, app):
         """Initialize scheduler with Flask app"""
         self.app = app
@@ -26,68 +49,231 @@ class NotificationScheduler:
                 'misfire_grace_time': 30
             }
         )
-        
+        self.lease = create_lease(app)
+        self.lease_ttl = timedelta(seconds=app.config['SCHEDULER_LEASE_SECONDS'])
+        self.history_retention = timedelta(days=app.config['SCHEDULER_HISTORY_DAYS'])
+
+        # job id -> (name, trigger factory, function run inside the app context).
+        # Jobs raise on failure so the run is recorded as an error.
+        self._jobs = {
+            'milk_production_check': (
+                'Milk Production Check', lambda: IntervalTrigger(minutes=5),
+                partial(notification_service.check_milk_production_and_notify, raise_errors=True)
+            ),
+            'milk_expiry_check': (
+                'Milk Expiry Check', lambda: IntervalTrigger(minutes=5),
+                partial(notification_service.check_milk_expiry_and_notify, raise_errors=True)
+            ),
+            # Runs once daily at 1:00 PM
+            'missing_milking_check': (
+                'Missing Milking Check', lambda: CronTrigger(hour=13, minute=0),
+                partial(notification_service.check_missing_milking_and_notify, raise_errors=True)
+            ),
+            # Remove expired report artifacts every hour
+            'report_cleanup': (
+                'Report Artifact Cleanup', lambda: IntervalTrigger(hours=1),
+                report_job_service.cleanup_expired_jobs
+            ),
+            # Drop delivered notification outbox rows
+            'notification_outbox_cleanup': (
+                'Notification Outbox Cleanup', lambda: IntervalTrigger(hours=1),
+                notification_relay.cleanup
+            ),
+            # Delete expired notifications in chunks (02:30, off-peak)
+            'notification_retention': (
+                'Notification Retention', lambda: CronTrigger(hour=2, minute=30),
+                notification_retention.run
+            ),
+            'scheduler_history_cleanup': (
+                'Scheduler History Cleanup', lambda: CronTrigger(hour=3, minute=0),
+                self._cleanup_history
+            ),
+        }
+
     def start(self):
         """Start the scheduler"""
         if not self.scheduler:
             logging.error("Scheduler not initialized")
             return
-            
+
         if self.scheduler.running:
             logging.warning("Scheduler is already running")
             return
-        
-        # Add milk expiry check job
-        self.scheduler.add_job(
-            func=self._run_milk_expiry_check,
-            trigger=IntervalTrigger(minutes=5),
-            id='milk_expiry_check',
-            name='Milk Expiry Check',
-            replace_existing=True
-        )
 
-        # Add missing milking check job - runs once daily at 1:00 PM
+        for job_id, (name, trigger, _) in self._jobs.items():
+            self.scheduler.add_job(
+                func=self._run_job,
+                args=[job_id],
+                trigger=trigger(),
+                id=job_id,
+                name=name,
+                replace_existing=True
+            )
+
+        # Leader election heartbeat, runs in every process
         self.scheduler.add_job(
-            func=self._run_missing_milking_check,
-            trigger=CronTrigger(hour=13, minute=0),  # Run daily at 1:00 PM
-            id='missing_milking_check',
-            name='Missing Milking Check',
+            func=self._renew_lease,
+            trigger=IntervalTrigger(seconds=max(int(self.lease_ttl.total_seconds() / 3), 1)),
+            id='leader_lease',
+            name='Leader Lease Renewal',
             replace_existing=True
         )
-        
+        self._renew_lease()
+
         self.scheduler.start()
-        logging.info("Notification scheduler started - checks configured")
-    
+        logging.info(f"Scheduler started as {self.holder_id} "
+                     f"({'leader' if self.is_leader else 'standby'}, {self.lease.backend} lease)")
+
         # Shut down the scheduler when exiting the app
-        atexit.register(lambda: self.shutdown())
-        
+        if not self._atexit_registered:
+            atexit.register(lambda: self.shutdown())
+            self._atexit_registered = True
+
     def shutdown(self):
-        """Stop the scheduler"""
+        """Stop the scheduler and hand over the leader lease"""
         if self.scheduler and self.scheduler.running:
-            self.scheduler.shutdown()
+            self.scheduler.shutdown(wait=False)
             logging.info("Notification scheduler stopped")
-            
-            
-    def _run_milk_expiry_check(self):
-        """Run milk expiry check with app context"""
+
+        if self.is_leader:
+            try:
+                self.lease.release(self.holder_id)
+            except Exception as e:
+                logging.error(f"Failed to release scheduler lease: {str(e)}")
+            self.is_leader = False
+            self._leader_until = None
+
+    def _renew_lease(self) -> bool:
+        """Acquire or renew the leader lease"""
+        try:
+            acquired = self.lease.acquire(self.holder_id, self.lease_ttl)
+        except Exception as e:
+            logging.error(f"Failed to renew scheduler lease: {str(e)}")
+            acquired = False
+
+        if acquired != self.is_leader:
+            logging.info(f"Scheduler {self.holder_id} {'became leader' if acquired else 'lost leadership'}")
+        self.is_leader = acquired
+        self._leader_until = datetime.utcnow() + self.lease_ttl if acquired else None
+        return acquired
+
+    def _holds_lease(self) -> bool:
+        if self.is_leader and self._leader_until and datetime.utcnow() < self._leader_until:
+            return True
+        return self._renew_lease()
+
+    def _run_job(self, job_id):
+        """Run a scheduled job with app context if this process is the leader"""
+        if not self._holds_lease():
+            return
+
+        _, _, job_func = self._jobs[job_id]
+        started_at = datetime.utcnow()
+        started = time.monotonic()
+        status, result, error = 'success', None, None
+
         try:
             with self.app.app_context():
-                logging.info("Running scheduled milk expiry check")
-                notification_count = check_milk_expiry_and_notify()
-                logging.info(f"Milk expiry check completed - {notification_count} notifications created")
+                logging.info(f"Running scheduled job {job_id}")
+                result = job_func()
+                logging.info(f"Scheduled job {job_id} completed - result: {result}")
         except Exception as e:
-            logging.error(f"Error in scheduled milk expiry check: {str(e)}")
+            status, error = 'error', str(e)
+            logging.error(f"Error in scheduled job {job_id}: {str(e)}")
+
+        self._record_run(job_id, status, started_at, int((time.monotonic() - started) * 1000), result, error)
 
-    def _run_missing_milking_check(self):
-        """Run missing milking check with app context"""
+    def _record_run(self, job_id, status, started_at, duration_ms, result, error):
         try:
             with self.app.app_context():
-                logging.info("Running scheduled missing milking check")
-                notification_count = check_missing_milking_and_notify()
-                logging.info(f"Missing milking check completed - {notification_count} notifications created")
+                db.session.add(SchedulerJobRun(
+                    job_id=job_id,
+                    holder=self.holder_id,
+                    status=status,
+                    started_at=started_at,
+                    finished_at=started_at + timedelta(milliseconds=duration_ms),
+                    duration_ms=duration_ms,
+                    result=self._format_result(result),
+                    error=error
+                ))
+                db.session.commit()
         except Exception as e:
-            logging.error(f"Error in scheduled missing milking check: {str(e)}")
+            logging.error(f"Failed to record run of scheduled job {job_id}: {str(e)}")
+
+    @staticmethod
+    def _format_result(result):
+        # Jobs may return a metrics dict; keep it machine readable
+        if result is None:
+            return None
+        text = json.dumps(result, default=str, separators=(',', ':')) if isinstance(result, dict) else str(result)
+        return text[:255]
+
+    def _cleanup_history(self) -> int:
+        cutoff = datetime.utcnow() - self.history_retention
+        deleted = SchedulerJobRun.query.filter(SchedulerJobRun.started_at < cutoff).delete()
+        db.session.commit()
+        return deleted
+
+    def get_status(self):
+        """Scheduler state plus per-job run history; requires an app context"""
+        is_running = bool(self.scheduler and self.scheduler.running)
+        scheduled = {job.id: job for job in self.scheduler.get_jobs()} if is_running else {}
+
+        since = datetime.utcnow() - self.history_retention
+        stats = {
+            row.job_id: row for row in db.session.query(
+                SchedulerJobRun.job_id,
+                func.count(SchedulerJobRun.id).label('runs'),
+                func.sum(db.case((SchedulerJobRun.status == 'error', 1), else_=0)).label('failures'),
+                func.avg(SchedulerJobRun.duration_ms).label('avg_duration_ms'),
+                func.max(SchedulerJobRun.duration_ms).label('max_duration_ms')
+            ).filter(SchedulerJobRun.started_at >= since).group_by(SchedulerJobRun.job_id)
+        }
+
+        jobs = []
+        for job_id, (name, _, _) in self._jobs.items():
+            history = SchedulerJobRun.query.filter_by(job_id=job_id)\
+                .order_by(SchedulerJobRun.started_at.desc()).limit(self.HISTORY_LIMIT).all()
+            last_error = SchedulerJobRun.query.filter_by(job_id=job_id, status='error')\
+                .order_by(SchedulerJobRun.started_at.desc()).first()
+            job_stats = stats.get(job_id)
+            scheduled_job = scheduled.get(job_id)
+
+            jobs.append({
+                'id': job_id,
+                'name': name,
+                'next_run_time': scheduled_job.next_run_time.isoformat()
+                    if scheduled_job and scheduled_job.next_run_time else None,
+                'last_run': self._serialize_run(history[0]) if history else None,
+                'last_error': self._serialize_run(last_error) if last_error else None,
+                'runs': int(job_stats.runs) if job_stats else 0,
+                'failures': int(job_stats.failures or 0) if job_stats else 0,
+                'avg_duration_ms': round(float(job_stats.avg_duration_ms), 1)
+                    if job_stats and job_stats.avg_duration_ms is not None else None,
+                'max_duration_ms': job_stats.max_duration_ms if job_stats else None,
+                'history': [self._serialize_run(run) for run in history]
+            })
+
+        return {
+            'scheduler_running': is_running,
+            'instance': self.holder_id,
+            'is_leader': self.is_leader,
+            'lease': dict(self.lease.current(), backend=self.lease.backend) if self.lease else None,
+            'jobs': jobs
+        }
+
+    @staticmethod
+    def _serialize_run(run):
+        return {
+            'status': run.status,
+            'holder': run.holder,
+            'started_at': run.started_at.isoformat(),
+            'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+            'duration_ms': run.duration_ms,
+            'result': run.result,
+            'error': run.error
+        }
 
 
 # Global scheduler instance
-notification_scheduler = NotificationScheduler()
\ No newline at end of file
+notification_scheduler = NotificationScheduler()
@@ -0,0 +1,128 @@
+"""
+Notification Counters
+
+Unread and total notification counts per user, stored in
+`notification_counters` so the inbox badge and page totals are a primary key
+lookup instead of a COUNT over the user's history.
+
+Every writer of `notifications` adjusts the counters in its own transaction:
+inserts and un-reads via `adjust_counters`, deletes via
+`deduct_notifications` (called before the DELETE with the same criteria).
+Counter rows are created on the write path only: with the user (see
+`create_counters`), or by the upsert in `adjust_counters` for users that
+predate it. A user without a row therefore has no notifications, and reads
+never write. `rebuild_counters` recomputes rows from scratch.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.database.database import db
+from app.models.notification import Notification
+from app.models.notification_counter import NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+_counters = NotificationCounter.__table__
+
+
+def count_notifications(*criteria) -> Dict[int, Tuple[int, int]]:
+    """user_id -> (unread, total) for notifications matching the criteria"""
+    rows = db.session.execute(
+        select(
+            Notification.user_id,
+            func.sum(case((Notification.is_read == False, 1), else_=0)),  # noqa: E712
+            func.count(Notification.id)
+        ).where(*criteria).group_by(Notification.user_id)
+    )
+    return {user_id: (int(unread or 0), int(total)) for user_id, unread, total in rows}
+
+
+def _upsert_statement():
+    """INSERT of a counter row that adds its counts to an existing row instead"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(_counters)
+        new = stmt.inserted
+    elif dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(_counters)
+        new = stmt.excluded
+    else:
+        raise NotImplementedError(f"Counter upsert is not supported on {dialect}")
+
+    stmt = stmt.values(user_id=bindparam('b_user_id'), unread_count=bindparam('b_unread'),
+                       total_count=bindparam('b_total'), updated_at=bindparam('b_now'))
+    increments = {
+        'unread_count': _counters.c.unread_count + new.unread_count,
+        'total_count': _counters.c.total_count + new.total_count,
+        'updated_at': new.updated_at,
+    }
+    if dialect == 'mysql':
+        return stmt.on_duplicate_key_update(increments)
+    return stmt.on_conflict_do_update(index_elements=['user_id'], set_=increments)
+
+
+def adjust_counters(deltas: Dict[int, Tuple[int, int]]) -> None:
+    """
+    Add (unread, total) deltas to the users' counter rows in the current
+    transaction, creating missing rows
+    """
+    now = datetime.utcnow()
+    params = [
+        {'b_user_id': user_id, 'b_unread': unread, 'b_total': total, 'b_now': now}
+        for user_id, (unread, total) in deltas.items() if unread or total
+    ]
+    if not params:
+        return
+    db.session.execute(_upsert_statement(), params)
+
+
+def create_counters(user_id: int) -> None:
+    """Empty counter row for a new user, in the current transaction"""
+    db.session.execute(insert(_counters).values(
+        user_id=user_id, unread_count=0, total_count=0, updated_at=datetime.utcnow()
+    ))
+
+
+def deduct_notifications(*criteria) -> Dict[int, Tuple[int, int]]:
+    """Subtract the notifications matching the criteria; call right before deleting them"""
+    counts = count_notifications(*criteria)
+    adjust_counters({user_id: (-unread, -total) for user_id, (unread, total) in counts.items()})
+    return counts
+
+
+def get_counts(user_id: int) -> Tuple[int, int]:
+    """(unread, total) for the user; no counter row means no notifications"""
+    row = db.session.execute(
+        select(_counters.c.unread_count, _counters.c.total_count).where(_counters.c.user_id == user_id)
+    ).first()
+    if row is None:
+        return 0, 0
+    return row.unread_count, row.total_count
+
+
+def rebuild_counters(user_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute counter rows from notifications (all users when user_ids is None); commits"""
+    criteria = [] if user_ids is None else [Notification.user_id.in_(list(user_ids))]
+    counts = count_notifications(*criteria)
+    try:
+        stale = delete(_counters)
+        if user_ids is not None:
+            stale = stale.where(_counters.c.user_id.in_(list(user_ids)))
+        db.session.execute(stale)
+        if counts:
+            now = datetime.utcnow()
+            db.session.execute(insert(_counters), [
+                {'user_id': user_id, 'unread_count': unread, 'total_count': total, 'updated_at': now}
+                for user_id, (unread, total) in counts.items()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Rebuilt notification counters for {len(counts)} users")
+    return len(counts)
@@ -0,0 +1,248 @@
+"""
+Notification Outbox
+
+Socket delivery is decoupled from the transaction that creates a
+notification. Writers stage an outbox row in the same transaction as the
+`Notification` row (`stage_notification` / `stage_notifications`), so an
+emit exists if and only if the notification was committed. The relay
+claims committed rows in batches, hands them to the socket emit outbox and
+marks them DELIVERED once the emit has gone out.
+
+Delivery is at-least-once: a row claimed by a relay that dies before
+confirming is claimed again after OUTBOX_REDISPATCH_SECONDS. Every payload
+carries its `idempotency_key` so clients can drop repeats.
+"""
+
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+
+from app.database.database import db
+from app.models.notification_outbox import NotificationOutbox, OutboxStatus
+from app.socket import emit_notification, emit_outbox
+from app.utils.green import spawn_worker
+
+logger = logging.getLogger(__name__)
+
+
+def _outbox_row(user_id: int, payload: Dict) -> Dict:
+    key = uuid.uuid4().hex
+    return {
+        'idempotency_key': key,
+        'user_id': user_id,
+        'payload': json.dumps(dict(payload, idempotency_key=key), default=str),
+        'status': OutboxStatus.PENDING,
+        'attempts': 0,
+        'created_at': datetime.utcnow()
+    }
+
+
+def stage_notification(user_id: int, payload: Dict) -> str:
+    """Add an outbox row to the current transaction; returns its idempotency key"""
+    row = _outbox_row(user_id, payload)
+    db.session.add(NotificationOutbox(**row))
+    db.session.info['outbox_staged'] = True
+    return row['idempotency_key']
+
+
+def stage_notifications(entries: List[tuple]) -> int:
+    """Bulk variant of stage_notification for (user_id, payload) pairs"""
+    if not entries:
+        return 0
+    db.session.execute(insert(NotificationOutbox), [_outbox_row(user_id, payload) for user_id, payload in entries])
+    db.session.info['outbox_staged'] = True
+    return len(entries)
+
+
+class NotificationRelay:
+    """Moves committed outbox rows to the socket emit outbox"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 200
+        self.poll_seconds = 5.0
+        self.redispatch_after = timedelta(seconds=60)
+        self.max_attempts = 5
+        self.retention = timedelta(hours=24)
+        self._settled: List[tuple] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker_started = False
+        self._stopped = False
+        self.stats = {'dispatched': 0, 'delivered': 0, 'failed': 0, 'redispatched': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config['OUTBOX_BATCH_SIZE']
+        self.poll_seconds = app.config['OUTBOX_POLL_SECONDS']
+        self.redispatch_after = timedelta(seconds=app.config['OUTBOX_REDISPATCH_SECONDS'])
+        self.max_attempts = app.config['OUTBOX_MAX_ATTEMPTS']
+        self.retention = timedelta(hours=app.config['OUTBOX_RETENTION_HOURS'])
+        emit_outbox.add_listener(self._on_emit_settled)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def _after_commit(self, session):
+        if session.info.pop('outbox_staged', False):
+            self.wake()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop('outbox_staged', None)
+
+    def wake(self) -> None:
+        """Deliver newly committed rows without waiting for the next poll"""
+        if not self._worker_started and not self._stopped and self.app is not None:
+            self._worker_started = True
+            spawn_worker(self._run, 'notification-relay')
+        self._wakeup.set()
+
+    def _on_emit_settled(self, payloads: List[Dict], delivered: bool, error: Optional[str]):
+        keys = [payload['idempotency_key'] for payload in payloads if 'idempotency_key' in payload]
+        if keys:
+            with self._lock:
+                self._settled.extend((key, delivered, error) for key in keys)
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            dispatched = 0
+            try:
+                with self.app.app_context():
+                    dispatched = self.relay_once()
+            except Exception as e:
+                logger.error(f"Notification relay failed: {e}")
+            if dispatched < self.batch_size:
+                # Caught up; sleep until the next commit, settled emit or poll
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def relay_once(self) -> int:
+        """Record settled emits, then claim and dispatch one batch; returns rows dispatched"""
+        self._record_settled()
+
+        now = datetime.utcnow()
+        try:
+            claimable = or_(
+                NotificationOutbox.status == OutboxStatus.PENDING,
+                and_(NotificationOutbox.status == OutboxStatus.DISPATCHED,
+                     NotificationOutbox.dispatched_at < now - self.redispatch_after)
+            )
+            rows = db.session.execute(
+                select(NotificationOutbox.id, NotificationOutbox.user_id, NotificationOutbox.payload,
+                       NotificationOutbox.status)
+                .where(claimable)
+                .order_by(NotificationOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                db.session.commit()
+                return 0
+
+            db.session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_([row.id for row in rows]))
+                .values(status=OutboxStatus.DISPATCHED, dispatched_at=now,
+                        attempts=NotificationOutbox.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        rejected = []
+        for row in rows:
+            if row.status == OutboxStatus.DISPATCHED:
+                self.stats['redispatched'] += 1
+            if emit_notification(row.user_id, json.loads(row.payload)):
+                self.stats['dispatched'] += 1
+            else:
+                rejected.append(row.id)
+
+        if rejected:
+            # Emit outbox is full; hand the rows back for the next pass
+            db.session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(rejected))
+                .values(status=OutboxStatus.PENDING, last_error='emit outbox full')
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        return len(rows) - len(rejected)
+
+    def _record_settled(self):
+        with self._lock:
+            settled, self._settled = self._settled, []
+        if not settled:
+            return
+
+        now = datetime.utcnow()
+        delivered = [key for key, ok, _ in settled if ok]
+        failed = [(key, error) for key, ok, error in settled if not ok]
+        try:
+            if delivered:
+                db.session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.idempotency_key.in_(delivered))
+                    .values(status=OutboxStatus.DELIVERED, delivered_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+            for key, error in failed:
+                db.session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.idempotency_key == key)
+                    .values(
+                        status=db.case(
+                            (NotificationOutbox.attempts >= self.max_attempts, OutboxStatus.DEAD.name),
+                            else_=OutboxStatus.PENDING.name
+                        ),
+                        last_error=error
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.stats['delivered'] += len(delivered)
+        self.stats['failed'] += len(failed)
+
+    def cleanup(self) -> int:
+        """Delete delivered and dead rows older than OUTBOX_RETENTION_HOURS"""
+        cutoff = datetime.utcnow() - self.retention
+        try:
+            result = db.session.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status.in_([OutboxStatus.DELIVERED, OutboxStatus.DEAD]),
+                    NotificationOutbox.created_at < cutoff
+                ).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def get_stats(self) -> Dict:
+        """Relay counters plus row counts per status; requires an app context"""
+        counts = dict(db.session.query(NotificationOutbox.status, func.count(NotificationOutbox.id))
+                      .group_by(NotificationOutbox.status).all())
+        return dict(self.stats, rows={status.value.lower(): counts.get(status, 0) for status in OutboxStatus})
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+
+
+# Global relay instance
+notification_relay = NotificationRelay()
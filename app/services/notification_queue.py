@@ -0,0 +1,132 @@
+"""
+Debounced Notification Queue
+
+Write handlers record "cow X changed on day D" events instead of running
+the production and expiry checks inline. A background worker coalesces the
+events received during NOTIFICATION_DEBOUNCE_SECONDS and re-evaluates only
+the affected cows, so request latency no longer depends on herd size.
+
+Events live in process memory; anything pending at shutdown is picked up
+by the periodic scheduler scans.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+
+from app.services.notification import check_milk_expiry_and_notify, check_milk_production_and_notify
+from app.services.production_rules import get_production_rules
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """Coalesces cow change events and evaluates them in a background worker"""
+
+    def __init__(self, app=None, debounce_seconds: float = 5.0):
+        self.app = None
+        self.debounce_seconds = debounce_seconds
+        self._pending: Dict[int, Set[date]] = {}
+        self._flush_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+        self.stats = {'events': 0, 'flushes': 0, 'cows_evaluated': 0, 'notifications': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.debounce_seconds = app.config['NOTIFICATION_DEBOUNCE_SECONDS']
+        atexit.register(self.shutdown)
+
+    def enqueue(self, cow_id: int, day: date) -> None:
+        """Record that a cow's production for `day` changed"""
+        with self._lock:
+            self._pending.setdefault(int(cow_id), set()).add(day)
+            self.stats['events'] += 1
+            if self._flush_at is None:
+                # Fixed window from the first event, so a steady stream still flushes
+                self._flush_at = time.monotonic() + self.debounce_seconds
+            self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self):
+        if self._stopped:
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='notification-queue', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while not self._stopped:
+            with self._lock:
+                flush_at = self._flush_at
+            if flush_at is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = flush_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error evaluating queued notification events: {e}")
+
+    def flush(self) -> int:
+        """Evaluate all pending events now; returns the number of notifications sent"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_at = None
+
+        if not pending:
+            return 0
+
+        with self.app.app_context():
+            count = self._evaluate(pending)
+
+        self.stats['flushes'] += 1
+        self.stats['cows_evaluated'] += len(pending)
+        self.stats['notifications'] += count
+        return count
+
+    def _evaluate(self, pending: Dict[int, Set[date]]) -> int:
+        # Production rules read today and up to history_days before it; older
+        # changes cannot alter today's alerts
+        today = date.today()
+        oldest = today - timedelta(days=get_production_rules().history_days)
+        production_cows = sorted(cow_id for cow_id, days in pending.items()
+                                 if any(oldest <= day <= today for day in days))
+
+        count = 0
+        if production_cows:
+            count += check_milk_production_and_notify(production_cows)
+        count += check_milk_expiry_and_notify(sorted(pending))
+
+        logger.info(f"Evaluated notifications for {len(pending)} changed cows - {count} notifications sent")
+        return count
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+
+
+# Global queue instance
+notification_queue = NotificationQueue()
+
+
+def enqueue_cow_change(cow_id: int, day: date) -> None:
+    """Schedule notification re-evaluation for a cow whose production on `day` changed"""
+    notification_queue.enqueue(cow_id, day)
@@ -0,0 +1,120 @@
+"""
+Notification Retention
+
+Deletes notifications older than NOTIFICATION_RETENTION_DAYS in bounded
+chunks. Each chunk is a primary key range of NOTIFICATION_RETENTION_CHUNK_SIZE
+ids, deleted and committed on its own, with a pause between chunks so the
+job never holds long locks or floods replication. A run stops after
+NOTIFICATION_RETENTION_MAX_CHUNKS chunks; the next run carries on.
+
+Ids grow with insertion time and `created_at` never moves backwards, so the
+walk starts at the lowest id and stops at the first range without expired
+rows.
+
+With NOTIFICATION_ARCHIVE_DIR set, every deleted row is first appended to a
+gzip-compressed JSON Lines file in that directory (one file per run).
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from app.database.database import db
+from app.models.notification import Notification
+from app.services.notification_counters import deduct_notifications
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRetention:
+    """Chunked deletion (and optional archiving) of old notifications"""
+
+    def __init__(self):
+        self.last_run: Optional[Dict] = None
+        self.totals = {'runs': 0, 'deleted': 0, 'archived': 0}
+
+    def run(self, now: Optional[datetime] = None) -> Dict:
+        """Delete expired notifications; returns the run's metrics"""
+        config = current_app.config
+        chunk_size = config['NOTIFICATION_RETENTION_CHUNK_SIZE']
+        pause = config['NOTIFICATION_RETENTION_PAUSE_SECONDS']
+        max_chunks = config['NOTIFICATION_RETENTION_MAX_CHUNKS']
+        archive_dir = config.get('NOTIFICATION_ARCHIVE_DIR')
+
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=config['NOTIFICATION_RETENTION_DAYS'])
+        started = time.monotonic()
+        metrics = {
+            'cutoff': cutoff.isoformat(), 'deleted': 0, 'archived': 0,
+            'chunks': 0, 'complete': True, 'archive_file': None
+        }
+
+        archive = None
+        archive_path = os.path.join(archive_dir, f"notifications-{now:%Y%m%dT%H%M%S}.jsonl.gz") if archive_dir else None
+
+        try:
+            lower = db.session.scalar(select(func.min(Notification.id)))
+            while lower is not None:
+                if metrics['chunks'] >= max_chunks:
+                    metrics['complete'] = False
+                    break
+
+                upper = lower + chunk_size
+                criteria = [Notification.id >= lower, Notification.id < upper, Notification.created_at < cutoff]
+
+                if archive_dir:
+                    rows = db.session.execute(select(Notification.__table__).where(*criteria)).mappings().all()
+                    if rows:
+                        if archive is None:
+                            os.makedirs(archive_dir, exist_ok=True)
+                            archive = gzip.open(archive_path, 'at', encoding='utf-8')
+                            metrics['archive_file'] = archive_path
+                        for row in rows:
+                            archive.write(json.dumps(dict(row), default=str) + '\n')
+                        # Rows must be on disk before they are deleted
+                        archive.flush()
+                        metrics['archived'] += len(rows)
+
+                counts = deduct_notifications(*criteria)
+                if not counts:
+                    # `lower` is an existing id, so this range holds only newer rows
+                    db.session.rollback()
+                    break
+                db.session.execute(delete(Notification).where(*criteria)
+                                   .execution_options(synchronize_session=False))
+                db.session.commit()
+                metrics['chunks'] += 1
+                metrics['deleted'] += sum(total for _, total in counts.values())
+
+                lower = db.session.scalar(select(func.min(Notification.id)).where(Notification.id >= upper))
+                if lower is not None and pause:
+                    time.sleep(pause)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if archive is not None:
+                archive.close()
+
+        metrics['duration_ms'] = int((time.monotonic() - started) * 1000)
+        self.last_run = metrics
+        self.totals['runs'] += 1
+        self.totals['deleted'] += metrics['deleted']
+        self.totals['archived'] += metrics['archived']
+        logger.info(f"Notification retention removed {metrics['deleted']} notifications "
+                    f"older than {cutoff} in {metrics['chunks']} chunks")
+        return metrics
+
+    def get_stats(self) -> Dict:
+        return dict(self.totals, last_run=self.last_run)
+
+
+# Global retention instance
+notification_retention = NotificationRetention()
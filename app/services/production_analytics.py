@@ -0,0 +1,201 @@
+"""
+Production Analytics
+
+Loads a date window of `daily_milk_summary` with one query into a dense
+cow x day volume matrix and derives every metric with vectorized
+NumPy/pandas operations:
+
+- trailing ROLLING_WINDOW_DAYS mean
+- day-over-day change, and change against the previous ROLLING_WINDOW_DAYS mean
+- z-score against the cow's own previous ZSCORE_WINDOW_DAYS (anomaly when
+  |z| >= ANOMALY_ZSCORE)
+- lactation-adjusted baseline: the median trailing mean of the cows in the
+  same lactation phase that day, and the cow's deviation from it
+
+Days without a summary are NaN and are skipped by the rolling statistics.
+Lactation phases are the cows' current ones.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.database.database import db
+from app.models.cows import Cow
+from app.models.daily_milk_summary import DailyMilkSummary
+
+logger = logging.getLogger(__name__)
+
+ROLLING_WINDOW_DAYS = 7
+ZSCORE_WINDOW_DAYS = 30
+# Fewer previous days than this give no z-score
+MIN_ZSCORE_SAMPLES = 7
+ANOMALY_ZSCORE = 3.0
+
+
+def _pct_change(current: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(reference > 0, (current - reference) / reference * 100, np.nan)
+
+
+@dataclass
+class ProductionAnalytics:
+    """Cow x day metric matrices for the days start_date..end_date"""
+    start_date: date
+    cows: pd.DataFrame  # indexed by cow_id, in matrix row order
+    metrics: Dict[str, np.ndarray]
+
+    @property
+    def days(self) -> int:
+        return self.metrics['total_volume'].shape[1]
+
+    @property
+    def end_date(self) -> date:
+        return self.start_date + timedelta(days=self.days - 1)
+
+    def _column(self, day: date) -> int:
+        offset = (day - self.start_date).days
+        if not 0 <= offset < self.days:
+            raise ValueError(f"{day} is outside the analysed window")
+        return offset
+
+    def snapshot(self, day: date) -> pd.DataFrame:
+        """One row per cow with a summary on `day`"""
+        column = self._column(day)
+        frame = self.cows.copy()
+        for name, matrix in self.metrics.items():
+            frame[name] = matrix[:, column]
+        return frame[frame['total_volume'].notna()].reset_index()
+
+    def cow_series(self, cow_id: int) -> pd.DataFrame:
+        """Every day of the window for one cow"""
+        row = self.cows.index.get_loc(cow_id)
+        frame = pd.DataFrame({name: matrix[row] for name, matrix in self.metrics.items()})
+        frame.insert(0, 'date', pd.date_range(self.start_date, periods=self.days).date)
+        return frame
+
+
+def _shift(values: np.ndarray) -> np.ndarray:
+    """Each day's previous day"""
+    shifted = np.full_like(values, np.nan)
+    shifted[:, 1:] = values[:, :-1]
+    return shifted
+
+
+def _rolling(values: np.ndarray, window: int, min_periods: int):
+    """
+    Trailing mean and sample standard deviation over `window` days, skipping
+    NaN, from cumulative sums over the whole matrix at once. Windows with
+    fewer than min_periods values are NaN.
+    """
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    days = values.shape[1]
+    ends = np.arange(1, days + 1)
+    starts = np.maximum(ends - window, 0)
+
+    def window_sums(matrix):
+        totals = np.zeros((matrix.shape[0], days + 1))
+        np.cumsum(matrix, axis=1, out=totals[:, 1:])
+        return totals[:, ends] - totals[:, starts]
+
+    count = window_sums(present.astype(float))
+    total = window_sums(filled)
+    squares = window_sums(filled * filled)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count >= min_periods, total / count, np.nan)
+        variance = np.where(count >= max(min_periods, 2), (squares - total * mean) / (count - 1), np.nan)
+    # Cancellation leaves tiny non-zero variances on constant series
+    variance[variance < 1e-9] = 0.0
+    return mean, np.sqrt(variance)
+
+
+def _compute_metrics(volume: np.ndarray, phases: np.ndarray, history: int) -> Dict[str, np.ndarray]:
+    previous_volume = _shift(volume)
+    rolling_mean, _ = _rolling(volume, ROLLING_WINDOW_DAYS, 1)
+    previous_mean, _ = _rolling(previous_volume, ROLLING_WINDOW_DAYS, 1)
+
+    history_mean, history_std = _rolling(previous_volume, ZSCORE_WINDOW_DAYS, MIN_ZSCORE_SAMPLES)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = np.where(history_std > 0, (volume - history_mean) / history_std, np.nan)
+
+    # Median trailing mean of the cow's lactation phase, per day
+    phase_baseline = pd.DataFrame(rolling_mean).groupby(phases).transform('median').to_numpy()
+
+    metrics = {
+        'total_volume': volume,
+        'previous_volume': previous_volume,
+        'rolling_mean': rolling_mean,
+        'change_1d_pct': _pct_change(volume, previous_volume),
+        'change_7d_pct': _pct_change(volume, previous_mean),
+        'zscore': zscore,
+        'anomaly': np.abs(np.nan_to_num(zscore)) >= ANOMALY_ZSCORE,
+        'phase_baseline': phase_baseline,
+        'vs_phase_baseline_pct': _pct_change(volume, phase_baseline),
+    }
+    # Drop the leading history days that only fed the rolling statistics
+    return {name: matrix[:, history:] for name, matrix in metrics.items()}
+
+
+def load_production_analytics(end_date: date, days: int = 1, cow_ids: Optional[Iterable[int]] = None,
+                              history_days: int = ZSCORE_WINDOW_DAYS) -> ProductionAnalytics:
+    """
+    Analytics for the `days` days ending at end_date. `history_days` earlier
+    days are loaded as well so the first day has full rolling statistics.
+    """
+    started = time.perf_counter()
+    start_date = end_date - timedelta(days=days - 1)
+    load_from = start_date - timedelta(days=history_days)
+
+    query = select(DailyMilkSummary.cow_id, DailyMilkSummary.date, DailyMilkSummary.total_volume).where(
+        DailyMilkSummary.date >= load_from, DailyMilkSummary.date <= end_date
+    )
+    if cow_ids is not None:
+        query = query.where(DailyMilkSummary.cow_id.in_(set(cow_ids)))
+    # Core rows (no ORM loading) split into columns
+    rows = db.session.connection().execute(query).all()
+    summary_cow_ids, summary_dates, volumes = list(zip(*rows)) or ((), (), ())
+
+    codes, row_cow_ids = pd.factorize(np.fromiter(summary_cow_ids, np.int64, len(rows)), sort=True)
+    offsets = np.fromiter(map(date.toordinal, summary_dates), np.int64, len(rows)) - load_from.toordinal()
+    volume = np.full((len(row_cow_ids), days + history_days), np.nan)
+    volume[codes, offsets] = np.fromiter(volumes, float, len(rows))
+
+    cows = pd.DataFrame(
+        db.session.execute(
+            select(Cow.id, Cow.name, Cow.breed, Cow.lactation_phase).where(Cow.id.in_(row_cow_ids.tolist()))
+        ).all(),
+        columns=['cow_id', 'cow_name', 'breed', 'lactation_phase']
+    ).set_index('cow_id').reindex(row_cow_ids)
+    cows.index.name = 'cow_id'
+    phases = cows['lactation_phase'].fillna('unknown').str.strip().str.lower().to_numpy()
+
+    analytics = ProductionAnalytics(start_date, cows, _compute_metrics(volume, phases, history_days))
+    logger.debug(f"Production analytics for {len(row_cow_ids)} cows x {days} days "
+                 f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return analytics
+
+
+def load_cow_analytics(cow_id: int, end_date: date, days: int) -> Optional[ProductionAnalytics]:
+    """
+    Analytics for one cow, loaded together with the cows of its lactation
+    phase so its baseline is a herd one. None if the cow does not exist.
+    """
+    cow = db.session.get(Cow, cow_id)
+    if cow is None:
+        return None
+    phase = func.lower(func.trim(func.coalesce(Cow.lactation_phase, '')))
+    peers = select(Cow.id).where(phase == (cow.lactation_phase or '').strip().lower())
+    return load_production_analytics(end_date, days, cow_ids=db.session.execute(peers).scalars().all() + [cow_id])
+
+
+def to_records(frame: pd.DataFrame, decimals: int = 2) -> List[Dict]:
+    """JSON-ready rows: floats rounded, NaN as None"""
+    frame = frame.round(decimals).astype(object)
+    return frame.where(frame.notna(), None).to_dict('records')
@@ -0,0 +1,286 @@
+"""
+Production Rule Engine
+
+Production notifications are driven by the `production_rules` table instead
+of fixed thresholds. Each rule compares one metric of the daily production
+analytics (`app.services.production_analytics`) against a threshold and can
+be scoped to a breed and/or lactation phase; a rule with neither applies to
+the whole farm.
+
+The active rules are compiled once into a `CompiledRules`: operators become
+NumPy ufuncs, and evaluating every rule over the whole herd's snapshot is a
+handful of array operations with no per-cow Python work. Per cow and
+notification type only the most specific matching rule applies, so a breed
+or phase rule overrides the farm-wide rule of the same type.
+
+The compiled set is cached per process. The /notification/production-rules
+handlers drop it on every change; the PRODUCTION_RULES_RELOAD_SECONDS TTL
+picks up changes made by other worker processes.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from app.database.database import db
+from app.models.production_rule import ProductionRule
+from app.services.production_analytics import ROLLING_WINDOW_DAYS, ZSCORE_WINDOW_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Metric -> days of history it needs before the evaluated day
+METRIC_HISTORY_DAYS = {
+    'total_volume': 1,
+    'previous_volume': 1,
+    'change_1d_pct': 1,
+    'rolling_mean': ROLLING_WINDOW_DAYS - 1,
+    'change_7d_pct': ROLLING_WINDOW_DAYS,
+    'phase_baseline': ROLLING_WINDOW_DAYS - 1,
+    'vs_phase_baseline_pct': ROLLING_WINDOW_DAYS - 1,
+    'zscore': ZSCORE_WINDOW_DAYS,
+    'abs_zscore': ZSCORE_WINDOW_DAYS,
+}
+
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+AUDIENCES = ('managers', 'supervisors')
+
+
+def _normalize_scope(value: Optional[str]) -> Optional[str]:
+    value = (value or '').strip().casefold()
+    return value or None
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """A validated production rule, detached from the session"""
+    id: Optional[int]
+    name: str
+    notification_type: str
+    metric: str
+    operator: str
+    threshold: float
+    min_volume: Optional[float] = None
+    breed: Optional[str] = None
+    lactation_phase: Optional[str] = None
+    audience: str = 'managers'
+
+    @property
+    def specificity(self) -> int:
+        return (self.breed is not None) + (self.lactation_phase is not None)
+
+    @classmethod
+    def from_model(cls, rule: ProductionRule) -> 'RuleSpec':
+        return cls(
+            id=rule.id, name=rule.name, notification_type=rule.notification_type,
+            metric=rule.metric, operator=rule.operator, threshold=rule.threshold,
+            min_volume=rule.min_volume, breed=_normalize_scope(rule.breed),
+            lactation_phase=_normalize_scope(rule.lactation_phase), audience=rule.audience
+        )
+
+
+def validate_rule(data: Dict) -> Dict:
+    """
+    Checked and normalised ProductionRule column values from a request body.
+    Raises ValueError describing the first invalid field.
+    """
+    values = {}
+    for field in ('name', 'notification_type'):
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} is required")
+        values[field] = value.strip()
+    if len(values['name']) > 100:
+        raise ValueError("name must be at most 100 characters")
+    if len(values['notification_type']) > 20:
+        raise ValueError("notification_type must be at most 20 characters")
+
+    if data.get('metric') not in METRIC_HISTORY_DAYS:
+        raise ValueError(f"metric must be one of: {', '.join(METRIC_HISTORY_DAYS)}")
+    if data.get('operator') not in OPERATORS:
+        raise ValueError(f"operator must be one of: {', '.join(OPERATORS)}")
+    values['metric'] = data['metric']
+    values['operator'] = data['operator']
+
+    for field, required in (('threshold', True), ('min_volume', False)):
+        value = data.get(field)
+        if value is None and not required:
+            values[field] = None
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            raise ValueError(f"{field} must be a number")
+        values[field] = float(value)
+
+    for field in ('breed', 'lactation_phase'):
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        values[field] = value.strip() if value and value.strip() else None
+        if values[field] and len(values[field]) > 50:
+            raise ValueError(f"{field} must be at most 50 characters")
+
+    values['audience'] = data.get('audience', 'managers')
+    if values['audience'] not in AUDIENCES:
+        raise ValueError(f"audience must be one of: {', '.join(AUDIENCES)}")
+    values['is_active'] = bool(data.get('is_active', True))
+    return values
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    """One cow matched by one rule"""
+    rule: RuleSpec
+    cow_id: int
+    cow_name: Optional[str]
+    value: float
+    total_volume: float
+    previous_volume: float
+
+
+class CompiledRules:
+    """The active rules, grouped by notification type in specificity order"""
+
+    def __init__(self, rules: List[RuleSpec]):
+        self.rules = tuple(rules)
+        self._by_type: Dict[str, List[RuleSpec]] = {}
+        for rule in sorted(self.rules, key=lambda rule: (rule.specificity, rule.id or 0)):
+            self._by_type.setdefault(rule.notification_type, []).append(rule)
+        # Every rule can guard on yesterday's volume, so at least one day back
+        self.history_days = max((METRIC_HISTORY_DAYS[rule.metric] for rule in self.rules), default=1)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @staticmethod
+    def _columns(frame) -> Dict[str, np.ndarray]:
+        columns = {name: frame[name].to_numpy(dtype=float)
+                   for name in METRIC_HISTORY_DAYS if name in frame}
+        columns['abs_zscore'] = np.abs(columns['zscore'])
+        return columns
+
+    def evaluate(self, frame) -> List[RuleMatch]:
+        """
+        Rules matching the cows of a `ProductionAnalytics.snapshot` frame.
+
+        A rule's min_volume skips cows whose volume today and yesterday are
+        both below it, as do cows without a summary yesterday. For
+        change_1d_pct, production starting from zero counts as a 100%
+        increase once it exceeds min_volume.
+        """
+        if frame.empty or not self.rules:
+            return []
+
+        columns = self._columns(frame)
+        current = columns['total_volume']
+        previous = columns['previous_volume']
+        breeds = frame['breed'].fillna('').str.strip().str.casefold().to_numpy()
+        phases = frame['lactation_phase'].fillna('').str.strip().str.casefold().to_numpy()
+
+        matched: List[Tuple[RuleSpec, np.ndarray, np.ndarray]] = []
+        for rules in self._by_type.values():
+            # Index of the most specific rule in scope for each cow, -1 for none
+            owner = np.full(len(frame), -1)
+            for index, rule in enumerate(rules):
+                scope = np.ones(len(frame), dtype=bool)
+                if rule.breed is not None:
+                    scope &= breeds == rule.breed
+                if rule.lactation_phase is not None:
+                    scope &= phases == rule.lactation_phase
+                owner[scope] = index
+
+            for index, rule in enumerate(rules):
+                values = columns[rule.metric]
+                hits = owner == index
+                if rule.min_volume is not None:
+                    hits &= ~np.isnan(previous) & (np.fmax(current, previous) >= rule.min_volume)
+                    if rule.metric == 'change_1d_pct':
+                        started = (previous == 0) & (current > rule.min_volume)
+                        values = np.where(started, 100.0, values)
+                with np.errstate(invalid='ignore'):
+                    hits &= OPERATORS[rule.operator](values, rule.threshold)
+                positions = np.flatnonzero(hits)
+                if len(positions):
+                    matched.append((rule, positions, values))
+
+        cow_ids = frame['cow_id'].to_numpy()
+        cow_names = frame['cow_name'].to_numpy()
+        return [
+            RuleMatch(rule, int(cow_ids[i]), cow_names[i], float(values[i]),
+                      float(current[i]), float(previous[i]))
+            for rule, positions, values in matched for i in positions
+        ]
+
+
+class ProductionRuleEngine:
+    """Caches the compiled active production rules"""
+
+    def __init__(self):
+        self._compiled: Optional[CompiledRules] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a compile only stores its result if
+        # no invalidation ran while it was loading the rules
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _ttl(self) -> float:
+        return current_app.config.get('PRODUCTION_RULES_RELOAD_SECONDS', 60)
+
+    def rules(self) -> CompiledRules:
+        now = time.monotonic()
+        with self._lock:
+            if self._compiled is not None and self._expires_at > now:
+                self.stats['hits'] += 1
+                return self._compiled
+            self.stats['misses'] += 1
+            generation = self._generation
+
+        specs = []
+        for rule in db.session.execute(
+            select(ProductionRule).where(ProductionRule.is_active == True)  # noqa: E712
+        ).scalars():
+            if rule.metric not in METRIC_HISTORY_DAYS or rule.operator not in OPERATORS:
+                logger.warning(f"Skipping invalid production rule {rule.id} ({rule.metric} {rule.operator})")
+                continue
+            specs.append(RuleSpec.from_model(rule))
+        compiled = CompiledRules(specs)
+        logger.debug(f"Compiled {len(compiled)} production rules")
+
+        with self._lock:
+            if self._generation == generation:
+                self._compiled = compiled
+                self._expires_at = now + self._ttl()
+        return compiled
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._compiled = None
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+
+# Global engine instance
+production_rule_engine = ProductionRuleEngine()
+
+
+def get_production_rules() -> CompiledRules:
+    """The compiled active production rules"""
+    return production_rule_engine.rules()
+
+
+def invalidate_production_rules() -> None:
+    """Recompile the production rules on next use"""
+    production_rule_engine.invalidate()
@@ -0,0 +1,217 @@
+"""
+Notification Rate Limiting
+
+Token bucket per user: a bucket holds up to `limit` tokens and refills
+continuously at `limit` per window, so a user receives at most `limit`
+notifications in a burst and `limit` per window on average.
+
+Backends (NOTIFICATION_RATE_LIMIT_BACKEND):
+    memory  - buckets in this process (default; not shared across workers)
+    redis   - buckets in Redis (REDIS_URL), updated by Lua scripts so a
+              check-and-consume is atomic across workers
+
+Both take a whole recipient list per call (`consume_many`), which the
+batched fan-out paths use to rate-limit every recipient in one round-trip,
+and `refund` tokens for notifications that were not written after all.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryTokenBucket:
+    """Process-local token buckets"""
+
+    backend = 'memory'
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.rate = limit / window_seconds
+        self.window_seconds = window_seconds
+        self._buckets: Dict[int, Tuple[float, float]] = {}  # user_id -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def _refill(self, user_id: int, now: float) -> float:
+        tokens, updated_at = self._buckets.get(user_id, (self.limit, now))
+        return min(self.limit, tokens + (now - updated_at) * self.rate)
+
+    def consume_many(self, user_ids: Iterable[int]) -> List[bool]:
+        now = time.monotonic()
+        allowed = []
+        with self._lock:
+            for user_id in user_ids:
+                tokens = self._refill(user_id, now)
+                if tokens >= 1:
+                    tokens -= 1
+                    allowed.append(True)
+                else:
+                    allowed.append(False)
+                self._buckets[user_id] = (tokens, now)
+            if now - self._pruned_at > self.window_seconds:
+                # Buckets idle for a window are full again; keeps the dict bounded by active users
+                self._prune(now)
+        return allowed
+
+    def refund(self, user_ids: Iterable[int]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                self._buckets[user_id] = (min(self.limit, self._refill(user_id, now) + 1), now)
+
+    def _prune(self, now: float) -> int:
+        full = [user_id for user_id in self._buckets if self._refill(user_id, now) >= self.limit]
+        for user_id in full:
+            del self._buckets[user_id]
+        self._pruned_at = now
+        return len(full)
+
+    def cleanup(self) -> int:
+        """Forget buckets that have refilled completely; they are equivalent to new ones"""
+        with self._lock:
+            return self._prune(time.monotonic())
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class RedisTokenBucket:
+    """Token buckets stored as Redis hashes that expire once refilled"""
+
+    backend = 'redis'
+
+    # KEYS: one bucket per recipient (repeats consume repeatedly)
+    # ARGV: limit, refill rate per ms, ttl ms
+    CONSUME_SCRIPT = """
+    local limit = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+    local result = {}
+    for i, key in ipairs(KEYS) do
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or limit
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(limit, tokens + (now - ts) * rate)
+        if tokens >= 1 then
+            tokens = tokens - 1
+            result[i] = 1
+        else
+            result[i] = 0
+        end
+        redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+        redis.call('PEXPIRE', key, ttl)
+    end
+    return result
+    """
+    REFUND_SCRIPT = """
+    local limit = tonumber(ARGV[1])
+    for _, key in ipairs(KEYS) do
+        local tokens = tonumber(redis.call('HGET', key, 'tokens'))
+        if tokens then
+            redis.call('HSET', key, 'tokens', tostring(math.min(limit, tokens + 1)))
+        end
+    end
+    return #KEYS
+    """
+
+    def __init__(self, redis_url: str, limit: int, window_seconds: float,
+                 prefix: str = 'dairy_track:ratelimit:notification'):
+        import redis
+
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.limit = limit
+        self.rate_per_ms = limit / (window_seconds * 1000)
+        self.ttl_ms = int(window_seconds * 1000)
+        self.prefix = prefix
+        self._consume = self.client.register_script(self.CONSUME_SCRIPT)
+        self._refund = self.client.register_script(self.REFUND_SCRIPT)
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def consume_many(self, user_ids: Iterable[int]) -> List[bool]:
+        keys = [self._key(user_id) for user_id in user_ids]
+        if not keys:
+            return []
+        return [bool(flag) for flag in self._consume(keys=keys, args=[self.limit, self.rate_per_ms, self.ttl_ms])]
+
+    def refund(self, user_ids: Iterable[int]) -> None:
+        keys = [self._key(user_id) for user_id in user_ids]
+        if keys:
+            self._refund(keys=keys, args=[self.limit])
+
+    def cleanup(self) -> int:
+        # Buckets expire in Redis on their own
+        return 0
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}:*", count=500))
+
+
+class RateLimiter:
+    """Notification rate limiter; the backend is built from the app config on first use"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'limited': 0, 'refunded': 0}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_rate_limiter(current_app)
+        return self._backend
+
+    def is_rate_limited(self, user_id: int) -> bool:
+        """Consume one token for the user; True if none was available"""
+        return not self.consume_many([user_id])[0]
+
+    def consume_many(self, user_ids: List[int]) -> List[bool]:
+        """Check and consume one token per entry, in order; True where allowed"""
+        allowed = self.backend.consume_many(user_ids)
+        limited = len(allowed) - sum(allowed)
+        self.stats['allowed'] += len(allowed) - limited
+        self.stats['limited'] += limited
+        if limited:
+            logger.warning(f"Rate limit exceeded for {limited} of {len(allowed)} notifications")
+        return allowed
+
+    def refund(self, user_ids: List[int]) -> None:
+        """Give back tokens for notifications that were not delivered"""
+        try:
+            self.backend.refund(user_ids)
+            self.stats['refunded'] += len(user_ids)
+        except Exception as e:
+            logger.error(f"Failed to refund rate limit tokens: {e}")
+
+    def cleanup_expired_limits(self) -> int:
+        """Drop state that no longer limits anyone and return count"""
+        return self.backend.cleanup()
+
+    def get_stats(self) -> Dict:
+        backend = self.backend
+        return dict(self.stats, backend=backend.backend, limit=backend.limit, buckets=backend.size())
+
+
+def create_rate_limiter(app):
+    """Build the configured limiter backend"""
+    backend = app.config['NOTIFICATION_RATE_LIMIT_BACKEND']
+    limit = app.config['NOTIFICATION_RATE_LIMIT']
+    window_seconds = app.config['NOTIFICATION_RATE_LIMIT_WINDOW_MINUTES'] * 60
+    if backend == 'redis':
+        if not app.config.get('REDIS_URL'):
+            raise ValueError("NOTIFICATION_RATE_LIMIT_BACKEND=redis requires REDIS_URL")
+        return RedisTokenBucket(app.config['REDIS_URL'], limit, window_seconds)
+    if backend == 'memory':
+        return MemoryTokenBucket(limit, window_seconds)
+    raise ValueError(f"Invalid NOTIFICATION_RATE_LIMIT_BACKEND: {backend}. Valid backends are: memory, redis")
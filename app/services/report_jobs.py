@@ -0,0 +1,369 @@
+"""
+Report Job Service
+
+Runs report generation outside the request cycle. A submitted job is stored
+in `report_jobs` and executed by Celery when CELERY_BROKER_URL is configured,
+or in a local worker process otherwise (see LocalReportExecutor). Identical submissions (same report type
+and normalised parameters) are deduplicated while a job is in flight, and
+finished artifacts are reused for REPORT_CACHE_TTL_MINUTES. The in-flight
+job holds a unique `active_hash` slot, so concurrent submissions cannot both
+queue a job.
+
+Celery workers are started with:
+
+    celery -A app.services.report_jobs:celery worker
+
+The synchronous /export endpoints still render inside the request. Under
+eventlet that blocks the hub for the duration of the render, so large
+reports should be requested through /reports/jobs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from app.database.database import db
+from app.models.report_job import ReportJob, ReportJobStatus
+from app.services.reports import REPORT_DEFINITIONS
+from app.utils.green import eventlet_patched
+
+logger = logging.getLogger(__name__)
+
+REPORT_TASK_NAME = 'reports.generate'
+ACTIVE_STATUSES = (ReportJobStatus.PENDING, ReportJobStatus.RUNNING)
+
+
+class LocalReportExecutor:
+    """
+    Fallback when Celery is not configured. Each job runs in its own Python
+    process (app.services.report_worker), so the pure-Python PDF/Excel
+    rendering never runs in the web process, where under eventlet (see
+    run.py) it would block the hub and every request and socket with it.
+    The web process only waits for the child, in a green thread under
+    eventlet or a pool thread otherwise; at most max_workers jobs run at once.
+    """
+
+    def __init__(self, max_workers: int, timeout_seconds: float, on_failure):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        # Called with (job_id, error) when a worker process does not finish cleanly
+        self.on_failure = on_failure
+        self._pool = None
+
+    def submit(self, job_id: str):
+        if eventlet_patched():
+            from eventlet import GreenPool
+            if self._pool is None:
+                self._pool = GreenPool(self.max_workers)
+            self._pool.spawn_n(self._run, job_id)
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-job')
+            self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        if eventlet_patched():
+            from eventlet.green import subprocess
+        else:
+            import subprocess
+
+        try:
+            result = subprocess.run(
+                [sys.executable, '-m', 'app.services.report_worker', job_id],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=self.timeout_seconds
+            )
+        except subprocess.TimeoutExpired:
+            self.on_failure(job_id, "Report generation timed out")
+            return
+        except Exception as e:
+            logger.error(f"Failed to start worker process for report job {job_id}: {str(e)}")
+            self.on_failure(job_id, f"Report worker failed to start: {str(e)}")
+            return
+
+        if result.returncode != 0:
+            stderr = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+            logger.error(f"Worker process for report job {job_id} exited with {result.returncode}: "
+                         f"{stderr[-1] if stderr else 'no output'}")
+            self.on_failure(job_id, "Report worker process failed")
+
+
+class ReportJobService:
+    """Submission, execution and housekeeping of report jobs"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.celery = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, celery_app=None):
+        self.app = app
+        self.celery = celery_app
+        self.storage_dir = app.config['REPORT_STORAGE_DIR']
+        self.cache_ttl = timedelta(minutes=app.config['REPORT_CACHE_TTL_MINUTES'])
+        self.job_timeout = timedelta(minutes=app.config['REPORT_JOB_TIMEOUT_MINUTES'])
+        self.retention = timedelta(hours=app.config['REPORT_RETENTION_HOURS'])
+        self.executor = LocalReportExecutor(app.config['REPORT_WORKERS'], self.job_timeout.total_seconds(),
+                                            self._fail_unfinished)
+        os.makedirs(self.storage_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalize_params(report_type: str, raw_params: Optional[Dict]) -> Dict[str, str]:
+        """Keep the parameters the report understands, as non-empty strings"""
+        definition = REPORT_DEFINITIONS.get(report_type)
+        if definition is None:
+            raise ValueError(f"Unknown report type: {report_type}. "
+                             f"Valid types are: {', '.join(sorted(REPORT_DEFINITIONS))}")
+        raw_params = raw_params or {}
+        if not isinstance(raw_params, dict):
+            raise ValueError("params must be an object")
+
+        params = {}
+        for key in definition.params:
+            value = raw_params.get(key)
+            if value is not None and str(value).strip() != '':
+                params[key] = str(value).strip()
+        if 'format' in params:
+            params['format'] = params['format'].lower()
+
+        if definition.validate:
+            definition.validate(params)
+        return params
+
+    @staticmethod
+    def params_hash(report_type: str, params: Dict[str, str]) -> str:
+        payload = json.dumps({'type': report_type, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def submit(self, report_type: str, raw_params: Optional[Dict] = None) -> Tuple[ReportJob, bool]:
+        """
+        Queue a report, or return an equivalent in-flight or cached job.
+        Returns (job, reused). Raises ValueError for invalid input.
+        """
+        params = self.normalize_params(report_type, raw_params)
+        params_hash = self.params_hash(report_type, params)
+
+        existing = self._find_reusable(params_hash)
+        if existing:
+            return existing, True
+
+        job = ReportJob(report_type=report_type, params=json.dumps(params, sort_keys=True),
+                        params_hash=params_hash, active_hash=params_hash, status=ReportJobStatus.PENDING)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # An identical submission took the in-flight slot first
+            db.session.rollback()
+            existing = ReportJob.query.filter_by(active_hash=params_hash).first()
+            if existing is None:
+                raise
+            return existing, True
+
+        self._dispatch(job.id)
+        return job, False
+
+    def _find_reusable(self, params_hash: str) -> Optional[ReportJob]:
+        now = datetime.utcnow()
+
+        active = ReportJob.query.filter_by(active_hash=params_hash).first()
+        if active:
+            if active.created_at >= now - self.job_timeout:
+                return active
+            # Free the slot of a job stuck past the timeout
+            self._time_out(active, now)
+            db.session.commit()
+
+        cached = ReportJob.query.filter(
+            ReportJob.params_hash == params_hash,
+            ReportJob.status == ReportJobStatus.DONE,
+            ReportJob.finished_at >= now - self.cache_ttl
+        ).order_by(ReportJob.finished_at.desc()).first()
+        if cached and self.artifact_path(cached):
+            return cached
+        return None
+
+    @staticmethod
+    def _time_out(job: ReportJob, now: datetime) -> None:
+        job.status = ReportJobStatus.FAILED
+        job.error = "Report generation timed out"
+        job.finished_at = now
+        job.active_hash = None
+
+    def _dispatch(self, job_id: str):
+        if self.celery is not None:
+            try:
+                self.celery.send_task(REPORT_TASK_NAME, args=[job_id])
+                return
+            except Exception as e:
+                logger.error(f"Failed to queue report job {job_id} on Celery, running locally: {str(e)}")
+        self.executor.submit(job_id)
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def _fail_unfinished(self, job_id: str, error: str):
+        """Fail a job its worker left PENDING or RUNNING"""
+        try:
+            with self.app.app_context():
+                job = db.session.get(ReportJob, job_id)
+                if job is not None and job.status in ACTIVE_STATUSES:
+                    job.status = ReportJobStatus.FAILED
+                    job.error = error
+                    job.finished_at = datetime.utcnow()
+                    job.active_hash = None
+                    db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to mark report job {job_id} as failed: {str(e)}")
+
+    def run_job(self, job_id: str) -> None:
+        """Generate the artifact for a pending job. Requires an app context."""
+        job = db.session.get(ReportJob, job_id)
+        if job is None or job.status != ReportJobStatus.PENDING:
+            return
+
+        job.status = ReportJobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        partial_path = os.path.join(self.storage_dir, f"{job.id}.part")
+        try:
+            definition = REPORT_DEFINITIONS[job.report_type]
+            with open(partial_path, 'wb') as output:
+                filename, mimetype = definition.builder(json.loads(job.params), output)
+
+            stored_name = f"{job.id}{os.path.splitext(filename)[1]}"
+            os.replace(partial_path, os.path.join(self.storage_dir, stored_name))
+
+            job.status = ReportJobStatus.DONE
+            job.file_path = stored_name
+            job.filename = filename
+            job.mimetype = mimetype
+            job.file_size = os.path.getsize(os.path.join(self.storage_dir, stored_name))
+            job.active_hash = None
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            logger.error(f"Report job {job_id} ({job.report_type}) failed: {str(e)}")
+            job = db.session.get(ReportJob, job_id)
+            job.status = ReportJobStatus.FAILED
+            job.error = str(e)
+            job.active_hash = None
+
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    # ------------------------------------------------------------------
+    # Lookup and housekeeping
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[ReportJob]:
+        return db.session.get(ReportJob, job_id)
+
+    def artifact_path(self, job: ReportJob) -> Optional[str]:
+        """Absolute path of a finished job's artifact, or None if it is gone"""
+        if job.status != ReportJobStatus.DONE or not job.file_path:
+            return None
+        path = os.path.join(self.storage_dir, job.file_path)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def serialize(job: ReportJob) -> Dict:
+        return {
+            "id": job.id,
+            "report_type": job.report_type,
+            "params": json.loads(job.params),
+            "status": job.status.value,
+            "filename": job.filename,
+            "mimetype": job.mimetype,
+            "file_size": job.file_size,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def cleanup_expired_jobs(self) -> int:
+        """
+        Delete jobs (and artifacts) older than REPORT_RETENTION_HOURS and fail
+        jobs stuck in flight longer than REPORT_JOB_TIMEOUT_MINUTES.
+        """
+        now = datetime.utcnow()
+
+        stale = ReportJob.query.filter(
+            ReportJob.status.in_(ACTIVE_STATUSES),
+            ReportJob.created_at < now - self.job_timeout
+        ).all()
+        for job in stale:
+            self._time_out(job, now)
+
+        expired = ReportJob.query.filter(
+            ReportJob.status.in_((ReportJobStatus.DONE, ReportJobStatus.FAILED)),
+            ReportJob.created_at < now - self.retention
+        ).all()
+        for job in expired:
+            if job.file_path:
+                path = os.path.join(self.storage_dir, job.file_path)
+                if os.path.exists(path):
+                    os.remove(path)
+            db.session.delete(job)
+
+        db.session.commit()
+        return len(expired)
+
+
+def create_celery(broker_url: str, result_backend: Optional[str] = None):
+    """Celery app running report jobs; workers need the same REPORT_STORAGE_DIR"""
+    from celery import Celery
+
+    celery_app = Celery('dairy_track_reports', broker=broker_url, backend=result_backend)
+    celery_app.conf.update(task_acks_late=True, worker_prefetch_multiplier=1)
+
+    @celery_app.task(name=REPORT_TASK_NAME)
+    def generate_report(job_id):
+        run_job_in_worker(job_id)
+
+    return celery_app
+
+
+_worker_flask_app = None
+
+
+def _worker_app() -> Flask:
+    """Minimal Flask app for worker processes (database only, no schedulers or sockets)"""
+    global _worker_flask_app
+    if _worker_flask_app is None:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        db.init_app(app)
+        report_job_service.init_app(app)
+        _worker_flask_app = app
+    return _worker_flask_app
+
+
+def run_job_in_worker(job_id: str) -> None:
+    """Run a job in a Celery or local worker process"""
+    with _worker_app().app_context():
+        report_job_service.run_job(job_id)
+
+
+# Global instances
+report_job_service = ReportJobService()
+celery = create_celery(Config.CELERY_BROKER_URL, Config.CELERY_RESULT_BACKEND) if Config.CELERY_BROKER_URL else None
@@ -0,0 +1,15 @@
+"""
+Local report worker process, started by LocalReportExecutor for one job:
+
+    python -m app.services.report_worker <job_id>
+
+Exits non-zero if the job could not be run; the job itself records
+rendering errors as FAILED.
+"""
+
+import sys
+
+from app.services.report_jobs import run_job_in_worker
+
+if __name__ == '__main__':
+    run_job_in_worker(sys.argv[1])
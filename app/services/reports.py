@@ -0,0 +1,645 @@
+"""
+Report Rendering Service
+
+PDF and Excel/CSV report builders shared by the synchronous export routes
+and the asynchronous report jobs. Builders only depend on a plain dict of
+string parameters (the same values the export routes read from the query
+string), so they can run inside a request or in a worker.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from fpdf import FPDF
+from sqlalchemy import text
+
+from app.database.database import db
+from app.models.cows import Cow
+from app.models.daily_milk_summary import DailyMilkSummary
+from app.models.milk_batches import BATCH_SHELF_LIFE_HOURS, MilkStatus
+from app.models.milking_sessions import MilkingSession
+from app.models.roles import Role
+from app.models.users import User
+from app.services.export import ExportSpec, get_export_format, iter_query, write_export
+
+PDF_MIMETYPE = 'application/pdf'
+
+
+@dataclass(frozen=True)
+class ReportDefinition:
+    """A report that can be generated by a report job"""
+    name: str
+    builder: Callable[[Dict[str, str], object], Tuple[str, str]]
+    params: Tuple[str, ...] = ()
+    # Raises ValueError for invalid parameters before a job is queued
+    validate: Optional[Callable[[Dict[str, str]], None]] = None
+
+
+REPORT_DEFINITIONS: Dict[str, ReportDefinition] = {}
+
+
+def report_builder(name: str, params: Tuple[str, ...] = (), validate=None):
+    """
+    Register a builder for report jobs. A builder receives the normalised
+    parameters and a binary file object, writes the artifact into it and
+    returns (filename, mimetype).
+    """
+    def decorator(func):
+        REPORT_DEFINITIONS[name] = ReportDefinition(name=name, builder=func, params=params, validate=validate)
+        return func
+    return decorator
+
+
+def _pdf_bytes(pdf: FPDF) -> bytes:
+    return bytes(pdf.output())
+
+
+def _session_label(hour: int, labels: Tuple[str, str, str]) -> str:
+    """Map a milking hour to its morning/afternoon/evening label"""
+    if hour < 12:
+        return labels[0]
+    elif hour < 18:
+        return labels[1]
+    return labels[2]
+
+
+def _cow_age(birth) -> Optional[str]:
+    if not birth:
+        return None
+    birth_date = birth if isinstance(birth, date) else birth.date()
+    today = date.today()
+    age_years = today.year - birth_date.year
+    age_months = today.month - birth_date.month
+    if age_months < 0:
+        age_years -= 1
+        age_months += 12
+    return f"{age_years} tahun {age_months} bulan"
+
+
+def parse_summary_filters(params) -> Tuple[Optional[int], Optional[date], Optional[date]]:
+    """Validate cow_id/start_date/end_date filters, raising ValueError with a client-facing message"""
+    cow_id = params.get('cow_id')
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+
+    if cow_id:
+        try:
+            cow_id = int(cow_id)
+        except ValueError:
+            raise ValueError("Invalid cow_id format. Must be an integer.")
+    else:
+        cow_id = None
+
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+
+    if start_date and end_date and start_date > end_date:
+        raise ValueError("start_date cannot be later than end_date")
+
+    return cow_id, start_date, end_date
+
+
+def _summary_query(cow_id, start_date, end_date):
+    query = db.session.query(
+        DailyMilkSummary.cow_id,
+        Cow.name.label('cow_name'),
+        DailyMilkSummary.date,
+        DailyMilkSummary.morning_volume,
+        DailyMilkSummary.afternoon_volume,
+        DailyMilkSummary.evening_volume,
+        DailyMilkSummary.total_volume
+    ).outerjoin(Cow, DailyMilkSummary.cow_id == Cow.id)
+
+    if cow_id:
+        query = query.filter(DailyMilkSummary.cow_id == cow_id)
+    if start_date:
+        query = query.filter(DailyMilkSummary.date >= start_date)
+    if end_date:
+        query = query.filter(DailyMilkSummary.date <= end_date)
+
+    return query.order_by(DailyMilkSummary.date.desc())
+
+
+def _summary_filename(cow_id, start_date, end_date, cow_info, is_male_cow) -> str:
+    """Base filename (without extension) for daily summary reports"""
+    if is_male_cow:
+        return f"bull_report_{cow_info.name.replace(' ', '_')}"
+    if start_date and end_date:
+        return f"milk_production_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}"
+    if cow_id:
+        return f"milk_production_cow_{cow_id}"
+    return "daily_milk_production"
+
+
+def _milking_sessions_query():
+    return db.session.query(
+        MilkingSession.cow_id,
+        Cow.name.label('cow_name'),
+        MilkingSession.milker_id,
+        User.name.label('milker_name'),
+        MilkingSession.volume,
+        MilkingSession.milking_time
+    ).outerjoin(Cow, MilkingSession.cow_id == Cow.id)\
+     .outerjoin(User, MilkingSession.milker_id == User.id)\
+     .order_by(MilkingSession.id)
+
+
+# ---------------------------------------------------------------------------
+# Tabular (Excel/CSV) exports
+# ---------------------------------------------------------------------------
+
+def cows_export_spec(params=None) -> ExportSpec:
+    query = db.session.query(
+        Cow.name, Cow.breed, Cow.gender, Cow.lactation_phase, Cow.weight, Cow.birth
+    ).order_by(Cow.id)
+
+    rows = (
+        (idx, cow.name, cow.breed, cow.gender, cow.lactation_phase or "-", cow.weight or "-", cow.birth)
+        for idx, cow in enumerate(iter_query(query), start=1)
+    )
+    return ExportSpec(
+        "cows", "Cows",
+        ["NO", "Name", "Breed", "Gender", "Lactation Phase", "Weight", "Birth"],
+        rows
+    )
+
+
+def users_export_spec(params=None) -> ExportSpec:
+    # Ambil data pengguna beserta nama role dalam satu query
+    query = db.session.query(
+        User.name, User.username, User.email, User.contact,
+        User.religion, Role.name.label('role_name'), User.birth
+    ).join(Role, User.role_id == Role.id).order_by(User.id)
+
+    rows = (
+        (idx, user.name, user.username, user.email, user.contact,
+         user.religion, user.role_name, user.birth)
+        for idx, user in enumerate(iter_query(query), start=1)
+    )
+    return ExportSpec(
+        "users", "Users",
+        ["NO", "Name", "Username", "Email", "Contact", "Religion", "Role", "Birth"],
+        rows
+    )
+
+
+def milking_sessions_export_spec(params=None) -> ExportSpec:
+    def session_rows():
+        for idx, session in enumerate(iter_query(_milking_sessions_query()), start=1):
+            yield (
+                idx,
+                f"{session.cow_id} - {session.cow_name}" if session.cow_name else str(session.cow_id),
+                f"{session.milker_id} - {session.milker_name}" if session.milker_name else str(session.milker_id),
+                _session_label(session.milking_time.hour, ("Pagi", "Siang", "Sore")),
+                session.volume,
+                session.milking_time.strftime('%Y-%m-%d %H:%M')
+            )
+
+    return ExportSpec(
+        "milking_sessions", "MilkingSessions",
+        ["NO", "Cow", "Milker", "Session", "Volume", "Milking Time"],
+        session_rows()
+    )
+
+
+def daily_summaries_export_spec(params) -> ExportSpec:
+    cow_id, start_date, end_date = parse_summary_filters(params)
+
+    # Check if cow is male (no milk production data)
+    cow_info = Cow.query.get(cow_id) if cow_id else None
+    is_male_cow = bool(cow_info and cow_info.gender and cow_info.gender.lower() == 'male')
+    filename = _summary_filename(cow_id, start_date, end_date, cow_info, is_male_cow)
+
+    if is_male_cow:
+        data = [
+            ("Nama Sapi", cow_info.name),
+            ("ID Sapi", cow_info.id),
+            ("Jenis Kelamin", cow_info.gender),
+            ("Ras", cow_info.breed if cow_info.breed else 'N/A'),
+            ("Status", "Sapi Pejantan - Aktif untuk pembiakan"),
+            ("Fungsi", "Pembiakan dan pemuliaan genetik"),
+            ("Catatan", "Sapi pejantan tidak menghasilkan susu")
+        ]
+        age_str = _cow_age(cow_info.birth)
+        if age_str:
+            data.insert(4, ("Umur", age_str))
+
+        return ExportSpec(filename, 'InformasiPejantan', ["Informasi", "Detail"], data, center_headers=True)
+
+    query = _summary_query(cow_id, start_date, end_date)
+    totals = {'rows': 0, 'morning': 0.0, 'afternoon': 0.0, 'evening': 0.0, 'total': 0.0}
+
+    def summary_rows():
+        for idx, summary in enumerate(iter_query(query), start=1):
+            morning = float(summary.morning_volume or 0)
+            afternoon = float(summary.afternoon_volume or 0)
+            evening = float(summary.evening_volume or 0)
+            total = float(summary.total_volume or 0)
+            totals['rows'] += 1
+            totals['morning'] += morning
+            totals['afternoon'] += afternoon
+            totals['evening'] += evening
+            totals['total'] += total
+            yield (
+                idx,
+                f"{summary.cow_id} - {summary.cow_name}" if summary.cow_name else str(summary.cow_id),
+                summary.date.strftime('%Y-%m-%d'),
+                morning, afternoon, evening, total
+            )
+
+        if totals['rows'] == 0:
+            # Create empty data message
+            yield ("", "Tidak ada data", "", 0, 0, 0, 0)
+
+    def total_row():
+        # Add total row if there's data
+        if totals['rows'] == 0:
+            return []
+        return [("", "TOTAL", "", totals['morning'], totals['afternoon'],
+                 totals['evening'], totals['total'])]
+
+    return ExportSpec(
+        filename, 'DailyMilkProduction',
+        ["NO", "Sapi", "Tanggal", "Produksi Pagi", "Produksi Siang", "Produksi Sore", "Total Produksi"],
+        summary_rows(), footer=total_row, center_headers=True
+    )
+
+
+def _validate_summary_params(params) -> None:
+    parse_summary_filters(params)
+
+
+def _register_export(name: str, spec_factory, params: Tuple[str, ...] = (), validate=None):
+    def build(job_params, output):
+        export_format = get_export_format(job_params.get('format'))
+        return write_export(export_format, spec_factory(job_params), output)
+
+    def validate_export(job_params):
+        get_export_format(job_params.get('format'))
+        if validate:
+            validate(job_params)
+
+    report_builder(name, params + ('format',), validate_export)(build)
+
+
+_register_export('cows_excel', cows_export_spec)
+_register_export('users_excel', users_export_spec)
+_register_export('milking_sessions_excel', milking_sessions_export_spec)
+_register_export('daily_summaries_excel', daily_summaries_export_spec,
+                 ('cow_id', 'start_date', 'end_date'), _validate_summary_params)
+
+
+# ---------------------------------------------------------------------------
+# PDF reports
+# ---------------------------------------------------------------------------
+
+def render_milking_sessions_pdf(params=None) -> Tuple[bytes, str]:
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(200, 10, txt="Milking Sessions Report", ln=True, align='C')
+    pdf.ln(5)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(200, 10, txt="Cattle milking session list.", ln=True, align='C')
+    pdf.ln(10)
+
+    pdf.set_fill_color(173, 216, 230)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", style="B", size=10)
+    pdf.cell(10, 10, "NO", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Cow", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Milker", border=1, align='C', fill=True)
+    pdf.cell(25, 10, "Session", border=1, align='C', fill=True)
+    pdf.cell(25, 10, "Volume", border=1, align='C', fill=True)
+    pdf.cell(45, 10, "Milking Time", border=1, align='C', fill=True)
+    pdf.ln()
+
+    pdf.set_font("Arial", size=10)
+    for idx, session in enumerate(iter_query(_milking_sessions_query()), start=1):
+        cow_info = f"{session.cow_id} - {session.cow_name}" if session.cow_name else str(session.cow_id)
+        milker_info = f"{session.milker_id} - {session.milker_name}" if session.milker_name else str(session.milker_id)
+        sesi = _session_label(session.milking_time.hour, ("Morning", "Afternoon", "Evening"))
+        pdf.cell(10, 10, str(idx), border=1, align='C')
+        pdf.cell(40, 10, cow_info, border=1)
+        pdf.cell(40, 10, milker_info, border=1)
+        pdf.cell(25, 10, sesi, border=1, align='C')
+        pdf.cell(25, 10, str(session.volume), border=1)
+        pdf.cell(45, 10, session.milking_time.strftime('%Y-%m-%d %H:%M'), border=1)
+        pdf.ln()
+
+    return _pdf_bytes(pdf), "milking_sessions.pdf"
+
+
+def render_daily_summaries_pdf(params) -> Tuple[bytes, str]:
+    cow_id, start_date, end_date = parse_summary_filters(params)
+
+    # Check if cow is male (no milk production data)
+    cow_info = Cow.query.get(cow_id) if cow_id else None
+    is_male_cow = bool(cow_info and cow_info.gender and cow_info.gender.lower() == 'male')
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", style="B", size=16)
+
+    # Title based on cow type
+    if is_male_cow:
+        pdf.cell(200, 10, txt="Laporan Sapi Pejantan", ln=True, align='C')
+    else:
+        pdf.cell(200, 10, txt="Laporan Produksi Susu Harian", ln=True, align='C')
+    pdf.ln(5)
+
+    # Add filter information
+    pdf.set_font("Arial", size=10)
+    filter_text = "Filter: "
+    if cow_id:
+        cow_name = cow_info.name if cow_info else f"Cow ID: {cow_id}"
+        filter_text += f"Sapi: {cow_name}, "
+    if start_date:
+        filter_text += f"Dari: {start_date.strftime('%Y-%m-%d')}, "
+    if end_date:
+        filter_text += f"Sampai: {end_date.strftime('%Y-%m-%d')}, "
+
+    if filter_text == "Filter: ":
+        filter_text += "Semua data"
+    else:
+        filter_text = filter_text[:-2]  # Remove last comma and space
+
+    pdf.cell(200, 10, txt=filter_text, ln=True, align='C')
+    pdf.ln(10)
+
+    if is_male_cow:
+        # Special content for male cows
+        pdf.set_font("Arial", style="B", size=14)
+        pdf.cell(200, 10, txt="INFORMASI SAPI PEJANTAN", ln=True, align='C')
+        pdf.ln(10)
+
+        pdf.set_font("Arial", size=12)
+        pdf.cell(200, 8, txt=f"Nama Sapi: {cow_info.name}", ln=True)
+        pdf.cell(200, 8, txt=f"ID: {cow_info.id}", ln=True)
+        pdf.cell(200, 8, txt=f"Jenis Kelamin: {cow_info.gender}", ln=True)
+        pdf.cell(200, 8, txt=f"Ras: {cow_info.breed if cow_info.breed else 'N/A'}", ln=True)
+        pdf.cell(200, 8, txt=f"Umur: {_cow_age(cow_info.birth) or 'N/A'}", ln=True)
+        pdf.ln(10)
+
+        # Status and function
+        pdf.set_font("Arial", style="B", size=12)
+        pdf.cell(200, 8, txt="STATUS DAN FUNGSI:", ln=True)
+        pdf.set_font("Arial", size=11)
+        pdf.cell(200, 8, txt="- Status: Sapi Pejantan - Aktif untuk pembiakan", ln=True)
+        pdf.cell(200, 8, txt="- Fungsi Utama: Pembiakan dan pemuliaan genetik", ln=True)
+        pdf.cell(200, 8, txt="- Peran: Menghasilkan keturunan dengan genetik unggul", ln=True)
+        pdf.cell(200, 8, txt="- Tidak menghasilkan susu karena jenis kelamin jantan", ln=True)
+        pdf.ln(10)
+
+        pdf.set_font("Arial", style="I", size=10)
+        pdf.cell(200, 8, txt="Catatan: Sapi pejantan tidak diperah karena tidak menghasilkan susu.", ln=True)
+        pdf.cell(200, 8, txt="Laporan ini hanya menampilkan informasi dasar tentang sapi pejantan.", ln=True)
+    else:
+        row_count = 0
+        total_morning = total_afternoon = total_evening = total_all = 0.0
+
+        for idx, summary in enumerate(iter_query(_summary_query(cow_id, start_date, end_date)), start=1):
+            if idx == 1:
+                # Create table headers
+                pdf.set_fill_color(173, 216, 230)
+                pdf.set_text_color(0, 0, 0)
+                pdf.set_font("Arial", style="B", size=10)
+                pdf.cell(10, 10, "NO", border=1, align='C', fill=True)
+                pdf.cell(50, 10, "Sapi", border=1, align='C', fill=True)
+                pdf.cell(30, 10, "Tanggal", border=1, align='C', fill=True)
+                pdf.cell(25, 10, "Pagi", border=1, align='C', fill=True)
+                pdf.cell(25, 10, "Siang", border=1, align='C', fill=True)
+                pdf.cell(25, 10, "Sore", border=1, align='C', fill=True)
+                pdf.cell(25, 10, "Total", border=1, align='C', fill=True)
+                pdf.ln()
+                pdf.set_font("Arial", size=10)
+
+            morning = float(summary.morning_volume or 0)
+            afternoon = float(summary.afternoon_volume or 0)
+            evening = float(summary.evening_volume or 0)
+            total = float(summary.total_volume or 0)
+            row_count += 1
+            total_morning += morning
+            total_afternoon += afternoon
+            total_evening += evening
+            total_all += total
+
+            label = f"{summary.cow_id} - {summary.cow_name}" if summary.cow_name else str(summary.cow_id)
+            pdf.cell(10, 10, str(idx), border=1, align='C')
+            pdf.cell(50, 10, label, border=1)
+            pdf.cell(30, 10, summary.date.strftime('%Y-%m-%d'), border=1, align='C')
+            pdf.cell(25, 10, str(round(morning, 2)), border=1, align='R')
+            pdf.cell(25, 10, str(round(afternoon, 2)), border=1, align='R')
+            pdf.cell(25, 10, str(round(evening, 2)), border=1, align='R')
+            pdf.cell(25, 10, str(round(total, 2)), border=1, align='R')
+            pdf.ln()
+
+        if row_count == 0:
+            pdf.set_font("Arial", size=12)
+            pdf.cell(200, 10, txt="Tidak ada data produksi susu untuk periode yang dipilih", ln=True, align='C')
+        else:
+            # Add totals row
+            pdf.set_font("Arial", style="B", size=10)
+            pdf.cell(90, 10, "TOTAL", border=1, align='C', fill=True)
+            pdf.cell(25, 10, str(round(total_morning, 2)), border=1, align='R', fill=True)
+            pdf.cell(25, 10, str(round(total_afternoon, 2)), border=1, align='R', fill=True)
+            pdf.cell(25, 10, str(round(total_evening, 2)), border=1, align='R', fill=True)
+            pdf.cell(25, 10, str(round(total_all, 2)), border=1, align='R', fill=True)
+
+    filename = _summary_filename(cow_id, start_date, end_date, cow_info, is_male_cow)
+    return _pdf_bytes(pdf), f"{filename}.pdf"
+
+
+def render_cows_pdf(params=None) -> Tuple[bytes, str]:
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Tambahkan deskripsi di bagian atas
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(200, 10, txt="Laporan Data Sapi", ln=True, align='C')
+    pdf.ln(5)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(200, 10, txt="Berikut adalah daftar sapi yang terdaftar dalam sistem.", ln=True, align='C')
+    pdf.ln(10)
+
+    # Tambahkan header tabel dengan warna latar belakang
+    pdf.set_fill_color(173, 216, 230)  # Warna biru muda (RGB)
+    pdf.set_text_color(0, 0, 0)  # Warna teks hitam
+    pdf.set_font("Arial", style="B", size=10)
+    pdf.cell(20, 10, "NO", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Name", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Breed", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Gender", border=1, align='C', fill=True)
+    pdf.cell(50, 10, "Lactation Phase", border=1, align='C', fill=True)
+    pdf.ln()
+
+    # Isi data
+    query = db.session.query(Cow.name, Cow.breed, Cow.gender, Cow.lactation_phase).order_by(Cow.id)
+    pdf.set_font("Arial", size=10)
+    for idx, cow in enumerate(iter_query(query), start=1):
+        pdf.cell(20, 10, str(idx), border=1, align='C')
+        pdf.cell(40, 10, cow.name, border=1)
+        pdf.cell(40, 10, cow.breed, border=1)
+        pdf.cell(40, 10, cow.gender, border=1)
+        pdf.cell(50, 10, cow.lactation_phase or "-", border=1)
+        pdf.ln()
+
+    return _pdf_bytes(pdf), "cows.pdf"
+
+
+def render_users_pdf(params=None) -> Tuple[bytes, str]:
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Tambahkan deskripsi di bagian atas
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(200, 10, txt="Laporan Data Pengguna", ln=True, align='C')
+    pdf.ln(5)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(200, 10, txt="Berikut adalah daftar pengguna yang terdaftar dalam sistem.", ln=True, align='C')
+    pdf.ln(10)
+
+    # Tambahkan header tabel dengan warna latar belakang
+    pdf.set_fill_color(173, 216, 230)  # Warna biru muda (RGB)
+    pdf.set_text_color(0, 0, 0)  # Warna teks hitam
+    pdf.set_font("Arial", style="B", size=10)
+    pdf.cell(20, 10, "NO", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Name", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Username", border=1, align='C', fill=True)
+    pdf.cell(50, 10, "Email", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Role", border=1, align='C', fill=True)
+    pdf.ln()
+
+    # Isi data
+    query = db.session.query(
+        User.name, User.username, User.email, Role.name.label('role_name')
+    ).join(Role, User.role_id == Role.id).order_by(User.id)
+    pdf.set_font("Arial", size=10)
+    for idx, user in enumerate(iter_query(query), start=1):
+        pdf.cell(20, 10, str(idx), border=1, align='C')
+        pdf.cell(40, 10, user.name, border=1)
+        pdf.cell(40, 10, user.username, border=1)
+        pdf.cell(50, 10, user.email, border=1)
+        pdf.cell(40, 10, user.role_name, border=1)
+        pdf.ln()
+
+    return _pdf_bytes(pdf), "users.pdf"
+
+
+def render_freshness_pdf(params=None) -> Tuple[bytes, str]:
+    # Get fresh milk batches
+    result = db.session.execute(text("""
+        SELECT
+            mb.id,
+            mb.batch_number,
+            mb.total_volume,
+            mb.status,
+            mb.production_date,
+            mb.expiry_date,
+            c.name as cow_name
+        FROM milk_batches mb
+        LEFT JOIN milking_sessions ms ON ms.milk_batch_id = mb.id
+        LEFT JOIN cows c ON ms.cow_id = c.id
+        WHERE mb.status = 'FRESH'
+        ORDER BY mb.expiry_date ASC
+    """))
+
+    # Create PDF report
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", style="B", size=16)
+    pdf.cell(200, 10, txt="Laporan Kesegaran Susu", ln=True, align='C')
+    pdf.ln(5)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(200, 10, txt=f"Tanggal Laporan: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align='C')
+    pdf.ln(10)
+
+    # Add table header
+    pdf.set_fill_color(173, 216, 230)  # Light blue
+    pdf.set_font("Arial", style="B", size=10)
+    pdf.cell(15, 10, "NO", border=1, align='C', fill=True)
+    pdf.cell(30, 10, "Batch", border=1, align='C', fill=True)
+    pdf.cell(35, 10, "Sapi", border=1, align='C', fill=True)
+    pdf.cell(30, 10, "Volume (L)", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Tanggal Produksi", border=1, align='C', fill=True)
+    pdf.cell(40, 10, "Kedaluarsa", border=1, align='C', fill=True)
+    pdf.ln()
+
+    # Add data rows
+    pdf.set_font("Arial", size=10)
+    now = datetime.utcnow()
+    for idx, row in enumerate(result, 1):
+        expiry = row.expiry_date
+        production_date = row.production_date
+
+        # Calculate hours_left and determine fill color
+        if row.status == str(MilkStatus.EXPIRED.value):
+            fill_color = (255, 150, 150)  # Light red for expired
+        elif expiry:
+            hours_left = (expiry - now).total_seconds() / 3600
+            if hours_left < 0:
+                fill_color = (255, 150, 150)  # Light red for expired
+            elif hours_left < 2:
+                fill_color = (255, 200, 200)  # Light red for critical
+            elif hours_left < 4:
+                fill_color = (255, 255, 200)  # Light yellow for warning
+            else:
+                fill_color = (255, 255, 255)  # White for fresh
+        elif production_date:
+            hours_left = max(0, 8 - (now - production_date).total_seconds() / 3600)
+            if hours_left < 2:
+                fill_color = (255, 200, 200)  # Light red for critical
+            elif hours_left < 4:
+                fill_color = (255, 255, 200)  # Light yellow for warning
+            else:
+                fill_color = (255, 255, 255)  # White for fresh
+        else:
+            fill_color = (220, 220, 220)  # Gray for unknown
+
+        # Display estimated expiry if no expiry date
+        display_expiry = expiry
+        if not display_expiry and production_date:
+            display_expiry = production_date + timedelta(hours=BATCH_SHELF_LIFE_HOURS)
+
+        pdf.set_fill_color(*fill_color)
+        pdf.cell(15, 10, str(idx), border=1, align='C', fill=True)
+        pdf.cell(30, 10, row.batch_number, border=1, fill=True)
+        pdf.cell(35, 10, row.cow_name or "Unknown", border=1, fill=True)
+        pdf.cell(30, 10, f"{row.total_volume:.1f}", border=1, align='R', fill=True)
+        pdf.cell(40, 10, production_date.strftime('%Y-%m-%d %H:%M') if production_date else "-", border=1, fill=True)
+
+        if display_expiry:
+            pdf.cell(40, 10, display_expiry.strftime('%Y-%m-%d %H:%M'), border=1, fill=True)
+        else:
+            pdf.cell(40, 10, "Tidak diketahui", border=1, fill=True)
+
+        pdf.ln()
+
+    return _pdf_bytes(pdf), "milk_freshness_report.pdf"
+
+
+def _register_pdf(name: str, renderer, params: Tuple[str, ...] = (), validate=None):
+    def build(job_params, output):
+        content, filename = renderer(job_params)
+        output.write(content)
+        return filename, PDF_MIMETYPE
+    report_builder(name, params, validate)(build)
+
+
+_register_pdf('milking_sessions_pdf', render_milking_sessions_pdf)
+_register_pdf('daily_summaries_pdf', render_daily_summaries_pdf,
+              ('cow_id', 'start_date', 'end_date'), _validate_summary_params)
+_register_pdf('cows_pdf', render_cows_pdf)
+_register_pdf('users_pdf', render_users_pdf)
+_register_pdf('freshness_pdf', render_freshness_pdf)
@@ -0,0 +1,94 @@
+"""
+Role Membership Cache
+
+Per-process cache of which users hold which role, used by the notification
+fan-out to resolve admins and supervisors. The whole membership table is
+loaded with one query and kept as normalised role name -> tuple of user ids,
+so lookups cost no queries on a hit and never materialise `User` objects.
+
+Role names are compared normalised (trimmed, case-folded); callers list each
+spelling once in lower case instead of every case variant.
+
+The snapshot is dropped by the /user add, edit and delete handlers and by
+/role add. The TTL bounds staleness for changes made by other worker
+processes.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.database.database import db
+from app.models.roles import Role
+from app.models.users import User
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_role_name(name: Optional[str]) -> str:
+    return (name or '').strip().casefold()
+
+
+class RoleMemberCache:
+    """Caches normalised role name -> tuple of user ids"""
+
+    def __init__(self):
+        self._members: Optional[Dict[str, Tuple[int, ...]]] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _ttl(self) -> float:
+        return current_app.config.get('ROLE_MEMBER_CACHE_TTL_SECONDS', 300)
+
+    def _snapshot(self) -> Dict[str, Tuple[int, ...]]:
+        now = time.monotonic()
+        with self._lock:
+            if self._members is not None and self._expires_at > now:
+                self.stats['hits'] += 1
+                return self._members
+            self.stats['misses'] += 1
+
+        grouped: Dict[str, list] = {}
+        for user_id, role_name in db.session.execute(
+            select(User.id, Role.name).join(Role, Role.id == User.role_id).order_by(User.id)
+        ):
+            grouped.setdefault(normalize_role_name(role_name), []).append(user_id)
+        members = {name: tuple(ids) for name, ids in grouped.items()}
+
+        with self._lock:
+            self._members = members
+            self._expires_at = now + self._ttl()
+        return members
+
+    def user_ids(self, role_names: Iterable[str]) -> Tuple[int, ...]:
+        """Ids of users holding any of the roles, ascending"""
+        members = self._snapshot()
+        names = {normalize_role_name(name) for name in role_names}
+        ids = set()
+        for name in names:
+            ids.update(members.get(name, ()))
+        return tuple(sorted(ids))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._members = None
+            self.stats['invalidations'] += 1
+
+
+# Global cache instance
+role_member_cache = RoleMemberCache()
+
+
+def get_role_user_ids(role_names: Iterable[str]) -> Tuple[int, ...]:
+    """Ids of users holding any of the given roles"""
+    return role_member_cache.user_ids(role_names)
+
+
+def invalidate_role_members() -> None:
+    """Forget cached role memberships"""
+    role_member_cache.invalidate()
@@ -0,0 +1,198 @@
+"""
+Scheduler Leader Lease
+
+Every web worker runs an APScheduler instance, but only the holder of the
+leader lease executes jobs. A lease expires unless it is renewed, so a
+crashed leader is replaced after SCHEDULER_LEASE_SECONDS.
+
+Backends (SCHEDULER_LOCK_BACKEND):
+    database  - a row in `scheduler_leases` (default)
+    redis     - a key with a TTL on REDIS_URL
+    file      - an exclusive flock on SCHEDULER_LOCK_FILE; single-host stand-in
+"""
+
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database.database import db
+from app.models.scheduler import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scheduler-leader'
+
+
+def make_holder_id() -> str:
+    """Identify this process across hosts and restarts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class DatabaseLease:
+    """Lease stored as a row; taken over with a conditional UPDATE once expired"""
+
+    backend = 'database'
+
+    def __init__(self, app, name: str = LEASE_NAME):
+        self.app = app
+        self.name = name
+
+    def acquire(self, holder: str, ttl: timedelta) -> bool:
+        with self.app.app_context():
+            now = datetime.utcnow()
+            try:
+                result = db.session.execute(
+                    update(SchedulerLease).where(
+                        SchedulerLease.name == self.name,
+                        or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now)
+                    ).values(holder=holder, expires_at=now + ttl)
+                )
+                if result.rowcount:
+                    db.session.commit()
+                    return True
+
+                if db.session.get(SchedulerLease, self.name) is not None:
+                    db.session.rollback()
+                    return False
+
+                db.session.add(SchedulerLease(name=self.name, holder=holder,
+                                              expires_at=now + ttl, acquired_at=now))
+                db.session.commit()
+                return True
+            except IntegrityError:
+                # Another process inserted the lease row first
+                db.session.rollback()
+                return False
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def release(self, holder: str) -> None:
+        with self.app.app_context():
+            db.session.execute(
+                update(SchedulerLease).where(
+                    SchedulerLease.name == self.name,
+                    SchedulerLease.holder == holder
+                ).values(expires_at=datetime.utcnow())
+            )
+            db.session.commit()
+
+    def current(self) -> Dict:
+        with self.app.app_context():
+            lease = db.session.get(SchedulerLease, self.name)
+            if lease is None:
+                return {"holder": None, "expires_at": None}
+            return {"holder": lease.holder, "expires_at": lease.expires_at.isoformat()}
+
+
+class RedisLease:
+    """Lease stored as a Redis key with a TTL; renew and release are holder-checked scripts"""
+
+    backend = 'redis'
+
+    RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_url: str, name: str = LEASE_NAME):
+        import redis
+
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.key = f"dairy_track:lease:{name}"
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def acquire(self, holder: str, ttl: timedelta) -> bool:
+        ttl_ms = int(ttl.total_seconds() * 1000)
+        if self.client.set(self.key, holder, nx=True, px=ttl_ms):
+            return True
+        return bool(self._renew(keys=[self.key], args=[holder, ttl_ms]))
+
+    def release(self, holder: str) -> None:
+        self._release(keys=[self.key], args=[holder])
+
+    def current(self) -> Dict:
+        holder = self.client.get(self.key)
+        ttl_ms = self.client.pttl(self.key) if holder else None
+        expires_at = (datetime.utcnow() + timedelta(milliseconds=ttl_ms)).isoformat() if ttl_ms and ttl_ms > 0 else None
+        return {"holder": holder, "expires_at": expires_at}
+
+
+class FileLease:
+    """
+    Stand-in for a single host: the leader holds an exclusive flock on a
+    local file for as long as the process lives. The TTL is not needed since
+    the kernel drops the lock when the holder dies.
+    """
+
+    backend = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = None
+
+    def acquire(self, holder: str, ttl: timedelta) -> bool:
+        import fcntl
+
+        if self._handle is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+
+        handle.seek(0)
+        handle.truncate()
+        handle.write(holder)
+        handle.flush()
+        self._handle = handle
+        return True
+
+    def release(self, holder: str) -> None:
+        import fcntl
+
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+    def current(self) -> Dict:
+        try:
+            with open(self.path) as handle:
+                holder = handle.read().strip() or None
+        except FileNotFoundError:
+            holder = None
+        return {"holder": holder, "expires_at": None}
+
+
+def create_lease(app):
+    """Build the lease backend configured for the app"""
+    backend = app.config['SCHEDULER_LOCK_BACKEND']
+    if backend == 'redis':
+        if not app.config.get('REDIS_URL'):
+            raise ValueError("SCHEDULER_LOCK_BACKEND=redis requires REDIS_URL")
+        return RedisLease(app.config['REDIS_URL'])
+    if backend == 'file':
+        return FileLease(app.config['SCHEDULER_LOCK_FILE'])
+    if backend == 'database':
+        return DatabaseLease(app)
+    raise ValueError(f"Invalid SCHEDULER_LOCK_BACKEND: {backend}. Valid backends are: database, redis, file")
@@ -1,4 +1,6 @@
-from .manager import socketio, init_socketio, emit_notification
+from .manager import (socketio, init_socketio, emit_notification, emit_notification_state, emit_outbox,
+                      get_presence, is_user_online)
 from . import events  # Import to register event handlers
 
-__all__ = ['socketio', 'init_socketio', 'emit_notification']
\ No newline at end of file
+__all__ = ['socketio', 'init_socketio', 'emit_notification', 'emit_notification_state', 'emit_outbox',
+           'get_presence', 'is_user_online']
@@ -1,10 +1,7 @@
 from flask_socketio import emit, join_room, leave_room
 from flask import request
-from .manager import socketio, user_clients
+from .manager import socketio, get_presence
 import logging
-from datetime import datetime  # Correct import
-
-connected_users = {}
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +15,10 @@ def handle_connect(auth):
 def handle_disconnect():
     """Handle user disconnect"""
     session_id = request.sid
-    if session_id in connected_users:
-        user_data = connected_users[session_id]
-        user_id = user_data['user_id']
-        role_id = user_data.get('role_id')
-        
-        # Leave rooms
-        leave_room(f"user_{user_id}")
-        if role_id:
-            leave_room(f"role_{role_id}")
-        
-        # Remove from connected users
-        del connected_users[session_id]
-        
-        logging.info(f"User {user_id} disconnected")
+    # Rooms are per-connection and dropped by Socket.IO itself; only presence needs cleanup
+    user_data = get_presence().remove(session_id)
+    if user_data:
+        logging.info(f"User {user_data['user_id']} disconnected")
 
 @socketio.on('register')
 def handle_register(data):
@@ -42,12 +29,15 @@ def handle_register(data):
         session_id = request.sid
         
         if user_id:
-            # Store user connection
-            connected_users[session_id] = {
-                'user_id': user_id,
-                'role_id': role_id,
-                'connected_at': datetime.utcnow().isoformat()
-            }
+            # A connection re-registering as another user must not keep the old rooms
+            previous = get_presence().get(session_id)
+            if previous and (previous['user_id'], previous.get('role_id')) != (user_id, role_id):
+                leave_room(f"user_{previous['user_id']}")
+                if previous.get('role_id'):
+                    leave_room(f"role_{previous['role_id']}")
+            
+            # Store user connection (shared across workers with a message queue)
+            get_presence().add(session_id, user_id, role_id)
             
             # Join user-specific room
             join_room(f"user_{user_id}")
@@ -70,12 +60,14 @@ def handle_register(data):
 def handle_unregister(data):
     """Unregister a client for a specific user"""
     user_id = str(data.get('user_id', ''))
+    user_data = get_presence().get(request.sid)
     
-    if user_id in user_clients and request.sid in user_clients[user_id]:
-        user_clients[user_id].remove(request.sid)
+    if user_data and user_data['user_id'] == user_id:
+        get_presence().remove(request.sid)
         leave_room(f"user_{user_id}")
+        if user_data.get('role_id'):
+            leave_room(f"role_{user_data['role_id']}")
         logger.info(f"Client {request.sid} left room user_{user_id}")
-        print(f"Client {request.sid} left room user_{user_id}")
 
 def send_notification_to_user(user_id, notification_data):
     """Send notification to specific user"""
@@ -1,17 +1,73 @@
+import logging
+import time
+
 from flask_socketio import SocketIO
+from .outbox import EmitOutbox
+from .presence import MemoryPresence, create_presence
+from app.utils.green import spawn_worker
+
+logger = logging.getLogger(__name__)
 
 # Create SocketIO instance
 socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet')
 
-# Connected clients tracking
-user_clients = {}
+# Notification emits go through the outbox so callers never wait on the socket
+emit_outbox = EmitOutbox(emit=socketio.emit)
+
+# Connected users, shared across workers when a Redis message queue is configured
+_presence = MemoryPresence()
+
+def get_presence():
+    return _presence
 
 def init_socketio(app):
-    """Initialize SocketIO with the Flask app"""
-    socketio.init_app(app)
+    """
+    Initialize SocketIO with the Flask app.
+
+    With SOCKETIO_MESSAGE_QUEUE set, emits are published through the queue so
+    clients connected to any worker or replica receive them, and presence is
+    kept in the same Redis. 'memory://' is an in-process stand-in for tests.
+    """
+    global _presence
+
+    options = {}
+    if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        options['message_queue'] = app.config['SOCKETIO_MESSAGE_QUEUE']
+        options['channel'] = app.config['SOCKETIO_CHANNEL']
+    if app.config.get('SOCKETIO_TRANSPORTS'):
+        # 'websocket' alone needs no sticky sessions at the load balancer
+        options['transports'] = app.config['SOCKETIO_TRANSPORTS']
+
+    socketio.init_app(app, **options)
+    emit_outbox.init_app(app)
+
+    _presence = create_presence(app)
+    if _presence.backend != 'memory':
+        spawn_worker(lambda: _presence_heartbeat(app.config['SOCKET_PRESENCE_TTL_SECONDS']), 'socket-presence')
     return socketio
 
+def _presence_heartbeat(ttl_seconds):
+    while True:
+        try:
+            _presence.heartbeat()
+        except Exception as e:
+            logger.error(f"Socket presence heartbeat failed: {str(e)}")
+        time.sleep(max(ttl_seconds / 3, 1))
+
 def emit_notification(user_id, notification):
-    """Emit notification to specific user"""
+    """Queue a notification for a specific user; False if the outbox is full"""
     room = f"user_{user_id}"
-    socketio.emit('new_notification', notification, room=room)
\ No newline at end of file
+    return emit_outbox.enqueue(room, notification)
+
+def emit_notification_state(user_id, state):
+    """Tell every open tab of the user that notifications were read or deleted"""
+    try:
+        socketio.emit('notifications_updated', state, room=f"user_{user_id}")
+        return True
+    except Exception as e:
+        logger.error(f"Error emitting notification state to user {user_id}: {str(e)}")
+        return False
+
+def is_user_online(user_id):
+    """Whether the user has a socket connection on any worker"""
+    return _presence.is_online(user_id)
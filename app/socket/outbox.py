@@ -0,0 +1,162 @@
+"""
+Socket Emit Outbox
+
+Callers enqueue (room, payload) and return immediately; a dedicated worker
+(an eventlet green thread under run.py) performs the actual emits.
+
+- Payloads for the same room arriving within SOCKET_EMIT_COALESCE_SECONDS
+  are sent as one `notifications_batch` event ({"notifications": [...],
+  "count": n}); a lone payload is sent as `new_notification` as before.
+- A failed emit is rescheduled with exponential backoff instead of sleeping,
+  so other rooms keep flowing; after SOCKET_EMIT_MAX_ATTEMPTS it is dropped.
+- The outbox is bounded by SOCKET_EMIT_QUEUE_SIZE payloads; enqueues beyond
+  that are rejected and counted.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.utils.green import spawn_worker
+
+logger = logging.getLogger(__name__)
+
+SINGLE_EVENT = 'new_notification'
+BATCH_EVENT = 'notifications_batch'
+
+
+class EmitOutbox:
+    """Bounded, coalescing emit queue drained by a background worker"""
+
+    def __init__(self, emit=None, max_size: int = 10000, coalesce_seconds: float = 0.25,
+                 max_attempts: int = 3, retry_delay_seconds: float = 0.5):
+        self.emit = emit
+        self.max_size = max_size
+        self.coalesce_seconds = coalesce_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+
+        # Heap of (due_at, seq, room, payloads, attempts); payloads is None for
+        # a room still collecting in self._open until its window closes
+        self._due = []
+        self._open: Dict[str, List[Dict]] = {}
+        self._depth = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker_started = False
+        self._stopped = False
+        self._listeners = []
+        self.stats = {
+            'enqueued': 0, 'emitted': 0, 'events': 0, 'batches': 0,
+            'retries': 0, 'failed': 0, 'dropped': 0
+        }
+
+    def init_app(self, app):
+        self.max_size = app.config['SOCKET_EMIT_QUEUE_SIZE']
+        self.coalesce_seconds = app.config['SOCKET_EMIT_COALESCE_SECONDS']
+        self.max_attempts = app.config['SOCKET_EMIT_MAX_ATTEMPTS']
+        self.retry_delay_seconds = app.config['SOCKET_EMIT_RETRY_SECONDS']
+
+    def add_listener(self, listener) -> None:
+        """Call listener(payloads, delivered, error) once per payload group when it settles"""
+        self._listeners.append(listener)
+
+    def _settle(self, payloads: List[Dict], delivered: bool, error: Optional[str] = None):
+        for listener in self._listeners:
+            try:
+                listener(payloads, delivered, error)
+            except Exception as e:
+                logger.error(f"Emit outbox listener failed: {e}")
+
+    def enqueue(self, room: str, payload: Dict) -> bool:
+        """Queue a payload for a room; False if the outbox is full"""
+        with self._lock:
+            if self._depth >= self.max_size:
+                self.stats['dropped'] += 1
+                return False
+
+            if room in self._open:
+                self._open[room].append(payload)
+            else:
+                self._open[room] = [payload]
+                heapq.heappush(self._due, (time.monotonic() + self.coalesce_seconds,
+                                           next(self._seq), room, None, 0))
+            self._depth += 1
+            self.stats['enqueued'] += 1
+            self._ensure_worker()
+        self._wakeup.set()
+        return True
+
+    def _ensure_worker(self):
+        if not self._worker_started and not self._stopped:
+            self._worker_started = True
+            spawn_worker(self._run, 'socket-emit-outbox')
+
+    def _next_ready(self):
+        """Pop the next due delivery, or return the seconds to wait for it"""
+        with self._lock:
+            if not self._due:
+                return None, None
+            due_at, _, room, payloads, attempts = self._due[0]
+            delay = due_at - time.monotonic()
+            if delay > 0:
+                return None, delay
+            heapq.heappop(self._due)
+            if payloads is None:
+                payloads = self._open.pop(room)
+            return (room, payloads, attempts), None
+
+    def _run(self):
+        while not self._stopped:
+            delivery, delay = self._next_ready()
+            if delivery is None:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                continue
+            self._deliver(*delivery)
+
+    def _deliver(self, room: str, payloads: List[Dict], attempts: int):
+        try:
+            if len(payloads) == 1:
+                self.emit(SINGLE_EVENT, payloads[0], room=room)
+            else:
+                self.emit(BATCH_EVENT, {'notifications': payloads, 'count': len(payloads)}, room=room)
+        except Exception as e:
+            attempts += 1
+            with self._lock:
+                gave_up = attempts >= self.max_attempts
+                if gave_up:
+                    self._depth -= len(payloads)
+                    self.stats['failed'] += len(payloads)
+                    logger.error(f"Dropping {len(payloads)} notifications for {room} after {attempts} attempts: {e}")
+                else:
+                    self.stats['retries'] += 1
+                    retry_at = time.monotonic() + self.retry_delay_seconds * (2 ** (attempts - 1))
+                    heapq.heappush(self._due, (retry_at, next(self._seq), room, payloads, attempts))
+            if gave_up:
+                self._settle(payloads, False, str(e))
+            return
+
+        with self._lock:
+            self._depth -= len(payloads)
+            self.stats['emitted'] += len(payloads)
+            self.stats['events'] += 1
+            if len(payloads) > 1:
+                self.stats['batches'] += 1
+        self._settle(payloads, True)
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._depth
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, depth=self._depth, max_size=self.max_size)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
@@ -0,0 +1,171 @@
+"""
+Socket Presence
+
+Tracks which users have a live socket connection, across every worker and
+replica. Each connection (sid) is recorded with its user, role and the
+server that owns it.
+
+- MemoryPresence keeps everything in process; it is exact for a single
+  worker and is the stand-in used without a message queue.
+- RedisPresence shares the records through Redis. Every server refreshes a
+  liveness key; connections owned by a server whose key has expired (a
+  crashed worker never sees its disconnects) are reaped by the survivors.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def make_server_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class MemoryPresence:
+    """Process-local presence"""
+
+    backend = 'memory'
+
+    def __init__(self, server_id: Optional[str] = None):
+        self.server_id = server_id or make_server_id()
+        self._sids: Dict[str, Dict] = {}
+        self._users: Dict[str, Set[str]] = {}
+
+    def add(self, sid: str, user_id, role_id=None) -> None:
+        self.remove(sid)
+        user_id = str(user_id)
+        self._sids[sid] = {
+            'user_id': user_id,
+            'role_id': role_id,
+            'server': self.server_id,
+            'connected_at': datetime.utcnow().isoformat()
+        }
+        self._users.setdefault(user_id, set()).add(sid)
+
+    def remove(self, sid: str) -> Optional[Dict]:
+        info = self._sids.pop(sid, None)
+        if info:
+            sids = self._users.get(info['user_id'])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._users[info['user_id']]
+        return info
+
+    def get(self, sid: str) -> Optional[Dict]:
+        return self._sids.get(sid)
+
+    def user_sids(self, user_id) -> Set[str]:
+        return set(self._users.get(str(user_id), ()))
+
+    def is_online(self, user_id) -> bool:
+        return bool(self._users.get(str(user_id)))
+
+    def heartbeat(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {'backend': self.backend, 'connections': len(self._sids), 'users_online': len(self._users)}
+
+
+class RedisPresence:
+    """Presence shared through Redis"""
+
+    backend = 'redis'
+
+    def __init__(self, redis_url: str, ttl_seconds: int = 90, prefix: str = 'dairy_track:presence',
+                 server_id: Optional[str] = None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.server_id = server_id or make_server_id()
+        self.sids_key = f"{prefix}:sids"
+        self.servers_key = f"{prefix}:servers"
+        self.prefix = prefix
+
+    def _user_key(self, user_id) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def _server_key(self, server_id: str) -> str:
+        return f"{self.prefix}:server:{server_id}"
+
+    def _alive_key(self, server_id: str) -> str:
+        return f"{self.prefix}:alive:{server_id}"
+
+    def add(self, sid: str, user_id, role_id=None) -> None:
+        self.remove(sid)
+        user_id = str(user_id)
+        info = {
+            'user_id': user_id,
+            'role_id': role_id,
+            'server': self.server_id,
+            'connected_at': datetime.utcnow().isoformat()
+        }
+        pipe = self.client.pipeline()
+        pipe.hset(self.sids_key, sid, json.dumps(info))
+        pipe.sadd(self._user_key(user_id), sid)
+        pipe.sadd(self._server_key(self.server_id), sid)
+        pipe.execute()
+
+    def remove(self, sid: str) -> Optional[Dict]:
+        raw = self.client.hget(self.sids_key, sid)
+        if raw is None:
+            return None
+        info = json.loads(raw)
+        pipe = self.client.pipeline()
+        pipe.hdel(self.sids_key, sid)
+        pipe.srem(self._user_key(info['user_id']), sid)
+        pipe.srem(self._server_key(info['server']), sid)
+        pipe.execute()
+        return info
+
+    def get(self, sid: str) -> Optional[Dict]:
+        raw = self.client.hget(self.sids_key, sid)
+        return json.loads(raw) if raw is not None else None
+
+    def user_sids(self, user_id) -> Set[str]:
+        return set(self.client.smembers(self._user_key(user_id)))
+
+    def is_online(self, user_id) -> bool:
+        return self.client.scard(self._user_key(user_id)) > 0
+
+    def heartbeat(self) -> None:
+        """Refresh this server's liveness and reap connections of dead servers"""
+        pipe = self.client.pipeline()
+        pipe.set(self._alive_key(self.server_id), int(time.time()), ex=self.ttl_seconds)
+        pipe.sadd(self.servers_key, self.server_id)
+        pipe.execute()
+
+        for server_id in self.client.smembers(self.servers_key):
+            if server_id == self.server_id or self.client.exists(self._alive_key(server_id)):
+                continue
+            sids = self.client.smembers(self._server_key(server_id))
+            for sid in sids:
+                self.remove(sid)
+            self.client.delete(self._server_key(server_id))
+            self.client.srem(self.servers_key, server_id)
+            logger.info(f"Reaped {len(sids)} socket connections of stale server {server_id}")
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.backend,
+            'connections': self.client.hlen(self.sids_key),
+            'servers': self.client.scard(self.servers_key)
+        }
+
+
+def create_presence(app):
+    """Presence store matching the configured Socket.IO message queue"""
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisPresence(url, ttl_seconds=app.config['SOCKET_PRESENCE_TTL_SECONDS'])
+    return MemoryPresence()
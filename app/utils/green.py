@@ -0,0 +1,25 @@
+"""
+Helpers for code that runs both under eventlet (run.py monkey-patches the
+process) and under a plain threaded server or CLI.
+"""
+
+import threading
+
+
+def eventlet_patched() -> bool:
+    """True when eventlet has monkey-patched threading in this process"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def spawn_worker(target, name: str):
+    """Start `target` as a green thread under eventlet, or a daemon thread otherwise"""
+    if eventlet_patched():
+        import eventlet
+        return eventlet.spawn(target)
+    worker = threading.Thread(target=target, name=name, daemon=True)
+    worker.start()
+    return worker
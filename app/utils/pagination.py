@@ -0,0 +1,46 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors are opaque, URL-safe tokens that encode the sort key of the last row
+a client has seen, so the next page can be fetched with an indexed range
+condition instead of an OFFSET scan.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) sort key into an opaque cursor token"""
+    payload = json.dumps({'t': sort_value.isoformat(), 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    """Decode a cursor token produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return datetime.fromisoformat(payload['t']), int(payload['id'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+
+
+def parse_limit(raw_limit: Optional[str], default: int = DEFAULT_PAGE_LIMIT,
+                maximum: int = MAX_PAGE_LIMIT) -> int:
+    """Parse and clamp a page size query parameter"""
+    if raw_limit is None or raw_limit == '':
+        return default
+    limit = int(raw_limit)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
@@ -0,0 +1,76 @@
+"""
+Small per-process TTL cache for computed response payloads.
+
+Entries expire after `ttl_seconds`; the oldest entries are evicted once
+`max_entries` is reached. Values are returned as stored, so callers must
+treat them as read-only. A value computed by `get_or_set` is dropped if
+an invalidation ran while it was being computed, as it may be stale.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe TTL cache with hit/miss counters"""
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; get_or_set only stores its result if
+        # no invalidation ran during the compute
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self._store(key, value, ttl_seconds, None)
+
+    def _store(self, key: Hashable, value: Any, ttl_seconds: Optional[float], generation: Optional[int]) -> None:
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any], ttl_seconds: Optional[float] = None) -> Any:
+        with self._lock:
+            generation = self._generation
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self._store(key, value, ttl_seconds, generation)
+        return value
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Drop every entry, or the entries whose key matches the predicate"""
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if predicate(key)]:
+                    del self._entries[key]
+            self.stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
@@ -15,4 +15,78 @@ class Config:
 
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JSON_SORT_KEYS = False
\ No newline at end of file
+    JSON_SORT_KEYS = False
+
+    # Report jobs: Celery is used when a broker is configured, otherwise
+    # reports are generated by a local worker pool inside the web process.
+    # REPORT_STORAGE_DIR must be shared with the Celery workers.
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
+    REPORT_STORAGE_DIR = os.environ.get('REPORT_STORAGE_DIR') or os.path.join(os.getcwd(), 'app/uploads/reports')
+    REPORT_CACHE_TTL_MINUTES = int(os.environ.get('REPORT_CACHE_TTL_MINUTES') or 10)
+    REPORT_JOB_TIMEOUT_MINUTES = int(os.environ.get('REPORT_JOB_TIMEOUT_MINUTES') or 30)
+    REPORT_RETENTION_HOURS = int(os.environ.get('REPORT_RETENTION_HOURS') or 24)
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS') or 2)
+
+    # Shared Redis (optional)
+    REDIS_URL = os.environ.get('REDIS_URL')
+
+    # Scheduler: only the holder of the leader lease runs jobs.
+    # Backends: 'database' (scheduler_leases row), 'redis' (REDIS_URL) or 'file' (single host)
+    SCHEDULER_LOCK_BACKEND = os.environ.get('SCHEDULER_LOCK_BACKEND') or 'database'
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE') or '/tmp/dairy_track_scheduler.lock'
+    SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS') or 60)
+    SCHEDULER_HISTORY_DAYS = int(os.environ.get('SCHEDULER_HISTORY_DAYS') or 7)
+
+    # Notification checks triggered by writes are coalesced over this window
+    NOTIFICATION_DEBOUNCE_SECONDS = float(os.environ.get('NOTIFICATION_DEBOUNCE_SECONDS') or 5)
+
+    # Per-process cache of each user's managed cows (dropped on /user-cow assign and unassign)
+    MANAGED_COW_CACHE_TTL_SECONDS = int(os.environ.get('MANAGED_COW_CACHE_TTL_SECONDS') or 300)
+
+    # Socket notification outbox: bounded queue, per-room coalescing window and retry backoff
+    SOCKET_EMIT_QUEUE_SIZE = int(os.environ.get('SOCKET_EMIT_QUEUE_SIZE') or 10000)
+    SOCKET_EMIT_COALESCE_SECONDS = float(os.environ.get('SOCKET_EMIT_COALESCE_SECONDS') or 0.25)
+    SOCKET_EMIT_MAX_ATTEMPTS = int(os.environ.get('SOCKET_EMIT_MAX_ATTEMPTS') or 3)
+    SOCKET_EMIT_RETRY_SECONDS = float(os.environ.get('SOCKET_EMIT_RETRY_SECONDS') or 0.5)
+
+    # Socket.IO scale-out: a message queue (redis://... or memory:// as an in-process
+    # stand-in) lets any worker or replica reach clients connected elsewhere.
+    # SOCKETIO_TRANSPORTS=websocket removes the need for sticky sessions.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL') or 'dairy_track_socketio'
+    SOCKETIO_TRANSPORTS = [t.strip() for t in os.environ['SOCKETIO_TRANSPORTS'].split(',')] \
+        if os.environ.get('SOCKETIO_TRANSPORTS') else None
+    SOCKET_PRESENCE_TTL_SECONDS = int(os.environ.get('SOCKET_PRESENCE_TTL_SECONDS') or 90)
+
+    # Notification outbox relay (socket delivery of committed notifications)
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE') or 200)
+    OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS') or 5)
+    OUTBOX_REDISPATCH_SECONDS = int(os.environ.get('OUTBOX_REDISPATCH_SECONDS') or 60)
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS') or 5)
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS') or 24)
+    # Notification rate limit: token bucket per user (memory, or redis to share it across workers)
+    NOTIFICATION_RATE_LIMIT_BACKEND = os.environ.get('NOTIFICATION_RATE_LIMIT_BACKEND') or 'memory'
+    NOTIFICATION_RATE_LIMIT = int(os.environ.get('NOTIFICATION_RATE_LIMIT') or 50)
+    NOTIFICATION_RATE_LIMIT_WINDOW_MINUTES = int(os.environ.get('NOTIFICATION_RATE_LIMIT_WINDOW_MINUTES') or 60)
+
+    # Per-process cache of role memberships used by notification fan-out (dropped on /user and /role changes)
+    ROLE_MEMBER_CACHE_TTL_SECONDS = int(os.environ.get('ROLE_MEMBER_CACHE_TTL_SECONDS') or 300)
+
+    # Notification retention: daily chunked delete by id range, optionally archived as gzip JSONL
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS') or 30)
+    NOTIFICATION_RETENTION_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_RETENTION_CHUNK_SIZE') or 1000)
+    NOTIFICATION_RETENTION_PAUSE_SECONDS = float(os.environ.get('NOTIFICATION_RETENTION_PAUSE_SECONDS') or 0.2)
+    NOTIFICATION_RETENTION_MAX_CHUNKS = int(os.environ.get('NOTIFICATION_RETENTION_MAX_CHUNKS') or 1000)
+    NOTIFICATION_ARCHIVE_DIR = os.environ.get('NOTIFICATION_ARCHIVE_DIR')
+
+    # Optional read replica for read-only dashboard endpoints (see app.database.database.use_read_replica)
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URI']} \
+        if os.environ.get('DATABASE_REPLICA_URI') else {}
+
+    # Per-process cache of /milk-expiry expiry-analysis payloads, keyed by user and minute (0 disables)
+    EXPIRY_ANALYSIS_CACHE_SECONDS = int(os.environ.get('EXPIRY_ANALYSIS_CACHE_SECONDS') or 60)
+    # Per-process cache of /milk-freshness /stats and /critical payloads (0 disables); batch changes drop it
+    MILK_FRESHNESS_CACHE_SECONDS = int(os.environ.get('MILK_FRESHNESS_CACHE_SECONDS') or 60)
+    # Per-process cache of the compiled production notification rules; /notification/production-rules changes drop it
+    PRODUCTION_RULES_RELOAD_SECONDS = int(os.environ.get('PRODUCTION_RULES_RELOAD_SECONDS') or 60)
@@ -0,0 +1,30 @@
+"""Add milking session keyset pagination indexes
+
+Revision ID: a3f1c9d2e7b4
+Revises: d66bd03740ab
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e7b4'
+down_revision = 'd66bd03740ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_milking_sessions_milking_time_id', ['milking_time', 'id'], unique=False)
+        batch_op.create_index('ix_milking_sessions_cow_time', ['cow_id', 'milking_time'], unique=False)
+        batch_op.create_index('ix_milking_sessions_milker_time', ['milker_id', 'milking_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_milking_sessions_milker_time')
+        batch_op.drop_index('ix_milking_sessions_cow_time')
+        batch_op.drop_index('ix_milking_sessions_milking_time_id')
@@ -0,0 +1,43 @@
+"""Add notification_counters table and (user_id, is_read, created_at) index
+
+Revision ID: a8d4e2c6f915
+Revises: f1d7c3a9e062
+Create Date: 2026-10-18 16:10:37.218440
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4e2c6f915'
+down_revision = 'f1d7c3a9e062'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_read_created', ['user_id', 'is_read', 'created_at'], unique=False)
+
+    # Seed counters from existing notifications
+    op.execute(
+        "INSERT INTO notification_counters (user_id, unread_count, total_count, updated_at) "
+        "SELECT user_id, SUM(CASE WHEN is_read = 0 THEN 1 ELSE 0 END), COUNT(*), CURRENT_TIMESTAMP "
+        "FROM notifications GROUP BY user_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_read_created')
+
+    op.drop_table('notification_counters')
@@ -0,0 +1,63 @@
+"""Add cow weekly/monthly and farm daily milk production rollups
+
+Revision ID: c3e9b7a1d524
+Revises: a8d4e2c6f915
+Create Date: 2026-10-18 18:42:05.613907
+
+Farm daily rollups are seeded here. Weekly and monthly cow rollups are
+filled by `flask --app run rebuild-rollups --start-date <first summary date>
+--end-date <today>` after upgrading.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e9b7a1d524'
+down_revision = 'a8d4e2c6f915'
+branch_labels = None
+depends_on = None
+
+
+def _volume_columns():
+    return [
+        sa.Column('morning_volume', sa.Float(), nullable=False),
+        sa.Column('afternoon_volume', sa.Float(), nullable=False),
+        sa.Column('evening_volume', sa.Float(), nullable=False),
+        sa.Column('total_volume', sa.Float(), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table('cow_weekly_milk_rollups',
+    sa.Column('cow_id', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    *_volume_columns(),
+    sa.ForeignKeyConstraint(['cow_id'], ['cows.id'], ),
+    sa.PrimaryKeyConstraint('cow_id', 'week_start')
+    )
+    op.create_table('cow_monthly_milk_rollups',
+    sa.Column('cow_id', sa.Integer(), nullable=False),
+    sa.Column('month_start', sa.Date(), nullable=False),
+    *_volume_columns(),
+    sa.ForeignKeyConstraint(['cow_id'], ['cows.id'], ),
+    sa.PrimaryKeyConstraint('cow_id', 'month_start')
+    )
+    op.create_table('farm_daily_milk_rollups',
+    sa.Column('date', sa.Date(), nullable=False),
+    *_volume_columns(),
+    sa.PrimaryKeyConstraint('date')
+    )
+
+    op.execute(
+        "INSERT INTO farm_daily_milk_rollups (date, morning_volume, afternoon_volume, evening_volume, total_volume) "
+        "SELECT date, SUM(morning_volume), SUM(afternoon_volume), SUM(evening_volume), SUM(total_volume) "
+        "FROM daily_milk_summary GROUP BY date"
+    )
+
+
+def downgrade():
+    op.drop_table('farm_daily_milk_rollups')
+    op.drop_table('cow_monthly_milk_rollups')
+    op.drop_table('cow_weekly_milk_rollups')
@@ -0,0 +1,53 @@
+"""Unique (cow_id, date) key on daily_milk_summary
+
+Merges duplicate summaries for the same cow and day into the oldest row
+before adding the constraint.
+
+Revision ID: c41f8e6b2d93
+Revises: b7e2d4a91c05
+Create Date: 2026-10-18 11:26:54.180347
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f8e6b2d93'
+down_revision = 'b7e2d4a91c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("""
+        SELECT cow_id, date, MIN(id) AS keep_id,
+               SUM(morning_volume) AS morning_volume,
+               SUM(afternoon_volume) AS afternoon_volume,
+               SUM(evening_volume) AS evening_volume,
+               SUM(total_volume) AS total_volume
+        FROM daily_milk_summary
+        GROUP BY cow_id, date
+        HAVING COUNT(*) > 1
+    """)).fetchall()
+
+    for row in duplicates:
+        bind.execute(sa.text("""
+            UPDATE daily_milk_summary
+            SET morning_volume = :morning_volume, afternoon_volume = :afternoon_volume,
+                evening_volume = :evening_volume, total_volume = :total_volume
+            WHERE id = :keep_id
+        """), dict(row._mapping))
+        bind.execute(sa.text("""
+            DELETE FROM daily_milk_summary
+            WHERE cow_id = :cow_id AND date = :date AND id <> :keep_id
+        """), {'cow_id': row.cow_id, 'date': row.date, 'keep_id': row.keep_id})
+
+    with op.batch_alter_table('daily_milk_summary', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_daily_milk_summary_cow_date', ['cow_id', 'date'])
+
+
+def downgrade():
+    with op.batch_alter_table('daily_milk_summary', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_daily_milk_summary_cow_date', type_='unique')
@@ -0,0 +1,56 @@
+"""Add production_rules table seeded with the built-in production thresholds
+
+Revision ID: d7f2a4c8e613
+Revises: c3e9b7a1d524
+Create Date: 2026-10-18 21:05:48.930217
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f2a4c8e613'
+down_revision = 'c3e9b7a1d524'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    production_rules = op.create_table('production_rules',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('notification_type', sa.String(length=20), nullable=False),
+    sa.Column('metric', sa.String(length=50), nullable=False),
+    sa.Column('operator', sa.String(length=2), nullable=False),
+    sa.Column('threshold', sa.Float(), nullable=False),
+    sa.Column('min_volume', sa.Float(), nullable=True),
+    sa.Column('breed', sa.String(length=50), nullable=True),
+    sa.Column('lactation_phase', sa.String(length=50), nullable=True),
+    sa.Column('audience', sa.String(length=20), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Same thresholds the notification service used to hard-code
+    now = datetime.utcnow()
+    defaults = [
+        ('Low production', 'low_production', 'total_volume', '<', 10.0, None, 'managers'),
+        ('High production', 'high_production', 'total_volume', '>', 25.0, None, 'managers'),
+        ('Production increase', 'production_increase', 'change_1d_pct', '>=', 15.0, 5.0, 'supervisors'),
+        ('Production decrease', 'production_decrease', 'change_1d_pct', '<=', -15.0, 5.0, 'supervisors'),
+    ]
+    op.bulk_insert(production_rules, [
+        {'name': name, 'notification_type': notification_type, 'metric': metric, 'operator': operator,
+         'threshold': threshold, 'min_volume': min_volume, 'breed': None, 'lactation_phase': None,
+         'audience': audience, 'is_active': True, 'created_at': now, 'updated_at': now}
+        for name, notification_type, metric, operator, threshold, min_volume, audience in defaults
+    ])
+
+
+def downgrade():
+    op.drop_table('production_rules')
@@ -0,0 +1,48 @@
+"""Add scheduler_leases and scheduler_job_runs tables
+
+Revision ID: d9a3b7c15e28
+Revises: c41f8e6b2d93
+Create Date: 2026-10-18 13:05:42.917530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3b7c15e28'
+down_revision = 'c41f8e6b2d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scheduler_leases',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('holder', sa.String(length=255), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('scheduler_job_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('job_id', sa.String(length=100), nullable=False),
+    sa.Column('holder', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_ms', sa.Integer(), nullable=True),
+    sa.Column('result', sa.String(length=255), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scheduler_job_runs', schema=None) as batch_op:
+        batch_op.create_index('ix_scheduler_job_runs_job_started', ['job_id', 'started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('scheduler_job_runs', schema=None) as batch_op:
+        batch_op.drop_index('ix_scheduler_job_runs_job_started')
+
+    op.drop_table('scheduler_job_runs')
+    op.drop_table('scheduler_leases')
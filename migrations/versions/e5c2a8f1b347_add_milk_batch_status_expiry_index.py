@@ -0,0 +1,26 @@
+"""Add (status, expiry_date) index to milk_batches
+
+Revision ID: e5c2a8f1b347
+Revises: d9a3b7c15e28
+Create Date: 2026-10-18 14:21:09.336812
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c2a8f1b347'
+down_revision = 'd9a3b7c15e28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milk_batches', schema=None) as batch_op:
+        batch_op.create_index('ix_milk_batches_status_expiry', ['status', 'expiry_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('milk_batches', schema=None) as batch_op:
+        batch_op.drop_index('ix_milk_batches_status_expiry')
@@ -0,0 +1,51 @@
+"""Unique in-flight slot (active_hash) on report_jobs
+
+Jobs still PENDING or RUNNING take the slot of their params_hash, keeping
+the newest one per hash; the others are failed.
+
+Revision ID: e8b1f5d3a472
+Revises: d7f2a4c8e613
+Create Date: 2026-10-18 22:14:36.508127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1f5d3a472'
+down_revision = 'd7f2a4c8e613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('active_hash', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    active = bind.execute(sa.text("""
+        SELECT id, params_hash FROM report_jobs
+        WHERE status IN ('PENDING', 'RUNNING')
+        ORDER BY created_at DESC
+    """)).fetchall()
+    claimed = set()
+    for row in active:
+        if row.params_hash in claimed:
+            bind.execute(sa.text("""
+                UPDATE report_jobs SET status = 'FAILED', error = 'Superseded by an identical job'
+                WHERE id = :id
+            """), {'id': row.id})
+        else:
+            claimed.add(row.params_hash)
+            bind.execute(sa.text("UPDATE report_jobs SET active_hash = :hash WHERE id = :id"),
+                         {'hash': row.params_hash, 'id': row.id})
+
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_report_jobs_active_hash', ['active_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_report_jobs_active_hash', type_='unique')
+        batch_op.drop_column('active_hash')